@@ -0,0 +1,66 @@
+"""
+Publishing generated artifacts to a stage.
+
+``publish_artifacts`` uploads in-memory content with ``put_stream`` instead
+of writing local files first, uploads several artifacts concurrently, and
+skips any artifact whose MD5 matches the copy already on the stage (read
+with one ``LIST``). Unchanged semantic model files therefore keep their
+stage timestamp, and caches keyed on them stay valid.
+"""
+import hashlib
+import io
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _name_pattern(names):
+    # Bracket every non-word character so the regex needs no backslashes,
+    # which the SQL string literal would otherwise consume
+    alternatives = [re.sub(r"[^\w-]", lambda m: f"[{m.group()}]", name) for name in names]
+    return f".*/({'|'.join(alternatives)})"
+
+
+def stage_md5s(session, stage, names):
+    """``{name: md5}`` of the files in ``names`` already on ``@stage``."""
+    rows = session.sql(f"LIST @{stage} PATTERN = '{_name_pattern(names)}'").collect()
+    md5s = {}
+    # Shortest path first, so the file at the stage root wins over subfolders
+    for row in sorted(rows, key=lambda row: len(row['name'])):
+        name = row['name'].rsplit("/", 1)[-1]
+        if name in names and name not in md5s:
+            md5s[name] = row['md5']
+    return md5s
+
+
+def publish_artifacts(session, stage, artifacts, max_workers=4, skip_unchanged=True):
+    """
+    Uploads ``artifacts`` (``{file_name: str or bytes}``) to ``@stage``.
+    Returns ``{file_name: {"status", "md5", "error"}}`` where ``status`` is
+    ``"UPLOADED"``, ``"SKIPPED"`` (same content already staged) or ``"FAILED"``.
+    """
+    contents = {name: data.encode('utf-8') if isinstance(data, str) else data
+                for name, data in artifacts.items()}
+    digests = {name: hashlib.md5(data).hexdigest() for name, data in contents.items()}
+
+    staged = {}
+    if skip_unchanged:
+        try:
+            staged = stage_md5s(session, stage, list(contents))
+        except Exception:
+            # Without a listing every artifact is uploaded
+            staged = {}
+
+    def upload(name):
+        if staged.get(name) == digests[name]:
+            return {"status": "SKIPPED", "md5": digests[name], "error": None}
+        try:
+            result = session.file.put_stream(
+                io.BytesIO(contents[name]), f"@{stage}/{name}",
+                auto_compress=False, overwrite=True)
+            return {"status": result.status, "md5": digests[name], "error": None}
+        except Exception as e:
+            return {"status": "FAILED", "md5": digests[name], "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(contents)))) as pool:
+        results = pool.map(upload, list(contents))
+        return dict(zip(contents, results))
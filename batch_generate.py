@@ -0,0 +1,263 @@
+"""
+Headless semantic model generation for many schemas.
+
+Discovers the schemas of one or more databases (optionally filtered by
+wildcards), builds each schema's model concurrently on a bounded pool of
+sessions, validates it, and publishes the YAML and JSON to a per-schema
+path on the stage. Each schema is regenerated incrementally from its
+fingerprint sidecar unless ``--full`` is given. A summary of timings, table
+counts and row counts is printed (and written as JSON with ``--summary``).
+
+    python batch_generate.py --database CORTEX_ANALYST_DEMO --stage RAW_DATA \\
+        --schemas "REVENUE_*" --workers 4 --connection default
+
+``--local`` runs against a ``LocalSession`` with a synthetic catalog, so the
+whole pipeline can be exercised without a Snowflake connection.
+"""
+import argparse
+import json
+import queue
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from artifact_publisher import publish_artifacts
+from model_validator import columns_by_table, format_issues, validate_model
+from semantic_model import (ModelSerializer, load_model_state, match_tables, save_model_state,
+                            update_semantic_model)
+
+MODEL_FILE = "semantic_model.yaml"
+JSON_FILE = "semantic_model.json"
+
+
+class SessionPool:
+    """At most ``size`` sessions, created on first use and shared by the workers."""
+
+    def __init__(self, factory, size):
+        self.factory = factory
+        self.size = size
+        self.created = 0
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self.created < self.size:
+                self.created += 1
+                create = True
+            else:
+                create = False
+        return self.factory() if create else self._idle.get()
+
+    def release(self, session):
+        self._idle.put(session)
+
+    def close(self):
+        while not self._idle.empty():
+            session = self._idle.get_nowait()
+            close = getattr(session, "close", None)
+            if close is not None:
+                close()
+
+
+def discover_schemas(session, database_name, patterns=None):
+    """Schemas of ``database_name``, filtered by comma-separated wildcards when given."""
+    rows = session.sql(f"""
+    SELECT SCHEMA_NAME
+    FROM {database_name}.INFORMATION_SCHEMA.SCHEMATA
+    WHERE SCHEMA_NAME <> 'INFORMATION_SCHEMA'
+    ORDER BY SCHEMA_NAME
+    """).collect()
+    schemas = [row['SCHEMA_NAME'] for row in rows]
+    return match_tables(schemas, patterns) if patterns else schemas
+
+
+def stage_path(stage, database_name, schema_name):
+    return f"{stage}/{database_name}/{schema_name}"
+
+
+def generate_schema(session, database_name, schema_name, stage, model_name=None,
+                    profile_rows=10000, incremental=True, dry_run=False):
+    """Builds, validates and publishes one schema's model; returns its summary row."""
+    start = time.perf_counter()
+    path = stage_path(stage, database_name, schema_name)
+    summary = {"database": database_name, "schema": schema_name, "path": f"@{path}",
+               "status": "ok", "tables": 0, "changed": 0, "removed": 0, "rows": 0,
+               "errors": 0, "warnings": 0, "seconds": 0.0, "message": ""}
+    try:
+        model, state = load_model_state(session, path, MODEL_FILE) if incremental else (None, None)
+        model, state, changed, removed = update_semantic_model(
+            session, database_name, schema_name, model, state,
+            model_name=model_name or schema_name, profile_rows=profile_rows)
+        summary.update(tables=len(model["tables"]), changed=len(changed), removed=len(removed),
+                       rows=sum(count or 0 for count in state["row_counts"].values()))
+
+        issues = validate_model(model, columns_by_table(state))
+        errors = [issue for issue in issues if issue["level"] == "error"]
+        summary.update(errors=len(errors), warnings=len(issues) - len(errors))
+        if errors:
+            summary.update(status="invalid", message=format_issues(errors, limit=5))
+        elif not model["tables"]:
+            summary.update(status="empty")
+        elif dry_run:
+            summary.update(status="dry-run")
+        else:
+            serializer = ModelSerializer.from_model(model)
+            results = publish_artifacts(session, path, {
+                MODEL_FILE: serializer.yaml(),
+                JSON_FILE: serializer.json(),
+            })
+            failed = {name: result for name, result in results.items()
+                      if result["status"] not in ("UPLOADED", "SKIPPED")}
+            if failed:
+                summary.update(status="failed", message="; ".join(
+                    f"{name}: {result['error'] or result['status']}" for name, result in failed.items()))
+            else:
+                save_model_state(session, path, MODEL_FILE, state)
+                if all(result["status"] == "SKIPPED" for result in results.values()):
+                    summary.update(status="unchanged")
+    except Exception as e:
+        summary.update(status="failed", message=str(e))
+    summary["seconds"] = round(time.perf_counter() - start, 2)
+    return summary
+
+
+def run_batch(session_factory, databases, stage, schema_patterns=None, workers=4, **kwargs):
+    """Generates every matching schema of ``databases`` on a pool of ``workers`` sessions."""
+    pool = SessionPool(session_factory, workers)
+    try:
+        session = pool.acquire()
+        try:
+            targets = [(database_name, schema_name) for database_name in databases
+                       for schema_name in discover_schemas(session, database_name, schema_patterns)]
+        finally:
+            pool.release(session)
+
+        def work(target):
+            session = pool.acquire()
+            try:
+                return generate_schema(session, *target, stage, **kwargs)
+            finally:
+                pool.release(session)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            return list(executor.map(work, targets))
+    finally:
+        pool.close()
+
+
+def format_summary(results, seconds):
+    header = ["database", "schema", "status", "tables", "changed", "rows", "errors", "seconds"]
+    table = [header] + [[str(result[column]) for column in header] for result in results]
+    widths = [max(len(row[i]) for row in table) for i in range(len(header))]
+    lines = ["  ".join(cell.ljust(width) for cell, width in zip(row, widths)) for row in table]
+    for result in results:
+        if result["message"]:
+            lines.append(f"{result['database']}.{result['schema']}: {result['message']}")
+    lines.append(f"{len(results)} schemas, {sum(r['tables'] for r in results)} tables, "
+                 f"{sum(r['changed'] for r in results)} regenerated, "
+                 f"{sum(r['rows'] for r in results):,} rows in {seconds:.2f}s")
+    return "\n".join(lines)
+
+
+def local_session_factory(schemas=3, tables=20, columns=12):
+    """
+    Factory of ``LocalSession``s answering the discovery, INFORMATION_SCHEMA
+    and profiling queries from a synthetic catalog. All sessions share one
+    in-memory stage.
+    """
+    from local_session import LocalFileOperation, LocalSession
+
+    types = [("TEXT", 100, None, None), ("NUMBER", None, 38, 0), ("NUMBER", None, 12, 2),
+             ("DATE", None, None, None), ("TIMESTAMP_NTZ", None, None, None),
+             ("BOOLEAN", None, None, None)]
+    schema_names = [f"SCHEMA_{i:02d}" for i in range(schemas)]
+
+    def schemata(session, match, params):
+        return [{"SCHEMA_NAME": name} for name in schema_names]
+
+    def schema_columns(session, match, params):
+        rows = []
+        for t in range(tables):
+            for c in range(columns):
+                data_type, length, precision, scale = types[c % len(types)]
+                rows.append({
+                    "TABLE_NAME": f"{params[0]}_T{t:03d}", "TABLE_TYPE": "BASE TABLE",
+                    "ROW_COUNT": 1000 * (t + 1), "LAST_ALTERED": "2024-01-01 00:00:00",
+                    "TABLE_COMMENT": None, "COLUMN_NAME": f"COL_{c:02d}" if c else "ID",
+                    "DATA_TYPE": data_type, "CHARACTER_MAXIMUM_LENGTH": length,
+                    "NUMERIC_PRECISION": precision, "NUMERIC_SCALE": scale,
+                    "IS_NULLABLE": "YES", "COLUMN_COMMENT": None})
+        return rows
+
+    def profile(session, match, params):
+        query = match.string
+        row = {"N": 1000}
+        for i in map(int, re.findall(r"AS NDV_(\d+)", query)):
+            row[f"NDV_{i}"] = 1000 if i == 0 else 5 * (i + 1)
+            row[f"NN_{i}"] = 1000
+            if f"AS TOP_{i}" in query:
+                row[f"TOP_{i}"] = json.dumps([[f"value_{v}", 10 - v] for v in range(3)])
+        return [row]
+
+    files = LocalFileOperation()
+
+    def factory():
+        session = LocalSession()
+        session.file = files
+        session.register(r"INFORMATION_SCHEMA\.SCHEMATA", schemata)
+        session.register(r"INFORMATION_SCHEMA\.COLUMNS", schema_columns)
+        session.register(r"APPROX_TOP_K", profile)
+        return session
+    return factory
+
+
+def snowpark_session_factory(connection_name=None):
+    def factory():
+        from snowflake.snowpark import Session
+        builder = Session.builder
+        if connection_name:
+            builder = builder.config("connection_name", connection_name)
+        return builder.create()
+    return factory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--database", action="append", required=True,
+                        help="database to scan (repeatable)")
+    parser.add_argument("--stage", required=True,
+                        help="stage receiving <database>/<schema>/semantic_model.yaml")
+    parser.add_argument("--schemas", help="comma-separated schema wildcards, e.g. 'SALES_*,FIN'")
+    parser.add_argument("--workers", type=int, default=4, help="concurrent sessions")
+    parser.add_argument("--profile-rows", type=int, default=10000,
+                        help="sampled rows profiled per changed table (0 = types only)")
+    parser.add_argument("--full", action="store_true", help="regenerate every table")
+    parser.add_argument("--dry-run", action="store_true", help="build and validate, do not upload")
+    parser.add_argument("--summary", help="also write the summary as JSON to this file")
+    parser.add_argument("--connection", help="Snowflake connection name (connections.toml)")
+    parser.add_argument("--local", action="store_true",
+                        help="use a LocalSession with a synthetic catalog")
+    args = parser.parse_args(argv)
+
+    factory = (local_session_factory() if args.local
+               else snowpark_session_factory(args.connection))
+    start = time.perf_counter()
+    results = run_batch(factory, args.database, args.stage, args.schemas, args.workers,
+                        profile_rows=args.profile_rows, incremental=not args.full,
+                        dry_run=args.dry_run)
+    print(format_summary(results, time.perf_counter() - start))
+    if args.summary:
+        with open(args.summary, "w") as summary_file:
+            json.dump(results, summary_file, indent=2)
+    return 1 if any(result["status"] in ("failed", "invalid") for result in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,190 @@
+"""
+Cached catalog browsing for the database, schema and table selectors.
+
+``CatalogCache`` keeps the database, schema and table/view lists per level
+with their own TTL, so Streamlit reruns (every selectbox change or button
+click) read them from memory instead of running ``SHOW`` commands again.
+Expired entries are still served while a background thread refreshes them,
+and ``invalidate`` drops entries explicitly. Tables and views of a schema
+come from a single ``INFORMATION_SCHEMA.TABLES`` query rather than separate
+``SHOW TABLES`` and ``SHOW VIEWS`` calls.
+
+``NameIndex`` makes very large catalogs searchable: a sorted name list for
+prefix lookups plus a trigram index for substring and approximate matches,
+so the table picker only sends one page of matching names to the browser
+instead of every object in the schema.
+"""
+import bisect
+import threading
+import time
+from collections import Counter
+
+# Seconds each level stays fresh before it is refreshed in the background
+DEFAULT_TTLS = {"databases": 600, "schemas": 300, "objects": 120}
+
+
+class CatalogCache:
+    """Database, schema and table/view names shared by every session of the app."""
+
+    def __init__(self, ttls=None):
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self._entries = {}
+        self._refreshing = set()
+        # Name indexes, each with the object list it was built from
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _fetch(self, session, key):
+        level = key[0]
+        if level == "databases":
+            return [row['name'] for row in session.sql("SHOW DATABASES").collect()]
+        if level == "schemas":
+            rows = session.sql(f"SHOW SCHEMAS IN DATABASE {key[1]}").collect()
+            return [row['name'] for row in rows]
+        rows = session.sql(f"""
+        SELECT TABLE_NAME, TABLE_TYPE
+        FROM {key[1]}.INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_SCHEMA = ?
+        ORDER BY TABLE_NAME
+        """, params=[key[2]]).collect()
+        return [(row['TABLE_NAME'], "VIEW" if row['TABLE_TYPE'] == "VIEW" else "TABLE")
+                for row in rows]
+
+    def _store(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttls[key[0]], value)
+            self._refreshing.discard(key)
+
+    def _refresh_in_background(self, session, key):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._store(key, self._fetch(session, key))
+            except Exception:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _get(self, session, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            value = self._fetch(session, key)
+            self._store(key, value)
+            return value
+        expires, value = entry
+        if expires <= time.monotonic():
+            # Serve the stale list now; the next rerun sees the fresh one
+            self._refresh_in_background(session, key)
+        return value
+
+    def databases(self, session):
+        return self._get(session, ("databases",))
+
+    def schemas(self, session, database_name):
+        return self._get(session, ("schemas", database_name))
+
+    def objects(self, session, database_name, schema_name):
+        """``(name, "TABLE" | "VIEW")`` pairs of a schema, sorted by name."""
+        return self._get(session, ("objects", database_name, schema_name))
+
+    def name_index(self, session, database_name, schema_name):
+        """``NameIndex`` over the objects of a schema, rebuilt when the list is refreshed."""
+        objects = self.objects(session, database_name, schema_name)
+        key = ("index", database_name, schema_name)
+        with self._lock:
+            cached = self._indexes.get(key)
+        if cached is not None and cached[0] is objects:
+            return cached[1]
+        index = NameIndex(name for name, _ in objects)
+        with self._lock:
+            self._indexes[key] = (objects, index)
+        return index
+
+    def invalidate(self, *key):
+        """
+        Drops cached entries whose key starts with ``key``: nothing for
+        everything, ``("objects", db)`` for every schema of ``db``, and so on.
+        """
+        with self._lock:
+            for cached in [k for k in self._entries if k[:len(key)] == key]:
+                del self._entries[cached]
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class NameIndex:
+    """Prefix and trigram index over object names for search-as-you-type."""
+
+    def __init__(self, names):
+        self.names = sorted(set(names), key=str.upper)
+        self._upper = [name.upper() for name in self.names]
+        self._trigrams = {}
+        for position, name in enumerate(self._upper):
+            for trigram in _trigrams(name):
+                self._trigrams.setdefault(trigram, []).append(position)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _rank(self, query, position):
+        name = self._upper[position]
+        if name == query:
+            kind = 0
+        elif name.startswith(query):
+            kind = 1
+        elif ("_" + query) in name:
+            kind = 2
+        else:
+            kind = 3
+        return kind, len(name), name
+
+    def search(self, query, limit=None):
+        """
+        Names matching ``query``: exact, prefix, word-prefix and substring
+        matches in that order, or names sharing the most trigrams when
+        nothing contains ``query``. An empty query returns every name.
+        """
+        query = (query or "").strip().upper()
+        if not query:
+            return self.names[:limit] if limit else list(self.names)
+
+        # Prefix matches are one contiguous range of the sorted names
+        positions = set(self._prefix_range(query))
+        if len(query) < 3:
+            positions.update(i for i, name in enumerate(self._upper) if query in name)
+        else:
+            candidates = None
+            for trigram in _trigrams(query):
+                postings = self._trigrams.get(trigram, ())
+                candidates = set(postings) if candidates is None else candidates.intersection(postings)
+                if not candidates:
+                    break
+            positions.update(i for i in candidates or () if query in self._upper[i])
+        positions = list(positions)
+
+        if positions:
+            positions.sort(key=lambda i: self._rank(query, i))
+        elif len(query) >= 3:
+            # No substring match: fall back to the closest names by shared trigrams
+            shared = Counter()
+            for trigram in _trigrams(query):
+                shared.update(self._trigrams.get(trigram, ()))
+            minimum = max(1, len(_trigrams(query)) // 2)
+            positions = [i for i, count in sorted(
+                shared.items(), key=lambda item: (-item[1], len(self._upper[item[0]])))
+                if count >= minimum]
+        return [self.names[i] for i in positions[:limit]]
+
+    def _prefix_range(self, query):
+        start = bisect.bisect_left(self._upper, query)
+        # "\uffff" sorts after every character a name can continue with
+        end = bisect.bisect_right(self._upper, query + "\uffff", lo=start)
+        return range(start, end)
@@ -0,0 +1,170 @@
+"""
+Chart data preparation for query results.
+
+Instead of handing every row of a result to ``st.line_chart``, the x axis is
+classified as time, numeric or category and a bucketed ``GROUP BY`` (with
+``TIME_SLICE`` for time axes) is pushed down to the cached result, so the
+number of points matches the chart resolution. When push-down is not
+possible the rows already on the client are downsampled with LTTB.
+"""
+import numpy as np
+import pandas as pd
+
+from schema_metadata import quote_identifier
+
+# (unit, size, approximate seconds) candidates for TIME_SLICE buckets
+TIME_BUCKETS = [
+    ("SECOND", 1, 1), ("SECOND", 5, 5), ("SECOND", 15, 15), ("SECOND", 30, 30),
+    ("MINUTE", 1, 60), ("MINUTE", 5, 300), ("MINUTE", 15, 900), ("MINUTE", 30, 1800),
+    ("HOUR", 1, 3600), ("HOUR", 3, 10800), ("HOUR", 6, 21600), ("HOUR", 12, 43200),
+    ("DAY", 1, 86400), ("WEEK", 1, 604800), ("MONTH", 1, 2629746),
+    ("QUARTER", 1, 7889238), ("YEAR", 1, 31556952),
+]
+
+# pandas names of the SQL aggregates used for the client-side fallback
+PANDAS_AGGREGATES = {"AVG": "mean", "SUM": "sum", "MIN": "min", "MAX": "max",
+                     "MEDIAN": "median", "COUNT": "count"}
+
+
+def detect_axis(df):
+    """
+    Classifies the first column of ``df`` as a ``"time"``, ``"numeric"`` or
+    ``"category"`` axis and returns it with the numeric value columns.
+    """
+    axis = df.columns[0]
+    values = [column for column in df.columns[1:]
+              if pd.api.types.is_numeric_dtype(df[column])]
+    series = df[axis]
+    if pd.api.types.is_datetime64_any_dtype(series):
+        kind = "time"
+    elif series.dtype == object and len(series.dropna()) > 0 and all(
+            hasattr(value, "year") for value in series.dropna().head(20)):
+        # DATE columns arrive as datetime.date objects
+        kind = "time"
+    elif pd.api.types.is_numeric_dtype(series):
+        kind = "numeric"
+    else:
+        kind = "category"
+    return axis, kind, values
+
+
+def pick_time_bucket(span_seconds, max_points):
+    """Smallest TIME_SLICE bucket that keeps the series under ``max_points``."""
+    for unit, size, seconds in TIME_BUCKETS:
+        if span_seconds / seconds <= max_points:
+            return unit, size
+    return TIME_BUCKETS[-1][:2]
+
+
+def lttb(df, x_column, y_column, threshold):
+    """
+    Largest-Triangle-Three-Buckets downsampling of ``df`` to ``threshold``
+    rows, choosing rows by the shape of ``y_column`` over ``x_column``.
+    """
+    length = len(df.index)
+    if threshold >= length or threshold < 3:
+        return df
+
+    x = df[x_column].to_numpy()
+    if not np.issubdtype(x.dtype, np.number):
+        x = np.arange(length, dtype=float)
+    x = x.astype(float)
+    y = df[y_column].to_numpy(dtype=float)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    edges = np.linspace(1, length - 1, threshold - 1).astype(np.int64)
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start = end
+        next_end = edges[i + 2] if i + 2 < len(edges) else length
+        average_x = x[next_start:next_end].mean()
+        average_y = y[next_start:next_end].mean()
+        areas = np.abs(
+            (x[previous] - average_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (average_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        selected[i + 1] = previous
+    return df.iloc[selected]
+
+
+def _pushdown(session, query_id, axis, kind, values, max_points, aggregate):
+    source = f"TABLE(RESULT_SCAN('{query_id}'))"
+    x = quote_identifier(axis)
+    aggregates = ", ".join(
+        f"{aggregate}({quote_identifier(column)}) AS {quote_identifier(column)}"
+        for column in values)
+
+    if kind == "category":
+        # Categories are ranked on the first value column; the rest are
+        # aggregated into 'Other' from the rows themselves, since an average
+        # of averages is not the average. Categories keep their order in
+        # the result, with 'Other' last.
+        first = quote_identifier(values[0])
+        query = f"""
+        WITH categories AS (
+            SELECT {x} AS __CATEGORY, MIN(SEQ8()) AS __POSITION,
+                   ROW_NUMBER() OVER (ORDER BY {aggregate}({first}) DESC NULLS LAST) AS __RANK
+            FROM {source} GROUP BY 1
+        )
+        SELECT IFF(c.__RANK < {int(max_points)}, TO_VARCHAR(r.{x}), 'Other') AS {x}, {aggregates}
+        FROM {source} r JOIN categories c ON EQUAL_NULL(r.{x}, c.__CATEGORY)
+        GROUP BY 1 ORDER BY MIN(c.__RANK) >= {int(max_points)}, MIN(c.__POSITION)
+        """
+        return session.sql(query).to_pandas()
+
+    bounds = session.sql(
+        f"SELECT MIN({x}) AS LO, MAX({x}) AS HI, COUNT(*) AS N FROM {source}").collect()[0]
+    if bounds['N'] <= max_points or bounds['LO'] is None:
+        return session.sql(
+            f"SELECT {x}, {', '.join(quote_identifier(c) for c in values)} "
+            f"FROM {source} ORDER BY 1").to_pandas()
+
+    if kind == "time":
+        span = (pd.Timestamp(bounds['HI']) - pd.Timestamp(bounds['LO'])).total_seconds()
+        unit, size = pick_time_bucket(span, max_points)
+        query = f"""
+        SELECT TIME_SLICE(TO_TIMESTAMP_NTZ({x}), {size}, '{unit}') AS {x}, {aggregates}
+        FROM {source} GROUP BY 1 ORDER BY 1
+        """
+    else:
+        query = f"""
+        SELECT MIN({x}) AS {x}, {aggregates}
+        FROM {source}
+        GROUP BY WIDTH_BUCKET({x}, {bounds['LO']}, {bounds['HI']}, {int(max_points)})
+        ORDER BY 1
+        """
+    return session.sql(query).to_pandas()
+
+
+def prepare_chart_data(session, result, max_points=1000, aggregate="AVG"):
+    """
+    Returns chart-ready data for a ``BatchedResult``, indexed by its x axis
+    and holding at most about ``max_points`` rows.
+    """
+    df = result.frame()
+    if len(df.columns) < 2:
+        return df
+    axis, kind, values = detect_axis(df)
+    if not values:
+        return df.set_index(axis)
+
+    if result.has_more and result.query_id:
+        try:
+            chart_df = _pushdown(session, result.query_id, axis, kind, values,
+                                 max_points, aggregate)
+            return chart_df.set_index(chart_df.columns[0])
+        except Exception:
+            pass
+
+    df = df[[axis] + values]
+    if kind != "category":
+        df = df.sort_values(axis)
+        df = lttb(df, axis, values[0], max_points)
+    else:
+        df = df.groupby(axis, sort=False)[values].agg(PANDAS_AGGREGATES[aggregate.upper()]).reset_index()
+        # The largest groups, in the order they appear in the result
+        df = df[df.index.isin(df.nlargest(max_points, values[0]).index)]
+    return df.set_index(axis)
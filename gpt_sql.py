@@ -0,0 +1,303 @@
+"""
+Helpers for the GPT-4 text-to-SQL and summarization UDFs.
+
+The batch functions load every question (or query result) into a temporary
+table and invoke the UDF once over the whole table, so the warehouse can
+parallelize the external function calls instead of paying one
+compile-and-execute round trip per question.
+
+The packed functions group several questions into one prompt that shares a
+single copy of the schema metadata, asking the model for a JSON array of SQL
+statements. Any item that fails to parse falls back to a single-question call.
+
+Schema metadata is stored once in a table keyed by its content hash, so the
+per-question statements only carry the hash and the bound question instead
+of tens of KB of metadata inlined as a SQL string literal. The table is
+created once per session, which also drops rows not registered for
+``METADATA_RETENTION_DAYS`` days.
+"""
+import hashlib
+import json
+import re
+import threading
+import uuid
+import weakref
+
+# Rough characters-per-token ratio used for prompt budgeting
+CHARS_PER_TOKEN = 4
+# Tokens reserved per packed question for the generated SQL
+OUTPUT_TOKENS_PER_QUESTION = 200
+# Table holding schema metadata keyed by content hash
+METADATA_TABLE = "GPT_SCHEMA_METADATA"
+# Days a metadata row is kept after it was last registered
+METADATA_RETENTION_DAYS = 7
+
+# Metadata tables already created, per session
+_metadata_tables = weakref.WeakKeyDictionary()
+_metadata_tables_lock = threading.Lock()
+
+
+def remove_sql_markers(text):
+    pattern = r"```sql(.*?)```"
+    cleaned_text = re.sub(pattern, r"\1", text, flags=re.DOTALL)
+    return cleaned_text.strip()
+
+
+def clean_sql_response(response):
+    """Strips markdown fences and backticks from a generated SQL statement."""
+    if response is None:
+        return None
+    return remove_sql_markers(response).replace('`', '')
+
+
+def _load_temp_table(session, values, column):
+    """Writes ``values`` into a new temporary table keyed by row id."""
+    table_name = f"GPT_BATCH_{uuid.uuid4().hex[:12].upper()}"
+    rows = [(row_id, value) for row_id, value in enumerate(values)]
+    session.create_dataframe(rows, schema=["ID", column]).write.save_as_table(
+        table_name, mode="overwrite", table_type="temporary")
+    return table_name
+
+
+def _run_batch(session, values, column, udf_call, params=None, on_response=None):
+    """
+    Runs ``udf_call`` once over a temp table and maps outputs back by id.
+    ``on_response(index, response)`` is called in order while the rows are
+    read, as soon as every earlier response has been mapped back.
+    """
+    if len(values) == 0:
+        return []
+
+    responses = [None] * len(values)
+    received = [False] * len(values)
+    done = 0
+    table_name = _load_temp_table(session, values, column)
+    try:
+        rows = session.sql(
+            f"SELECT ID, {udf_call} AS RESPONSE FROM {table_name} ORDER BY ID",
+            params=params).to_local_iterator()
+        for row in rows:
+            index = int(row['ID'])
+            responses[index] = row['RESPONSE']
+            received[index] = True
+            while on_response is not None and done < len(values) and received[done]:
+                on_response(done, responses[done])
+                done += 1
+    finally:
+        session.sql(f"DROP TABLE IF EXISTS {table_name}").collect()
+
+    if on_response is not None:
+        # Items the UDF returned no row for
+        for index in range(done, len(values)):
+            on_response(index, responses[index])
+    return responses
+
+
+def batch_gpt4_sql(session, questions, json_data_str, udf_name="CHATGPT_4"):
+    """
+    Generates SQL for every question with a single set-based UDF invocation.
+    Returns the cleaned SQL statements in the same order as ``questions``;
+    a question the UDF returned nothing for maps to ``None``.
+    """
+    responses = _run_batch(
+        session, list(questions), "QUESTION",
+        f"{udf_name}(QUESTION, ?)", params=[json_data_str])
+    return [clean_sql_response(response) for response in responses]
+
+
+def batch_summarize(session, results, udf_name="CHATGPT_4_summarize", on_summary=None):
+    """
+    Summarizes every result string with a single set-based UDF invocation.
+    ``on_summary(index, summary)`` is called in order as each summary is
+    mapped back, so callers can use it before the whole batch is read.
+    """
+    return _run_batch(session, list(results), "INPUT", f"{udf_name}(INPUT)",
+                      on_response=on_summary)
+
+
+def estimate_tokens(text):
+    """Cheap token estimate for prompt budgeting."""
+    return len(text or "") // CHARS_PER_TOKEN + 1
+
+
+def is_valid_sql(statement):
+    """True if ``statement`` looks like a single read-only query."""
+    if not isinstance(statement, str):
+        return False
+    return re.match(r"\s*(SELECT|WITH)\b", statement, re.IGNORECASE) is not None
+
+
+def plan_packs(questions, json_data_str, token_budget=32000, max_pack_size=20):
+    """
+    Groups question indexes into packs whose prompt (shared schema context,
+    questions and reserved output) stays under ``token_budget``. The pack
+    size adapts to question length; a question that does not fit with any
+    other is placed in a pack on its own.
+    """
+    available = token_budget - estimate_tokens(json_data_str)
+    packs = []
+    current = []
+    used = 0
+    for index, question in enumerate(questions):
+        cost = estimate_tokens(question) + OUTPUT_TOKENS_PER_QUESTION
+        if current and (used + cost > available or len(current) >= max_pack_size):
+            packs.append(current)
+            current = []
+            used = 0
+        current.append(index)
+        used += cost
+    if current:
+        packs.append(current)
+    return packs
+
+
+def build_packed_prompt(questions):
+    """Builds one prompt asking for a JSON array with one SQL per question."""
+    lines = [
+        f"Answer each of the following {len(questions)} questions with one "
+        "Snowflake SQL query using the schema metadata provided.",
+        f"Return only a JSON array of exactly {len(questions)} strings, where "
+        "element i is the SQL query for question i. Do not add explanations.",
+        "",
+    ]
+    for number, question in enumerate(questions, start=1):
+        lines.append(f"{number}. {question}")
+    return "\n".join(lines)
+
+
+def parse_packed_response(response, expected):
+    """
+    Parses a packed JSON-array response into ``expected`` SQL statements.
+    Items that are missing or not valid SQL are returned as ``None``.
+    """
+    statements = [None] * expected
+    if not response:
+        return statements
+
+    text = re.sub(r"```(?:json)?", "", response)
+    start = text.find("[")
+    end = text.rfind("]")
+    if start == -1 or end <= start:
+        return statements
+    try:
+        items = json.loads(text[start:end + 1])
+    except ValueError:
+        return statements
+    if not isinstance(items, list):
+        return statements
+
+    for index, item in enumerate(items[:expected]):
+        if isinstance(item, dict):
+            item = item.get("sql")
+        statement = clean_sql_response(item) if isinstance(item, str) else None
+        if is_valid_sql(statement):
+            statements[index] = statement
+    return statements
+
+
+def gpt4_sql_single(session, question, json_data_str, udf_name="CHATGPT_4"):
+    """Generates SQL for one question with bound parameters."""
+    result = session.sql(
+        f"SELECT {udf_name}(?, ?)", params=[question, json_data_str]).collect()
+    return clean_sql_response(result[0][0])
+
+
+def gpt4_sql_packed(session, questions, json_data_str, token_budget=32000,
+                    max_pack_size=20, udf_name="CHATGPT_4"):
+    """
+    Generates SQL for all questions, sending the schema metadata once per
+    pack instead of once per question. Returns the statements in order and
+    the number of items that needed a single-question fallback; an item
+    whose single-question call failed maps to the exception it raised.
+    """
+    questions = list(questions)
+    statements = [None] * len(questions)
+    fallbacks = 0
+
+    for pack in plan_packs(questions, json_data_str, token_budget, max_pack_size):
+        if len(pack) > 1:
+            prompt = build_packed_prompt([questions[i] for i in pack])
+            try:
+                result = session.sql(
+                    f"SELECT {udf_name}(?, ?)",
+                    params=[prompt, json_data_str]).collect()
+                parsed = parse_packed_response(result[0][0], len(pack))
+            except Exception:
+                parsed = [None] * len(pack)
+            for index, statement in zip(pack, parsed):
+                statements[index] = statement
+
+        for index in pack:
+            if statements[index] is None:
+                if len(pack) > 1:
+                    fallbacks += 1
+                try:
+                    statements[index] = gpt4_sql_single(
+                        session, questions[index], json_data_str, udf_name)
+                except Exception as e:
+                    statements[index] = e
+
+    return statements, fallbacks
+
+
+def metadata_hash(metadata):
+    """Content hash used as the id of a schema metadata string."""
+    return hashlib.sha256(metadata.encode('utf-8')).hexdigest()
+
+
+def ensure_metadata_table(session, table_name=METADATA_TABLE,
+                          retention_days=METADATA_RETENTION_DAYS):
+    """
+    Creates ``table_name`` and drops its expired rows, once per session;
+    later calls on the same session return without a round trip.
+    """
+    with _metadata_tables_lock:
+        created = _metadata_tables.setdefault(session, set())
+        if table_name in created:
+            return
+    session.sql(f"""
+    CREATE TABLE IF NOT EXISTS {table_name} (
+        HASH STRING,
+        METADATA STRING,
+        CREATED_AT TIMESTAMP_LTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """).collect()
+    if retention_days is not None:
+        session.sql(
+            f"DELETE FROM {table_name} WHERE CREATED_AT < DATEADD(DAY, -?, CURRENT_TIMESTAMP())",
+            params=[int(retention_days)]).collect()
+    with _metadata_tables_lock:
+        created.add(table_name)
+
+
+def register_metadata(session, metadata, table_name=METADATA_TABLE):
+    """
+    Stores ``metadata`` in ``table_name`` unless a row with the same content
+    hash already exists, and returns the hash. Registering existing metadata
+    again renews its ``CREATED_AT``, so metadata in use does not expire.
+    """
+    digest = metadata_hash(metadata)
+    ensure_metadata_table(session, table_name)
+    session.sql(f"""
+    MERGE INTO {table_name} t
+    USING (SELECT ? AS HASH, ? AS METADATA) s
+    ON t.HASH = s.HASH
+    WHEN MATCHED THEN UPDATE SET t.CREATED_AT = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (HASH, METADATA) VALUES (s.HASH, s.METADATA)
+    """, params=[digest, metadata]).collect()
+    return digest
+
+
+def gpt4_sql_by_id(session, question, metadata_id, udf_name="CHATGPT_4",
+                   table_name=METADATA_TABLE):
+    """
+    Generates SQL for ``question`` using the metadata registered under
+    ``metadata_id``. The statement text is constant; the question and the id
+    are bound parameters and the metadata is joined in from the table.
+    """
+    result = session.sql(
+        f"SELECT {udf_name}(?, m.METADATA) FROM {table_name} m WHERE m.HASH = ?",
+        params=[question, metadata_id]).collect()
+    if len(result) == 0:
+        raise Exception(f"Schema metadata {metadata_id} is not registered")
+    return clean_sql_response(result[0][0])
@@ -0,0 +1,202 @@
+"""
+Local stand-in for a Snowpark session.
+
+Lets the helper modules used by the Streamlit apps run without a Snowflake
+connection. Statements passed to ``sql()`` are matched against registered
+handlers, and temporary tables written through ``create_dataframe`` are kept
+in memory so handlers can read them back.
+"""
+import hashlib
+import io
+import re
+import threading
+import uuid
+
+
+class LocalRow(tuple):
+    """Row supporting positional, key and attribute access like a Snowpark Row."""
+
+    def __new__(cls, fields: dict):
+        row = super().__new__(cls, tuple(fields.values()))
+        row._fields = list(fields.keys())
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return tuple.__getitem__(self, self._fields.index(key))
+        return tuple.__getitem__(self, key)
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except ValueError:
+            raise AttributeError(name)
+
+    def as_dict(self) -> dict:
+        return dict(zip(self._fields, self))
+
+
+class LocalDataFrame:
+    """Result of ``LocalSession.sql`` or ``LocalSession.create_dataframe``."""
+
+    def __init__(self, session, query=None, params=None, rows=None):
+        self._session = session
+        self._query = query
+        self._params = params
+        self._rows = rows
+        self.write = _LocalWriter(self)
+
+    def collect(self) -> list:
+        if self._rows is None:
+            self._rows = self._session._execute(self._query, self._params)
+        return [LocalRow(row) for row in self._rows]
+
+    def to_local_iterator(self):
+        return iter(self.collect())
+
+    def to_pandas(self):
+        import pandas as pd
+        self.collect()
+        return pd.DataFrame(self._rows)
+
+    def to_pandas_batches(self, batch_size: int = 1000):
+        import pandas as pd
+        self.collect()
+        for start in range(0, max(len(self._rows), 1), batch_size):
+            yield pd.DataFrame(self._rows[start:start + batch_size])
+
+    def collect_nowait(self):
+        return LocalAsyncJob(self)
+
+
+class LocalAsyncJob:
+    """Runs a statement on a background thread, like a Snowpark AsyncJob."""
+
+    def __init__(self, df: LocalDataFrame):
+        self.query_id = uuid.uuid4().hex
+        self.cancelled = False
+        self._df = df
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        df._session.jobs[self.query_id] = self
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._df.collect()
+        except Exception as e:
+            self._error = e
+
+    def is_done(self) -> bool:
+        return self.cancelled or not self._thread.is_alive()
+
+    def cancel(self) -> None:
+        self.cancelled = True
+
+    def result(self, result_type: str = "row"):
+        self._thread.join()
+        if self.cancelled:
+            raise Exception(f"Query {self.query_id} was cancelled")
+        if self._error is not None:
+            raise self._error
+        if result_type == "pandas":
+            return self._df.to_pandas()
+        if result_type == "pandas_batches":
+            return self._df.to_pandas_batches()
+        return self._df.collect()
+
+
+class _LocalWriter:
+    def __init__(self, df: LocalDataFrame):
+        self._df = df
+
+    def save_as_table(self, table_name: str, mode: str = "errorifexists", table_type: str = "") -> None:
+        session = self._df._session
+        key = table_name.upper()
+        if mode == "append" and key in session.tables:
+            session.tables[key].extend(self._df._rows)
+        else:
+            session.tables[key] = list(self._df._rows)
+
+
+class PutResult:
+    def __init__(self, source, target, status):
+        self.source = source
+        self.target = target
+        self.status = status
+
+
+class LocalFileOperation:
+    """In-memory replacement for ``session.file``; stage paths map to bytes."""
+
+    def __init__(self):
+        self.files = {}
+
+    @staticmethod
+    def _normalize(stage_location):
+        return stage_location.lstrip("@").strip("/")
+
+    def put_stream(self, input_stream, stage_location, auto_compress=True, overwrite=False):
+        path = self._normalize(stage_location)
+        self.files[path] = input_stream.read()
+        return PutResult(path, path, "UPLOADED")
+
+    def get_stream(self, stage_location):
+        path = self._normalize(stage_location)
+        if path not in self.files:
+            raise Exception(f"File {stage_location} does not exist")
+        return io.BytesIO(self.files[path])
+
+    def list(self, stage_location, pattern=None):
+        """Rows of ``LIST @stage_location [PATTERN = '...']``."""
+        prefix = self._normalize(stage_location)
+        return [{"name": path, "size": len(data), "md5": hashlib.md5(data).hexdigest(),
+                 "last_modified": None}
+                for path, data in sorted(self.files.items())
+                if (path + "/").startswith(prefix + "/")
+                and (pattern is None or re.fullmatch(pattern, path))]
+
+
+class LocalSession:
+    """Minimal Snowpark ``Session`` replacement backed by SQL handlers."""
+
+    def __init__(self):
+        self.handlers = []
+        self.tables = {}
+        self.queries = []
+        self.file = LocalFileOperation()
+        self.jobs = {}
+
+    def register(self, pattern: str, handler) -> None:
+        """
+        Route statements matching ``pattern`` (case-insensitive regex searched
+        anywhere in the statement) to ``handler(session, match, params)``.
+        The handler returns a list of dicts, one per row.
+        """
+        self.handlers.append((re.compile(pattern, re.IGNORECASE | re.DOTALL), handler))
+
+    def sql(self, query: str, params=None) -> LocalDataFrame:
+        return LocalDataFrame(self, query=query, params=params)
+
+    def create_async_job(self, query_id: str):
+        return self.jobs[query_id]
+
+    def create_dataframe(self, data, schema) -> LocalDataFrame:
+        rows = [dict(zip(schema, values)) for values in data]
+        return LocalDataFrame(self, rows=rows)
+
+    def _execute(self, query: str, params) -> list:
+        self.queries.append((query, params))
+        for pattern, handler in self.handlers:
+            match = pattern.search(query)
+            if match:
+                return list(handler(self, match, params) or [])
+        if re.match(r"\s*DROP\s+TABLE", query, re.IGNORECASE):
+            name = query.split()[-1].strip(";").upper()
+            self.tables.pop(name, None)
+            return [{"status": f"{name} successfully dropped."}]
+        listing = re.match(r"\s*LIST\s+(@\S+)(?:\s+PATTERN\s*=\s*'(.*)')?\s*;?\s*$",
+                           query, re.IGNORECASE | re.DOTALL)
+        if listing:
+            return self.file.list(listing.group(1), listing.group(2))
+        raise Exception(f"LocalSession has no handler for statement: {query}")
@@ -0,0 +1,217 @@
+"""
+Offline validation of Cortex Analyst semantic models.
+
+``validate_model`` checks a model in one pass before it is uploaded:
+required fields and their types, duplicate names, ``<...>`` placeholders
+left by the YAML generator, ``data_type`` and ``default_aggregation``
+values, and, given the column lists of the schema (for example from the
+fingerprint sidecar written with the model), every column an ``expr``
+refers to. All issues are returned together instead of one per rejected
+Analyst request.
+"""
+import re
+
+from query_exec import SQL_TOKEN
+from semantic_model import NUMERIC_TYPES, SECTIONS, TEXT_TYPES, TIME_TYPES, simple_type
+
+PLACEHOLDER = re.compile(r"^<[^<>]*>$")
+
+DATA_TYPES = TIME_TYPES | TEXT_TYPES | NUMERIC_TYPES | {
+    "BOOLEAN", "VARIANT", "OBJECT", "ARRAY", "GEOGRAPHY", "GEOMETRY"}
+AGGREGATIONS = {"sum", "avg", "min", "max", "median", "count", "count_distinct"}
+
+# Words in an expr that are not column references
+SQL_WORDS = {
+    "AND", "OR", "NOT", "NULL", "IS", "IN", "LIKE", "ILIKE", "BETWEEN", "CASE",
+    "WHEN", "THEN", "ELSE", "END", "AS", "TRUE", "FALSE", "DISTINCT", "INTERVAL",
+    "CURRENT_DATE", "CURRENT_TIMESTAMP", "CURRENT_TIME", "ASC", "DESC", "OVER",
+    "PARTITION", "BY", "ORDER", "ROWS", "RANGE", "PRECEDING", "FOLLOWING",
+    "UNBOUNDED", "CURRENT", "ROW", "FROM", "FOR",
+} | DATA_TYPES
+
+# Functions whose first argument is a date or time part (DATEADD(month, ...),
+# EXTRACT(YEAR FROM ...)) rather than a column
+DATE_PART_FUNCTIONS = {
+    "DATEADD", "DATEDIFF", "DATE_PART", "DATE_TRUNC", "EXTRACT", "TIMEADD", "TIMEDIFF",
+    "TIMESTAMPADD", "TIMESTAMPDIFF",
+}
+
+
+def columns_by_table(state):
+    """Upper-cased column names per table from a fingerprint sidecar's ``"columns"``."""
+    return {table_name: {name.upper() for name in names}
+            for table_name, names in (state or {}).get("columns", {}).items()}
+
+
+def expr_columns(expr):
+    """Column names referenced by a SQL expression (last part of dotted names)."""
+    tokens = [(m.lastgroup, m.group()) for m in SQL_TOKEN.finditer(expr)
+              if m.lastgroup not in ("space", "comment")]
+    columns = []
+    for index, (kind, text) in enumerate(tokens):
+        if kind not in ("word", "quoted"):
+            continue
+        previous = tokens[index - 1][1] if index else ""
+        following = tokens[index + 1][1] if index + 1 < len(tokens) else ""
+        if following in ("(", "."):
+            # Function call, or a table qualifier
+            continue
+        if previous == ":" or (kind == "word" and text.upper() in SQL_WORDS):
+            # Cast target (::TYPE) or keyword
+            continue
+        if (kind == "word" and previous == "(" and index > 1
+                and tokens[index - 2][1].upper() in DATE_PART_FUNCTIONS):
+            # Date or time part
+            continue
+        columns.append(text[1:-1].replace('""', '"') if kind == "quoted" else text.upper())
+    return columns
+
+
+class _Report:
+    def __init__(self):
+        self.issues = []
+
+    def add(self, level, path, message):
+        self.issues.append({"level": level, "path": path, "message": message})
+
+    def require_string(self, item, key, path):
+        value = item.get(key)
+        if not isinstance(value, str) or not value.strip():
+            self.add("error", f"{path}.{key}", f"'{key}' must be a non-empty string")
+            return None
+        return value
+
+
+def _check_placeholders(report, value, path):
+    if isinstance(value, str):
+        if PLACEHOLDER.match(value.strip()):
+            report.add("error", path, f"placeholder value {value!r}")
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _check_placeholders(report, item, f"{path}.{key}")
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            _check_placeholders(report, item, f"{path}[{index}]")
+
+
+def _check_column(report, section, column, path, table_columns):
+    report.require_string(column, "name", path)
+    expr = report.require_string(column, "expr", path)
+
+    synonyms = column.get("synonyms")
+    if synonyms is not None and (not isinstance(synonyms, list)
+                                 or not all(isinstance(s, str) for s in synonyms)):
+        report.add("error", f"{path}.synonyms", "'synonyms' must be a list of strings")
+
+    if section != "filters":
+        data_type = column.get("data_type")
+        if not isinstance(data_type, str) or simple_type(data_type) not in DATA_TYPES:
+            report.add("error", f"{path}.data_type", f"unknown data_type {data_type!r}")
+        elif section == "time_dimensions" and simple_type(data_type) not in TIME_TYPES:
+            report.add("warning", f"{path}.data_type",
+                       f"time dimension with non-temporal data_type {data_type!r}")
+        elif section == "measures" and simple_type(data_type) not in NUMERIC_TYPES:
+            report.add("warning", f"{path}.data_type",
+                       f"measure with non-numeric data_type {data_type!r}")
+
+    if "unique" in column and not isinstance(column["unique"], bool):
+        report.add("error", f"{path}.unique", "'unique' must be true or false")
+
+    if section == "measures" and "default_aggregation" in column:
+        aggregation = column["default_aggregation"]
+        if not isinstance(aggregation, str) or (
+                aggregation.lower() not in AGGREGATIONS and not PLACEHOLDER.match(aggregation)):
+            report.add("error", f"{path}.default_aggregation",
+                       f"unknown default_aggregation {aggregation!r}")
+
+    sample_values = column.get("sample_values")
+    if sample_values is not None:
+        if not isinstance(sample_values, list):
+            report.add("error", f"{path}.sample_values", "'sample_values' must be a list")
+        elif any(value in ("", None) for value in sample_values):
+            report.add("warning", f"{path}.sample_values", "empty sample values")
+
+    if expr and table_columns is not None and not PLACEHOLDER.match(expr.strip()):
+        for name in expr_columns(expr):
+            if name.upper() not in table_columns:
+                report.add("error", f"{path}.expr", f"column {name!r} not found in the table")
+
+
+def validate_model(model, columns=None):
+    """
+    Returns every issue found in ``model`` as ``{"level", "path", "message"}``
+    dicts; ``level`` is ``"error"`` or ``"warning"``. ``columns`` maps table
+    names to sets of upper-cased column names (``columns_by_table``); exprs
+    of tables not in it are not cross-referenced.
+    """
+    report = _Report()
+    if not isinstance(model, dict):
+        report.add("error", "", "the model must be a mapping")
+        return report.issues
+
+    report.require_string(model, "name", "model")
+    tables = model.get("tables")
+    if not isinstance(tables, list) or not tables:
+        report.add("error", "model.tables", "'tables' must be a non-empty list")
+        tables = []
+    _check_placeholders(report, {key: value for key, value in model.items() if key != "tables"},
+                        "model")
+
+    table_names = set()
+    for table_index, table in enumerate(tables):
+        path = f"tables[{table_index}]"
+        if not isinstance(table, dict):
+            report.add("error", path, "table entries must be mappings")
+            continue
+        table_name = report.require_string(table, "name", path)
+        if table_name:
+            path = f"tables[{table_index}] ({table_name})"
+            if table_name.upper() in table_names:
+                report.add("error", f"{path}.name", f"duplicate table name {table_name!r}")
+            table_names.add(table_name.upper())
+
+        base_table = table.get("base_table")
+        if not isinstance(base_table, dict):
+            report.add("error", f"{path}.base_table", "'base_table' must be a mapping")
+            base_table = {}
+        for key in ("database", "schema", "table"):
+            report.require_string(base_table, key, f"{path}.base_table")
+        _check_placeholders(report, {key: value for key, value in table.items()
+                                     if key not in SECTIONS + ("filters",)}, path)
+
+        table_columns = None
+        if columns is not None:
+            table_columns = columns.get(base_table.get("table")) or columns.get(table_name)
+
+        names = set()
+        for section in SECTIONS + ("filters",):
+            items = table.get(section)
+            if items is None:
+                continue
+            if not isinstance(items, list):
+                report.add("error", f"{path}.{section}", f"'{section}' must be a list")
+                continue
+            for index, column in enumerate(items):
+                column_path = f"{path}.{section}[{index}]"
+                if not isinstance(column, dict):
+                    report.add("error", column_path, "entries must be mappings")
+                    continue
+                _check_placeholders(report, column, column_path)
+                _check_column(report, section, column, column_path, table_columns)
+                name = column.get("name")
+                if isinstance(name, str) and not PLACEHOLDER.match(name.strip()):
+                    if name.upper() in names:
+                        report.add("error", f"{column_path}.name",
+                                   f"duplicate name {name!r} in table")
+                    names.add(name.upper())
+    return report.issues
+
+
+def format_issues(issues, limit=None):
+    """One line per issue, errors first."""
+    ordered = sorted(issues, key=lambda issue: issue["level"] != "error")
+    lines = [f"{issue['level'].upper()} {issue['path']}: {issue['message']}"
+             for issue in ordered[:limit]]
+    if limit is not None and len(ordered) > limit:
+        lines.append(f"... and {len(ordered) - limit} more")
+    return "\n".join(lines)
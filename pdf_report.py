@@ -0,0 +1,182 @@
+"""
+Streaming PDF report renderer for the GPT-4 report page.
+
+``ReportWriter`` renders each question's section as soon as its answer is
+available, using one precompiled line tokenizer (headings, list items, table
+rows) and one precompiled inline tokenizer (bold, italic). Fonts are only
+changed when the style actually changes, and the finished document is
+written straight to a temporary file instead of being copied through a
+string and a ``BytesIO``.
+
+Rendering sections early spreads the work over the run, but it does not
+bound memory: FPDF 1.7 keeps every rendered page in memory until
+``output`` is called, so the size of the finished document is still held
+by the process until ``close``.
+
+Run this module directly to benchmark a 1,000-question report.
+"""
+import os
+import re
+import tempfile
+import time
+
+from fpdf import FPDF
+
+FONT = "Arial"
+LINE_HEIGHT = 6
+
+# One regex per line kind, tried in order by a single alternation
+LINE_TOKEN = re.compile(r"""
+    ^(?P<heading>\#{1,6})\s+(?P<heading_text>.*)$
+  | ^(?P<table_rule>\s*\|?(?:\s*:?-{3,}:?\s*\|)+\s*:?-*:?\s*\|?\s*)$
+  | ^(?P<table_row>\s*\|.*\|\s*)$
+  | ^(?P<bullet>\s*(?:[-*+]|\d+[.)]))\s+(?P<item_text>.*)$
+  | ^(?P<blank>\s*)$
+""", re.VERBOSE)
+
+# Bold before italic so that ** is never read as two single *
+INLINE_TOKEN = re.compile(r"\*\*(?P<bold>.+?)\*\*|\*(?P<italic>[^*]+?)\*")
+
+HEADING_SIZES = {1: 16, 2: 15, 3: 14, 4: 12, 5: 12, 6: 12}
+
+
+def to_latin1(text):
+    """The core PDF fonts only cover Latin-1."""
+    return str(text).encode("latin-1", "replace").decode("latin-1")
+
+
+def strip_inline(text):
+    """Drops bold/italic markers where styles cannot be mixed."""
+    return INLINE_TOKEN.sub(lambda m: m.group("bold") or m.group("italic"), text)
+
+
+class ReportWriter:
+    """Builds a report section by section and writes it to a file."""
+
+    def __init__(self, title="GPT-4 Query Report", path=None):
+        self.path = path
+        self.sections = 0
+        self._font = None
+        self.pdf = FPDF()
+        self.pdf.set_auto_page_break(True, margin=15)
+        self.pdf.add_page()
+        self._set_font("B", 16)
+        self.pdf.cell(0, 10, to_latin1(title), ln=True, align='C')
+
+    def _set_font(self, style, size):
+        if self._font != (style, size):
+            self.pdf.set_font(FONT, style, size)
+            self._font = (style, size)
+
+    def _write_inline(self, text, size=12):
+        """Writes one line of text, switching style only at bold/italic runs."""
+        position = 0
+        for match in INLINE_TOKEN.finditer(text):
+            if match.start() > position:
+                self._set_font("", size)
+                self.pdf.write(LINE_HEIGHT, to_latin1(text[position:match.start()]))
+            if match.group("bold") is not None:
+                self._set_font("B", size)
+                self.pdf.write(LINE_HEIGHT, to_latin1(match.group("bold")))
+            else:
+                self._set_font("I", size)
+                self.pdf.write(LINE_HEIGHT, to_latin1(match.group("italic")))
+            position = match.end()
+        if position < len(text):
+            self._set_font("", size)
+            self.pdf.write(LINE_HEIGHT, to_latin1(text[position:]))
+        self.pdf.ln(LINE_HEIGHT)
+
+    def _write_table(self, rows):
+        cells = [[cell.strip() for cell in row.strip().strip("|").split("|")] for row in rows]
+        columns = max(len(row) for row in cells)
+        width = (self.pdf.w - self.pdf.l_margin - self.pdf.r_margin) / columns
+        for index, row in enumerate(cells):
+            self._set_font("B" if index == 0 else "", 10)
+            for column in range(columns):
+                text = row[column] if column < len(row) else ""
+                text = strip_inline(text)
+                self.pdf.cell(width, LINE_HEIGHT, to_latin1(text)[:60], border=1)
+            self.pdf.ln(LINE_HEIGHT)
+
+    def render_markdown(self, text):
+        """Renders headings, bold, italic, lists and tables from ``text``."""
+        table = []
+        for line in str(text).splitlines():
+            match = LINE_TOKEN.match(line)
+            kind = match.lastgroup if match else None
+            if kind in ("table_row", "table_rule"):
+                if kind == "table_row":
+                    table.append(line)
+                continue
+            if table:
+                self._write_table(table)
+                table = []
+
+            if kind == "heading_text":
+                size = HEADING_SIZES[len(match.group("heading"))]
+                self._set_font("B", size)
+                self.pdf.multi_cell(
+                    0, LINE_HEIGHT + 2, to_latin1(strip_inline(match.group("heading_text"))))
+            elif kind == "item_text":
+                bullet = match.group("bullet").strip()
+                marker = bullet if bullet[0].isdigit() else "-"
+                self._set_font("", 12)
+                self.pdf.cell(8, LINE_HEIGHT, to_latin1(marker))
+                self._write_inline(match.group("item_text"))
+            elif kind == "blank":
+                self.pdf.ln(LINE_HEIGHT / 2)
+            else:
+                self._write_inline(line)
+        if table:
+            self._write_table(table)
+
+    def add_section(self, question, answer):
+        """Renders one question and its answer right away."""
+        self.pdf.ln(5)
+        self._set_font("B", 12)
+        self.pdf.cell(0, 10, "Question:", ln=True)
+        self.pdf.multi_cell(0, 10, to_latin1(question))
+        self.pdf.cell(0, 10, "Answer:", ln=True)
+        self.render_markdown(answer)
+        self.sections += 1
+
+    def close(self):
+        """Writes the document to ``path`` (a temporary file by default) and returns the path."""
+        if self.path is None:
+            handle, self.path = tempfile.mkstemp(suffix=".pdf")
+            os.close(handle)
+        self.pdf.output(self.path, 'F')
+        return self.path
+
+
+def benchmark(questions=1000):
+    """Times a report with ``questions`` sections of typical summary markdown."""
+    answer = (
+        "### Summary\n"
+        "Revenue grew **12%** quarter over quarter, driven by *Electronics*.\n"
+        "#### Details\n"
+        "- Top region: **North America**\n"
+        "- Lowest region: *APAC*\n"
+        "1. Q1 revenue was flat\n"
+        "2. Q2 revenue rose sharply\n\n"
+        "| Region | Revenue | Change |\n"
+        "|---|---:|---:|\n"
+        "| NA | 1,200,000 | +8% |\n"
+        "| EMEA | 950,000 | +3% |\n"
+    )
+    start = time.perf_counter()
+    writer = ReportWriter()
+    for number in range(questions):
+        writer.add_section(f"Question {number}: how did revenue change?", answer)
+    rendered = time.perf_counter()
+    path = writer.close()
+    written = time.perf_counter()
+    size = os.path.getsize(path)
+    os.remove(path)
+    print(f"{questions} sections: render {rendered - start:.2f}s, "
+          f"write {written - rendered:.2f}s, {writer.pdf.page_no()} pages, {size:,} bytes")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,341 @@
+"""
+Non-blocking execution of generated SQL.
+
+Statements are submitted with Snowpark's ``collect_nowait`` and polled, so
+several statements can run at once, each with a timeout, and any job still
+running when its owner moves on (a new question, another page, or an
+interrupted Streamlit run) is cancelled instead of tying up the warehouse.
+
+Results are fetched as Arrow-backed pandas batches (``pandas_batches``):
+``BatchedResult`` keeps the batch iterator so the first batch can be shown
+immediately and further batches appended on demand, up to a row ceiling.
+
+``SingleFlight`` coalesces identical statements, keyed by their canonical
+text: concurrent requests share one in-flight execution and completed query
+ids are reused for a short TTL, with each caller re-reading the cached result
+instead of executing the statement again on the warehouse.
+"""
+import re
+import threading
+import time
+
+import pandas as pd
+
+# Tokens of a SQL statement, in the order canonicalize_sql tries them
+SQL_TOKEN = re.compile(r"""
+    (?P<comment>--[^\n]*|//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^'\\]|\\.|'')*')
+  | (?P<quoted>"(?:[^"]|"")*")
+  | (?P<number>\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<word>[A-Za-z_$][A-Za-z0-9_$]*)
+  | (?P<space>\s+)
+  | (?P<other>.)
+""", re.VERBOSE | re.DOTALL)
+
+# Punctuation that never needs surrounding whitespace
+TIGHT_PUNCTUATION = {"(", ")", ",", ".", ";"}
+
+
+class QueryTimeoutError(Exception):
+    """Raised for a statement cancelled after exceeding its timeout."""
+
+
+def _normalize_number(text):
+    mantissa, _, exponent = text.upper().partition("E")
+    if "." in mantissa:
+        mantissa = mantissa.rstrip("0").rstrip(".")
+    whole, dot, fraction = mantissa.partition(".")
+    whole = whole.lstrip("0") or "0"
+    normalized = whole + (dot + fraction if fraction else "")
+    return normalized + ("E" + str(int(exponent)) if exponent else "")
+
+
+def canonicalize_sql(sql):
+    """
+    Canonical form of a statement used as the coalescing key: comments and
+    redundant whitespace removed, unquoted identifiers and keywords upper
+    cased and numeric literals normalized. String literals and quoted
+    identifiers are kept exactly, so statements that differ in a value never
+    share a key.
+    """
+    tokens = []
+    for match in SQL_TOKEN.finditer(sql.strip().rstrip(";")):
+        kind = match.lastgroup
+        text = match.group()
+        if kind in ("comment", "space"):
+            continue
+        if kind == "word":
+            text = text.upper()
+        elif kind == "number":
+            text = _normalize_number(text)
+        tokens.append(text)
+
+    canonical = []
+    for index, token in enumerate(tokens):
+        if index and token not in TIGHT_PUNCTUATION and tokens[index - 1] not in TIGHT_PUNCTUATION:
+            canonical.append(" ")
+        canonical.append(token)
+    return "".join(canonical)
+
+
+class _Flight:
+    def __init__(self, key):
+        self.key = key
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Coalesces identical statements. ``begin`` returns the caller's role:
+    ``"leader"`` (execute, then ``finish``), ``"follower"`` (``wait`` for the
+    leader) or ``"cached"`` (the value of a recent execution).
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self.requests = 0
+        self.executions = 0
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._completed = {}
+
+    @property
+    def saved(self):
+        """Warehouse executions avoided by coalescing or reuse."""
+        return self.requests - self.executions
+
+    def begin(self, sql):
+        key = canonicalize_sql(sql)
+        now = time.monotonic()
+        with self._lock:
+            self.requests += 1
+            completed = self._completed.get(key)
+            if completed is not None and completed[0] > now:
+                return "cached", completed[1]
+            flight = self._inflight.get(key)
+            if flight is not None:
+                return "follower", flight
+            flight = _Flight(key)
+            self._inflight[key] = flight
+            self.executions += 1
+            return "leader", flight
+
+    def finish(self, flight, value=None, error=None):
+        with self._lock:
+            self._inflight.pop(flight.key, None)
+            if error is None:
+                self._completed[flight.key] = (time.monotonic() + self.ttl, value)
+                # Drop expired entries so the cache stays small
+                now = time.monotonic()
+                for key in [k for k, (expires, _) in self._completed.items() if expires <= now]:
+                    del self._completed[key]
+        flight.value = value
+        flight.error = error
+        flight.done.set()
+
+    def wait(self, flight, timeout=None):
+        if not flight.done.wait(timeout):
+            raise QueryTimeoutError(f"Timed out waiting for a shared execution of {flight.key}")
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def do(self, sql, execute, timeout=None):
+        """Runs ``execute()`` for ``sql`` unless an identical statement is running or recent."""
+        role, flight = self.begin(sql)
+        if role == "cached":
+            return flight
+        if role == "follower":
+            return self.wait(flight, timeout)
+        try:
+            value = execute()
+        except Exception as e:
+            self.finish(flight, error=e)
+            raise
+        self.finish(flight, value=value)
+        return value
+
+
+class BatchedResult:
+    """Result fetched batch by batch, capped at ``max_rows`` rows."""
+
+    def __init__(self, batches, max_rows=100000, query_id=None):
+        self.query_id = query_id
+        self.max_rows = max_rows
+        self.frames = []
+        self.rows = 0
+        self._batches = iter(batches)
+        self._next = None
+        self._exhausted = False
+        self._frame = None
+
+    def _peek(self):
+        if self._next is None and not self._exhausted:
+            try:
+                self._next = next(self._batches)
+            except StopIteration:
+                self._exhausted = True
+
+    @property
+    def has_more(self) -> bool:
+        if self.rows >= self.max_rows:
+            return False
+        self._peek()
+        return self._next is not None
+
+    def fetch_next(self):
+        """Fetches the next batch; returns it, or ``None`` when there is none."""
+        if not self.has_more:
+            return None
+        batch = self._next
+        self._next = None
+        remaining = self.max_rows - self.rows
+        if len(batch.index) >= remaining:
+            batch = batch.iloc[:remaining]
+        self.frames.append(batch)
+        self.rows += len(batch.index)
+        self._frame = None
+        return batch
+
+    def frame(self) -> pd.DataFrame:
+        """All rows fetched so far as one DataFrame."""
+        if self._frame is None:
+            if self.frames:
+                self._frame = pd.concat(self.frames, ignore_index=True)
+            else:
+                self._frame = pd.DataFrame()
+        return self._frame
+
+
+class AsyncQueryRunner:
+    """Tracks running async jobs by owner so they can be cancelled together."""
+
+    def __init__(self):
+        self.jobs = {}
+
+    def submit(self, session, sql, owner="default"):
+        """Starts ``sql`` without waiting for it and returns the async job."""
+        job = session.sql(sql).collect_nowait()
+        self.jobs.setdefault(owner, []).append(job)
+        return job
+
+    def cancel(self, owner=None):
+        """Cancels the unfinished jobs of ``owner``, or of every owner."""
+        owners = list(self.jobs) if owner is None else [owner]
+        for name in owners:
+            for job in self.jobs.pop(name, []):
+                try:
+                    if not job.is_done():
+                        job.cancel()
+                except Exception:
+                    pass
+
+    def _forget(self, owner, jobs):
+        remaining = [job for job in self.jobs.get(owner, []) if job not in jobs]
+        if remaining:
+            self.jobs[owner] = remaining
+        else:
+            self.jobs.pop(owner, None)
+
+    def wait(self, jobs, timeout=120, poll_interval=0.25, on_progress=None,
+             result_type="row", owner="default"):
+        """
+        Polls ``jobs`` until all finish or ``timeout`` seconds pass. Returns
+        one entry per job: its result, or the exception it raised (a
+        ``QueryTimeoutError`` for jobs cancelled on timeout).
+        ``on_progress(done, total, elapsed)`` is called on every poll.
+        """
+        results = [None] * len(jobs)
+        pending = set(range(len(jobs)))
+        start = time.monotonic()
+        try:
+            while pending:
+                for index in list(pending):
+                    if jobs[index].is_done():
+                        pending.discard(index)
+                        try:
+                            results[index] = jobs[index].result(result_type)
+                        except Exception as e:
+                            results[index] = e
+                elapsed = time.monotonic() - start
+                if on_progress is not None:
+                    on_progress(len(jobs) - len(pending), len(jobs), elapsed)
+                if not pending:
+                    break
+                if elapsed > timeout:
+                    for index in pending:
+                        jobs[index].cancel()
+                        results[index] = QueryTimeoutError(
+                            f"Query {jobs[index].query_id} cancelled after {timeout} seconds")
+                    pending.clear()
+                    break
+                time.sleep(poll_interval)
+        finally:
+            # Cancel whatever is still running if the caller was interrupted
+            for index in pending:
+                try:
+                    jobs[index].cancel()
+                except Exception:
+                    pass
+            self._forget(owner, jobs)
+        return results
+
+    def run(self, session, statements, timeout=120, on_progress=None,
+            result_type="row", owner="default"):
+        """Runs ``statements`` concurrently and returns their results in order."""
+        jobs = [self.submit(session, sql, owner) for sql in statements]
+        return self.wait(jobs, timeout=timeout, on_progress=on_progress,
+                         result_type=result_type, owner=owner)
+
+    def run_batched(self, session, statements, timeout=120, on_progress=None,
+                    max_rows=100000, owner="default", single_flight=None):
+        """
+        Runs ``statements`` concurrently and returns a ``BatchedResult`` (or
+        the exception raised) for each, with its first batch already fetched.
+        With ``single_flight``, statements identical to one already running
+        or recently run re-read that execution's result instead.
+        """
+        roles = [single_flight.begin(sql) if single_flight else ("leader", None)
+                 for sql in statements]
+        leaders = [index for index, (role, _) in enumerate(roles) if role == "leader"]
+        jobs = [self.submit(session, statements[index], owner) for index in leaders]
+        try:
+            results = self.wait(jobs, timeout=timeout, on_progress=on_progress,
+                                result_type="pandas_batches", owner=owner)
+        except BaseException as e:
+            for index in leaders:
+                if roles[index][1] is not None:
+                    single_flight.finish(roles[index][1], error=Exception(str(e)))
+            raise
+
+        outcomes = [None] * len(statements)
+        for index, job, result in zip(leaders, jobs, results):
+            outcomes[index] = (job.query_id, result)
+            flight = roles[index][1]
+            if flight is not None:
+                if isinstance(result, Exception):
+                    single_flight.finish(flight, error=result)
+                else:
+                    single_flight.finish(flight, value=job.query_id)
+
+        for index, (role, flight) in enumerate(roles):
+            if role == "leader":
+                continue
+            try:
+                query_id = flight if role == "cached" else single_flight.wait(flight, timeout)
+                result = session.create_async_job(query_id).result("pandas_batches")
+                outcomes[index] = (query_id, result)
+            except Exception as e:
+                outcomes[index] = (None, e)
+
+        batched = []
+        for query_id, result in outcomes:
+            if isinstance(result, Exception):
+                batched.append(result)
+                continue
+            result = BatchedResult(result, max_rows=max_rows, query_id=query_id)
+            result.fetch_next()
+            batched.append(result)
+        return batched
@@ -0,0 +1,170 @@
+"""
+Pre-execution guardrails for LLM-generated SQL.
+
+``guard_query`` rejects anything other than a single read-only query, injects
+or tightens a row LIMIT, and optionally runs ``EXPLAIN`` to estimate the
+partitions and bytes the statement would scan, refusing or downgrading
+queries over budget before they ever reach the warehouse.
+"""
+import json
+import re
+
+# Keywords that must not appear anywhere in a generated statement; other
+# statement types are already rejected by the leading SELECT/WITH check
+FORBIDDEN_KEYWORDS = [
+    "INSERT", "UPDATE", "DELETE", "MERGE", "CREATE", "DROP", "ALTER",
+    "TRUNCATE", "GRANT", "REVOKE", "CALL", "COPY", "UNDROP", "EXECUTE",
+]
+
+
+class GuardrailError(Exception):
+    """Raised when a generated statement is refused before execution."""
+
+
+def mask_sql(sql):
+    """
+    Returns ``sql`` with comments, string literals and quoted identifiers
+    blanked out, keeping every other character at the same offset, so that
+    keyword and parenthesis scans can run on code only.
+    """
+    masked = list(sql)
+    i = 0
+    length = len(sql)
+    while i < length:
+        if sql.startswith("--", i) or sql.startswith("//", i):
+            end = sql.find("\n", i)
+            end = length if end == -1 else end
+        elif sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            end = length if end == -1 else end + 2
+        elif sql.startswith("$$", i):
+            end = sql.find("$$", i + 2)
+            end = length if end == -1 else end + 2
+        elif sql[i] in ("'", '"'):
+            quote = sql[i]
+            end = i + 1
+            while end < length:
+                if sql[end] == "\\" and quote == "'":
+                    end += 2
+                    continue
+                if sql[end] == quote:
+                    if end + 1 < length and sql[end + 1] == quote:
+                        end += 2
+                        continue
+                    end += 1
+                    break
+                end += 1
+            # Keep the quotes so literals still separate tokens
+            for j in range(i + 1, min(end, length) - 1):
+                masked[j] = " " if sql[j] == "\n" else "x"
+            i = end
+            continue
+        else:
+            i += 1
+            continue
+        for j in range(i, end):
+            masked[j] = " "
+        i = end
+    return "".join(masked)
+
+
+def split_statements(sql):
+    """Splits ``sql`` on semicolons outside literals and comments."""
+    masked = mask_sql(sql)
+    statements = []
+    start = 0
+    for match in re.finditer(";", masked):
+        statements.append(sql[start:match.start()])
+        start = match.end()
+    statements.append(sql[start:])
+    return [statement for statement in statements if mask_sql(statement).strip()]
+
+
+def check_read_only(sql):
+    """Raises ``GuardrailError`` unless ``sql`` is one SELECT/WITH statement."""
+    statements = split_statements(sql)
+    if len(statements) != 1:
+        raise GuardrailError(
+            f"Expected exactly one statement, found {len(statements)}")
+    masked = mask_sql(statements[0]).upper()
+    if not re.match(r"\s*\(*\s*(SELECT|WITH)\b", masked):
+        raise GuardrailError("Only SELECT statements can be executed")
+    for keyword in FORBIDDEN_KEYWORDS:
+        if re.search(rf"\b{keyword}\b", masked):
+            raise GuardrailError(f"Statement contains forbidden keyword {keyword}")
+    return statements[0].strip()
+
+
+def _depth_at(masked, position):
+    return masked.count("(", 0, position) - masked.count(")", 0, position)
+
+
+def apply_row_limit(sql, max_rows):
+    """
+    Makes sure ``sql`` returns at most ``max_rows`` rows: an existing
+    top-level LIMIT or TOP is tightened, otherwise a LIMIT is appended (or
+    the statement is wrapped when it ends in a FETCH clause).
+    """
+    sql = sql.strip().rstrip(";").rstrip()
+    masked = mask_sql(sql)
+
+    limit = re.search(r"\bLIMIT\s+(\d+)(\s+OFFSET\s+\d+)?\s*$", masked, re.IGNORECASE)
+    if limit and _depth_at(masked, limit.start()) == 0:
+        rows = min(int(limit.group(1)), max_rows)
+        return sql[:limit.start(1)] + str(rows) + sql[limit.end(1):]
+
+    top = re.match(r"\s*SELECT\s+(?:DISTINCT\s+)?TOP\s+(\d+)", masked, re.IGNORECASE)
+    if top:
+        rows = min(int(top.group(1)), max_rows)
+        return sql[:top.start(1)] + str(rows) + sql[top.end(1):]
+
+    if re.search(r"\b(FETCH|OFFSET)\b[^()]*$", masked, re.IGNORECASE):
+        return f"SELECT * FROM (\n{sql}\n) LIMIT {max_rows}"
+
+    return f"{sql}\nLIMIT {max_rows}"
+
+
+def estimate_cost(session, sql):
+    """Runs ``EXPLAIN`` and returns the partitions and bytes it would scan."""
+    plan = session.sql(f"EXPLAIN USING JSON {sql}").collect()[0][0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    stats = plan.get("GlobalStats", {})
+    return {
+        "partitions_total": stats.get("partitionsTotal", 0),
+        "partitions_assigned": stats.get("partitionsAssigned", 0),
+        "bytes_assigned": stats.get("bytesAssigned", 0),
+    }
+
+
+def guard_query(session, sql, max_rows=10000, max_bytes=None, max_partitions=None,
+                explain=True, policy="refuse", downgrade_rows=100):
+    """
+    Checks a generated statement and returns ``(safe_sql, report)``.
+
+    ``report`` holds the ``estimate`` from EXPLAIN (when run) and the
+    ``action`` taken: ``"ok"`` or ``"downgraded"``. Statements over the
+    bytes or partitions budget raise ``GuardrailError`` under the
+    ``"refuse"`` policy; under ``"downgrade"`` their row limit is tightened
+    to ``downgrade_rows`` instead.
+    """
+    statement = check_read_only(sql)
+    safe_sql = apply_row_limit(statement, max_rows)
+    report = {"estimate": None, "action": "ok"}
+
+    if explain and (max_bytes is not None or max_partitions is not None):
+        estimate = estimate_cost(session, safe_sql)
+        report["estimate"] = estimate
+        over_bytes = max_bytes is not None and estimate["bytes_assigned"] > max_bytes
+        over_partitions = max_partitions is not None and estimate["partitions_assigned"] > max_partitions
+        if over_bytes or over_partitions:
+            message = (
+                f"Query would scan {estimate['bytes_assigned']:,} bytes in "
+                f"{estimate['partitions_assigned']:,} partitions, over the configured budget")
+            if policy != "downgrade":
+                raise GuardrailError(message)
+            safe_sql = apply_row_limit(statement, min(max_rows, downgrade_rows))
+            report["action"] = "downgraded"
+            report["message"] = message
+
+    return safe_sql, report
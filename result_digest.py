@@ -0,0 +1,104 @@
+"""
+Compact statistical digest of a query result for the summarization UDF.
+
+Rather than the ``str()`` of every row, ``digest_result`` sends the shape of
+the result, per-column statistics, top categories, the trend of numeric
+columns and a few representative rows, trimmed to a token budget.
+"""
+import numpy as np
+import pandas as pd
+
+from gpt_sql import CHARS_PER_TOKEN
+
+
+def _is_numeric(series):
+    return pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series)
+
+
+def _is_time(series):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    # DATE columns arrive as datetime.date objects
+    head = series.dropna().head(20)
+    return len(head.index) > 0 and all(hasattr(value, "year") for value in head)
+
+
+def _format_value(value):
+    if isinstance(value, (float, np.floating)):
+        return f"{value:,.4g}"
+    return str(value)
+
+
+def _numeric_lines(df, columns):
+    if not columns:
+        return []
+    stats = df[columns].agg(["min", "max", "mean"]).T
+    lines = []
+    for column, row in stats.iterrows():
+        series = df[column].dropna()
+        line = (f"- {column} (numeric): min {_format_value(row['min'])}, "
+                f"max {_format_value(row['max'])}, mean {_format_value(row['mean'])}")
+        if len(series.index) > 1:
+            first, last = series.iloc[0], series.iloc[-1]
+            change = last - first
+            line += f", first→last {_format_value(first)}→{_format_value(last)}"
+            if first:
+                line += f" ({change / abs(first):+.1%})"
+        lines.append(line)
+    return lines
+
+
+def _categorical_lines(df, columns, top_k):
+    lines = []
+    for column in columns:
+        counts = df[column].astype(str).value_counts()
+        top = ", ".join(f"{value} ({count})" for value, count in counts.head(top_k).items())
+        lines.append(f"- {column} ({counts.size} distinct): {top}")
+    return lines
+
+
+def _time_lines(df, columns):
+    lines = []
+    for column in columns:
+        series = pd.to_datetime(df[column], errors="coerce").dropna()
+        if len(series.index):
+            lines.append(f"- {column} (time): {series.min()} to {series.max()}")
+    return lines
+
+
+def representative_rows(df, count):
+    """First, last and evenly spaced rows of ``df``."""
+    if len(df.index) <= count:
+        return df
+    positions = np.unique(np.linspace(0, len(df.index) - 1, count).astype(int))
+    return df.iloc[positions]
+
+
+def digest_result(df, token_budget=1500, top_k=5, sample_rows=5, partial=False):
+    """
+    Returns a text digest of ``df`` capped at ``token_budget`` tokens.
+    ``partial`` marks ``df`` as only the first rows of a larger result.
+    """
+    if df is None or len(df.columns) == 0:
+        return "The query returned no columns."
+
+    numeric = [c for c in df.columns if _is_numeric(df[c])]
+    time_columns = [c for c in df.columns if c not in numeric and _is_time(df[c])]
+    categorical = [c for c in df.columns if c not in numeric and c not in time_columns]
+
+    lines = [f"Result: {len(df.index):,} rows x {len(df.columns)} columns"
+             + (" (first rows only; the full result is larger)" if partial else "")]
+    lines.append("Columns:")
+    lines += _time_lines(df, time_columns)
+    lines += _numeric_lines(df, numeric)
+    lines += _categorical_lines(df, categorical, top_k)
+
+    sample = representative_rows(df, sample_rows)
+    lines.append("Representative rows:")
+    lines.append(sample.to_string(index=False, max_colwidth=40))
+
+    max_chars = token_budget * CHARS_PER_TOKEN
+    digest = "\n".join(lines)
+    if len(digest) > max_chars:
+        digest = digest[:max_chars].rsplit("\n", 1)[0] + "\n[digest truncated]"
+    return digest
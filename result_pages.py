@@ -0,0 +1,102 @@
+"""
+Server-side pagination of large query results.
+
+``PagedResult`` keeps only the query id of a statement that already ran and
+reads one page at a time from ``RESULT_SCAN``, pushing sorting and filtering
+down to the cached result, so client memory stays proportional to the page
+size rather than to the result size.
+
+On first use the result is numbered once with ``ROW_NUMBER()``. Unsorted,
+unfiltered pages are read as a range of row numbers without sorting, and
+the row number is the tie breaker that gives sorted or filtered pages a
+total order, whatever the column types.
+"""
+import re
+
+from schema_metadata import quote_identifier
+
+# Row number added to the paged result
+ROW_COLUMN = "__ROW_NUMBER"
+
+
+class PagedResult:
+    """Page-by-page view over the cached result of ``query_id``."""
+
+    def __init__(self, session, query_id, page_size=100):
+        if not re.fullmatch(r"[0-9A-Za-z-]+", query_id):
+            raise ValueError(f"Invalid query id: {query_id}")
+        self.session = session
+        self.query_id = query_id
+        self.page_size = page_size
+        self._columns = None
+        self._numbered_id = None
+        self._counts = {}
+
+    def columns(self):
+        """Column names of the result, read from its metadata only."""
+        if self._columns is None:
+            rows = self.session.sql(f"DESCRIBE RESULT '{self.query_id}'").collect()
+            self._columns = [row['name'] for row in rows]
+        return self._columns
+
+    def numbered_query_id(self):
+        """Query id of the result with ``ROW_COLUMN`` added; numbered on first use."""
+        if self._numbered_id is None:
+            job = self.session.sql(
+                f"SELECT *, ROW_NUMBER() OVER (ORDER BY SEQ8()) AS {ROW_COLUMN}"
+                f" FROM TABLE(RESULT_SCAN('{self.query_id}'))").collect_nowait()
+            job.result("no_result")
+            self._numbered_id = job.query_id
+        return self._numbered_id
+
+    def _where(self, filters):
+        """WHERE clause and bound values for ``{column: substring}`` filters."""
+        conditions = []
+        params = []
+        for column, text in (filters or {}).items():
+            if text:
+                conditions.append(f"TO_VARCHAR({quote_identifier(column)}) ILIKE ?")
+                params.append(f"%{text}%")
+        if not conditions:
+            return "", params
+        return " WHERE " + " AND ".join(conditions), params
+
+    def count(self, filters=None):
+        """Number of rows matching ``filters``; cached per filter set."""
+        key = tuple(sorted((filters or {}).items()))
+        if key not in self._counts:
+            where, params = self._where(filters)
+            rows = self.session.sql(
+                f"SELECT COUNT(*) AS N FROM TABLE(RESULT_SCAN('{self.query_id}')){where}",
+                params=params or None).collect()
+            self._counts[key] = rows[0]['N']
+        return self._counts[key]
+
+    def page_count(self, filters=None):
+        return max(1, -(-self.count(filters) // self.page_size))
+
+    def fetch_page(self, page, order_by=None, descending=False, filters=None):
+        """
+        Returns page ``page`` (0-based) as a pandas DataFrame. Rows are
+        ordered by ``order_by`` first, then by row number, so that pages
+        neither repeat nor skip rows.
+        """
+        columns = ", ".join(quote_identifier(column) for column in self.columns())
+        source = f"TABLE(RESULT_SCAN('{self.numbered_query_id()}'))"
+        where, params = self._where(filters)
+        size = int(self.page_size)
+        offset = int(page) * size
+        if not order_by and not where:
+            # Row numbers are dense: read the page's range without a sort
+            query = (
+                f"SELECT {columns} FROM {source}"
+                f" WHERE {ROW_COLUMN} > {offset} AND {ROW_COLUMN} <= {offset + size}"
+                f" ORDER BY {ROW_COLUMN}")
+        else:
+            keys = [ROW_COLUMN]
+            if order_by:
+                keys.insert(0, f"{quote_identifier(order_by)} {'DESC' if descending else 'ASC'}")
+            query = (
+                f"SELECT {columns} FROM {source}{where} ORDER BY {', '.join(keys)}"
+                f" LIMIT {size} OFFSET {offset}")
+        return self.session.sql(query, params=params or None).to_pandas()
@@ -0,0 +1,459 @@
+"""
+Schema metadata helpers for the GPT-4 text-to-SQL pages.
+
+``SchemaIndex`` indexes the tables and columns of a schema (names, comments
+and sample values) so that each question only carries the handful of tables
+and columns relevant to it, plus the keys needed to join them, instead of the
+DDL and column details of the whole schema.
+
+``profile_table`` profiles every column of a table in one statement:
+approximate distinct counts for all columns together, and sample values drawn
+from a ``SAMPLE`` subset instead of a full ``ORDER BY RANDOM()`` sort per column.
+
+``fetch_schema_columns`` and ``build_schema_model`` collect the structure of
+the whole schema in one round trip instead of one ``GET_DDL`` call per table.
+
+``MetadataCache`` shares the rendered metadata across user sessions and
+persists it on a stage. Each table carries a fingerprint built from
+``LAST_ALTERED``, the row count and the column list, and only tables whose
+fingerprint changed are profiled again.
+"""
+import hashlib
+import io
+import json
+import logging
+import math
+import re
+import threading
+from collections import Counter
+
+from gpt_sql import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# Column names treated as join keys when linking tables together
+JOIN_KEY_PATTERN = re.compile(r"(^ID$|_ID$|_KEY$|_CODE$)", re.IGNORECASE)
+
+
+def tokenize(text):
+    """Splits free text or identifiers into lowercase, singularized terms."""
+    text = re.sub(r"([a-z])([A-Z])", r"\1 \2", str(text or ""))
+    terms = []
+    for term in re.split(r"[^A-Za-z0-9]+", text.lower()):
+        if len(term) < 2:
+            continue
+        if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+            term = term[:-1]
+        terms.append(term)
+    return terms
+
+
+def quote_identifier(name):
+    """Double-quotes an identifier unless it is already quoted."""
+    if name.startswith('"') and name.endswith('"'):
+        return name
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _parse_array(value):
+    """ARRAY values come back from Snowpark as JSON text."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+def profile_table(database_name, schema_name, table_name, columns, session,
+                  sample_rows=1000, sample_size=5, exact=False, stats_sample_rows=None):
+    """
+    Profiles ``columns`` of a table with a single query.
+
+    Distinct counts use ``APPROX_COUNT_DISTINCT`` (``COUNT(DISTINCT)`` when
+    ``exact``) over the whole table, or over ``stats_sample_rows`` sampled
+    rows when given, so the cost is at most one scan per table. Sample values
+    are drawn from ``sample_rows`` sampled rows.
+
+    Returns one dict per column with ``column_name``, ``unique_count`` and
+    ``random_values``.
+    """
+    if len(columns) == 0:
+        return []
+
+    table = f"{database_name}.{schema_name}.{quote_identifier(table_name)}"
+    distinct = "COUNT(DISTINCT {})" if exact else "APPROX_COUNT_DISTINCT({})"
+    stats_source = table if stats_sample_rows is None else f"{table} SAMPLE ({int(stats_sample_rows)} ROWS)"
+
+    stats_exprs = [
+        f"{distinct.format(quote_identifier(column))} AS NDV_{i}"
+        for i, column in enumerate(columns)]
+    sample_exprs = [
+        f"ARRAY_SLICE(ARRAY_AGG(DISTINCT {quote_identifier(column)}), 0, {int(sample_size)}) AS VALUES_{i}"
+        for i, column in enumerate(columns)]
+
+    profile_query = f"""
+    WITH stats AS (
+        SELECT {', '.join(stats_exprs)}
+        FROM {stats_source}
+    ),
+    samp AS (
+        SELECT {', '.join(sample_exprs)}
+        FROM {table} SAMPLE ({int(sample_rows)} ROWS)
+    )
+    SELECT * FROM stats, samp
+    """
+    profile = session.sql(profile_query).collect()[0]
+
+    return [{
+        'column_name': column,
+        'unique_count': profile[f"NDV_{i}"],
+        'random_values': _parse_array(profile[f"VALUES_{i}"]),
+    } for i, column in enumerate(columns)]
+
+
+def fetch_schema_columns(database_name, schema_name, session):
+    """
+    Fetches every column of every table and view in the schema, together
+    with the table-level attributes, with a single INFORMATION_SCHEMA query.
+    """
+    columns_query = f"""
+    SELECT t.TABLE_NAME, t.TABLE_TYPE, t.ROW_COUNT, t.LAST_ALTERED,
+           t.COMMENT AS TABLE_COMMENT,
+           c.COLUMN_NAME, c.DATA_TYPE, c.CHARACTER_MAXIMUM_LENGTH,
+           c.NUMERIC_PRECISION, c.NUMERIC_SCALE, c.IS_NULLABLE,
+           c.COMMENT AS COLUMN_COMMENT
+    FROM {database_name}.INFORMATION_SCHEMA.TABLES t
+    JOIN {database_name}.INFORMATION_SCHEMA.COLUMNS c
+      ON c.TABLE_SCHEMA = t.TABLE_SCHEMA AND c.TABLE_NAME = t.TABLE_NAME
+    WHERE t.TABLE_SCHEMA = ?
+    ORDER BY t.TABLE_NAME, c.ORDINAL_POSITION
+    """
+    return session.sql(columns_query, params=[schema_name]).collect()
+
+
+def format_data_type(row):
+    """Formats an INFORMATION_SCHEMA column type the way GET_DDL prints it."""
+    data_type = row['DATA_TYPE']
+    if data_type == "TEXT" and row['CHARACTER_MAXIMUM_LENGTH'] is not None:
+        return f"VARCHAR({row['CHARACTER_MAXIMUM_LENGTH']})"
+    if data_type == "NUMBER" and row['NUMERIC_PRECISION'] is not None:
+        return f"NUMBER({row['NUMERIC_PRECISION']},{row['NUMERIC_SCALE'] or 0})"
+    return data_type
+
+
+def build_schema_model(rows):
+    """
+    Groups ``fetch_schema_columns`` rows into a per-table model:
+    ``{table_name: {"table_type", "row_count", "last_altered", "comment",
+    "columns": [{"name", "data_type", "nullable", "comment"}]}}``.
+    """
+    model = {}
+    for row in rows:
+        table = model.setdefault(row['TABLE_NAME'], {
+            "table_type": row['TABLE_TYPE'],
+            "row_count": row['ROW_COUNT'],
+            "last_altered": row['LAST_ALTERED'],
+            "comment": row['TABLE_COMMENT'] or "",
+            "columns": [],
+        })
+        table["columns"].append({
+            "name": row['COLUMN_NAME'],
+            "data_type": format_data_type(row),
+            "nullable": row['IS_NULLABLE'] == "YES",
+            "comment": row['COLUMN_COMMENT'] or "",
+        })
+    return model
+
+
+def render_table_ddl(table_name, table):
+    """Renders a table from the schema model as a CREATE statement."""
+    kind = "VIEW" if table["table_type"] == "VIEW" else "TABLE"
+    lines = [f"create or replace {kind} {table_name} ("]
+    definitions = []
+    for column in table["columns"]:
+        definition = f"\t{column['name']} {column['data_type']}"
+        if not column["nullable"]:
+            definition += " NOT NULL"
+        if column["comment"]:
+            definition += " COMMENT '" + column["comment"].replace("'", "''") + "'"
+        definitions.append(definition)
+    lines.append(",\n".join(definitions))
+    lines.append(")" + (" COMMENT='" + table["comment"].replace("'", "''") + "'" if table["comment"] else "") + ";")
+    return "\n".join(lines)
+
+
+def cached_samples(entry):
+    """``{(table_name, column_name): sample values}`` of a ``MetadataCache`` entry."""
+    return {(table_name, column['column_name']): [str(value) for value in column['random_values']]
+            for table_name, table in entry["tables"].items()
+            for column in table["columns"]}
+
+
+def render_metadata_string(tables):
+    """Renders cached table metadata as the text context sent to the LLM."""
+    metadata_lines = ["DDL Statements and Column Details:\n"]
+    for table_name, table in tables.items():
+        metadata_lines.append(f"\nTable: {table_name}\n")
+        metadata_lines.append(f"{table['ddl']}\n")
+        for column in table["columns"]:
+            metadata_lines.append(f"Column: {column['column_name']}")
+            metadata_lines.append(
+                f"  - Unique Count: {column['unique_count']}")
+            metadata_lines.append(
+                f"  - Random Unique Values: {column['random_values']}\n")
+    return "\n".join(metadata_lines)
+
+
+def table_fingerprint(table):
+    """Fingerprint of a schema-model table used to detect changes."""
+    columns = "|".join(f"{column['name']}:{column['data_type']}" for column in table["columns"])
+    raw = f"{table['last_altered']}|{table['row_count']}|{columns}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class MetadataCache:
+    """
+    Schema metadata shared by every session of the app process and
+    persisted as JSON on a stage, keyed by database and schema.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._warming = set()
+
+    @staticmethod
+    def stage_file(database_name, schema_name):
+        return f"metadata_cache_{database_name}_{schema_name}.json"
+
+    def _key_lock(self, key):
+        with self._lock:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def _load(self, session, key, stage):
+        if stage is None:
+            return None
+        try:
+            stream = session.file.get_stream(f"@{stage}/{self.stage_file(*key)}")
+            return json.loads(stream.read().decode('utf-8'))
+        except Exception:
+            return None
+
+    def _save(self, session, key, stage, entry):
+        if stage is None:
+            return
+        data = json.dumps(entry, default=str).encode('utf-8')
+        session.file.put_stream(
+            io.BytesIO(data), f"@{stage}/{self.stage_file(*key)}",
+            auto_compress=False, overwrite=True)
+
+    def refresh(self, session, database_name, schema_name, stage=None,
+                sample_rows=1000, exact=False):
+        """
+        Brings the cached metadata for a schema up to date and returns it.
+        Costs one INFORMATION_SCHEMA query plus one profiling query per
+        changed table.
+        """
+        key = (database_name, schema_name)
+        settings = {"sample_rows": sample_rows, "exact": exact}
+        with self._key_lock(key):
+            entry = self._entries.get(key) or self._load(session, key, stage)
+            if entry is None or entry.get("settings") != settings:
+                entry = {"settings": settings, "tables": {}}
+
+            model = build_schema_model(
+                fetch_schema_columns(database_name, schema_name, session))
+            cached = entry["tables"]
+            # Entries returned earlier may still be read by other sessions, so
+            # the refreshed tables go into a new entry swapped in at the end
+            tables = {}
+            changed = set(cached) - set(model)
+
+            for table_name, table in model.items():
+                fingerprint = table_fingerprint(table)
+                if cached.get(table_name, {}).get("fingerprint") == fingerprint:
+                    tables[table_name] = cached[table_name]
+                    continue
+                tables[table_name] = {
+                    "fingerprint": fingerprint,
+                    "ddl": render_table_ddl(table_name, table),
+                    "columns": profile_table(
+                        database_name, schema_name, table_name,
+                        [column["name"] for column in table["columns"]], session,
+                        sample_rows=sample_rows, exact=exact),
+                }
+                changed.add(table_name)
+
+            entry = {"settings": settings, "tables": tables}
+            self._entries[key] = entry
+            if changed:
+                self._save(session, key, stage, entry)
+            return entry
+
+    def metadata_string(self, session, database_name, schema_name, stage=None,
+                        sample_rows=1000, exact=False):
+        """Returns the up-to-date metadata string for a schema."""
+        entry = self.refresh(session, database_name, schema_name, stage,
+                             sample_rows=sample_rows, exact=exact)
+        return render_metadata_string(entry["tables"])
+
+    def warm(self, session, database_name, schema_name, stage=None, **kwargs):
+        """
+        Refreshes a schema in a background thread unless one is already
+        running or the schema is cached. Returns the thread, if started.
+        Errors are logged; the next ``refresh`` retries.
+        """
+        key = (database_name, schema_name)
+        with self._lock:
+            if key in self._warming or key in self._entries:
+                return None
+            self._warming.add(key)
+
+        def run():
+            try:
+                self.refresh(session, database_name, schema_name, stage, **kwargs)
+            except Exception:
+                logger.exception("Warming the metadata cache of %s.%s failed",
+                                 database_name, schema_name)
+            finally:
+                with self._lock:
+                    self._warming.discard(key)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+
+class SchemaIndex:
+    """Term index over the tables and columns of one schema."""
+
+    def __init__(self, database_name, schema_name):
+        self.database_name = database_name
+        self.schema_name = schema_name
+        self.tables = {}
+        self._column_terms = {}
+        self._idf = {}
+
+    @classmethod
+    def from_model(cls, database_name, schema_name, model, samples=None):
+        """
+        Builds the index from a ``build_schema_model`` model. ``samples`` maps
+        ``(table_name, column_name)`` to a list of sample values.
+        """
+        index = cls(database_name, schema_name)
+        samples = samples or {}
+        for table_name, table in model.items():
+            index.tables[table_name] = {
+                "comment": table["comment"],
+                "columns": [{
+                    "name": column["name"],
+                    "data_type": column["data_type"],
+                    "comment": column["comment"],
+                    "samples": samples.get((table_name, column["name"]), []),
+                } for column in table["columns"]],
+            }
+        index._build_terms()
+        return index
+
+    def _build_terms(self):
+        document_frequency = Counter()
+        for table_name, table in self.tables.items():
+            for column in table["columns"]:
+                terms = Counter(tokenize(column["name"]))
+                terms.update(tokenize(column["comment"]))
+                for value in column["samples"]:
+                    terms.update(tokenize(value))
+                self._column_terms[(table_name, column["name"])] = terms
+                document_frequency.update(set(terms))
+        total = max(len(self._column_terms), 1)
+        self._idf = {
+            term: math.log(1 + total / count)
+            for term, count in document_frequency.items()
+        }
+
+    def _score_columns(self, question_terms):
+        scores = {}
+        for key, terms in self._column_terms.items():
+            score = sum(self._idf.get(term, 0) for term in question_terms if term in terms)
+            if score > 0:
+                scores[key] = score
+        return scores
+
+    def link(self, question, top_tables=5, max_columns_per_table=15, max_chars=6000):
+        """
+        Selects the tables and columns relevant to ``question`` and renders
+        them as a compact metadata context capped at ``max_chars``.
+
+        Returns a dict with the ``context`` string, the linked ``tables``,
+        its size in ``chars`` and estimated ``tokens``, and whether the
+        context was ``truncated`` to fit the cap.
+        """
+        question_terms = set(tokenize(question))
+        column_scores = self._score_columns(question_terms)
+
+        table_scores = Counter()
+        for table_name in self.tables:
+            name_terms = set(tokenize(table_name)) | set(tokenize(self.tables[table_name]["comment"]))
+            table_scores[table_name] += sum(
+                self._idf.get(term, 1.0) for term in question_terms & name_terms)
+        for (table_name, _), score in column_scores.items():
+            table_scores[table_name] += score
+
+        selected = [name for name, score in table_scores.most_common(top_tables) if score > 0]
+        if not selected:
+            selected = list(self.tables)[:top_tables]
+
+        # Columns shared between the selected tables are the join keys
+        name_counts = Counter(
+            column["name"].upper()
+            for table_name in selected
+            for column in self.tables[table_name]["columns"])
+
+        lines = [f"Schema: {self.database_name}.{self.schema_name}"]
+        truncated = False
+        used = len(lines[0])
+        for table_name in selected:
+            table = self.tables[table_name]
+            ranked = sorted(
+                table["columns"],
+                key=lambda column: column_scores.get((table_name, column["name"]), 0),
+                reverse=True)
+            relevant = [
+                column for column in ranked[:max_columns_per_table]
+                if column_scores.get((table_name, column["name"]), 0) > 0]
+            join_keys = [
+                column for column in table["columns"]
+                if column not in relevant
+                and (name_counts[column["name"].upper()] > 1 or JOIN_KEY_PATTERN.search(column["name"]))]
+            chosen = relevant + join_keys
+            if not chosen:
+                chosen = table["columns"][:max_columns_per_table]
+
+            table_lines = [f"\nTable: {self.database_name}.{self.schema_name}.{table_name}"
+                           + (f" -- {table['comment']}" if table["comment"] else "")]
+            for column in chosen:
+                line = f"  {column['name']} {column['data_type']}"
+                if column["comment"]:
+                    line += f" -- {column['comment']}"
+                if column["samples"]:
+                    line += f" (e.g. {', '.join(str(value) for value in column['samples'][:3])})"
+                table_lines.append(line)
+
+            for line in table_lines:
+                if used + len(line) + 1 > max_chars:
+                    truncated = True
+                    break
+                lines.append(line)
+                used += len(line) + 1
+            if truncated:
+                break
+
+        context = "\n".join(lines)
+        return {
+            "context": context,
+            "tables": selected,
+            "chars": len(context),
+            "tokens": estimate_tokens(context),
+            "truncated": truncated,
+        }
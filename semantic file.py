@@ -3,6 +3,14 @@ import pandas as pd
 from snowflake.snowpark.context import get_active_session
 import io
 import yaml
+from catalog import CatalogCache
+from model_validator import columns_by_table, format_issues, validate_model
+from schema_metadata import build_schema_model, fetch_schema_columns
+from semantic_model import (ModelSerializer, build_table_entries, build_table_entry,
+                            match_tables)
+
+# Table picker entries sent to the browser at a time
+PICKER_PAGE_SIZE = 50
 
 # Function to show the welcome page
 
@@ -52,6 +60,7 @@ def show_get_started_page():
         st.session_state['semantic_name'] = semantic_name
         st.session_state['description'] = description
         st.session_state['tables'] = []
+        st.session_state.pop('yaml_serializer', None)
         st.session_state['yaml_structure'] = {
             "name": semantic_name,
             "description": description,
@@ -61,32 +70,54 @@ def show_get_started_page():
             "Semantic Model info saved successfully! Click on Table Definition on the navigation menu to finish YAML file creation")
         st.experimental_set_query_params(page="Table Definition")
 
+# Catalog lists shared across reruns and sessions
+
+
+@st.cache_resource
+def get_catalog():
+    return CatalogCache()
+
+# YAML of the model in session, re-rendered one table at a time
+
+
+def get_model_serializer():
+    if 'yaml_serializer' not in st.session_state:
+        st.session_state['yaml_serializer'] = ModelSerializer.from_model(
+            st.session_state['yaml_structure'])
+    return st.session_state['yaml_serializer']
+
 # Function to show the table definition page
 
 
 def show_table_definition_page():
     session = get_active_session()
+    catalog = get_catalog()
+
+    if st.button("Refresh catalog"):
+        catalog.invalidate()
 
-    # Show databases and create a select box for the database selection
-    databases_df = session.sql("SHOW DATABASES").collect()
-    databases = [row['name'] for row in databases_df]
+    # Databases, schemas and tables come from the catalog cache
+    databases = catalog.databases(session)
     database_selector = st.selectbox("Select Database", databases)
 
     # Show schemas based on the selected database and create a select box for schema selection
-    schemas_df = session.sql(
-        f"SHOW SCHEMAS IN DATABASE {database_selector}").collect()
-    schemas = [row['name'] for row in schemas_df]
+    schemas = catalog.schemas(session, database_selector)
     schema_selector = st.selectbox("Select Schema", schemas)
 
-    # Show tables and views based on the selected schema and create a select box for table or view selection
-    tables_df = session.sql(
-        f"SHOW TABLES IN {database_selector}.{schema_selector}").collect()
-    views_df = session.sql(
-        f"SHOW VIEWS IN {database_selector}.{schema_selector}").collect()
-    tables_and_views = [row['name']
-                        for row in tables_df] + [row['name'] for row in views_df]
+    # Search tables and views; only one page of matches is sent to the browser
+    name_index = catalog.name_index(session, database_selector, schema_selector)
+    table_search = st.text_input("Search Tables and Views", key="table_search")
+    matches = name_index.search(table_search)
+    pages = max(1, -(-len(matches) // PICKER_PAGE_SIZE))
+    if st.session_state.get('table_page', 1) > pages:
+        st.session_state['table_page'] = 1
+    table_page = st.number_input(
+        "Page", min_value=1, max_value=pages, step=1, key="table_page") if pages > 1 else 1
+    visible_tables = matches[(table_page - 1) * PICKER_PAGE_SIZE:table_page * PICKER_PAGE_SIZE]
+    st.caption(f"{len(matches):,} of {len(name_index):,} tables and views match"
+               f" (page {table_page} of {pages})")
     table_or_view_selector = st.selectbox(
-        "Select Table or View", tables_and_views)
+        "Select Table or View", visible_tables)
 
     # Display the current YAML structure
     yaml_template = {
@@ -153,75 +184,66 @@ def show_table_definition_page():
 
             table_definition_df = session.sql(
                 f"DESCRIBE TABLE {database_selector}.{schema_selector}.{table_or_view_selector}").collect()
-
-            columns = [row['name'] for row in table_definition_df]
-            data_types = [row['type'] for row in table_definition_df]
+            columns = [{"name": row['name'], "data_type": row['type']}
+                       for row in table_definition_df]
+            st.session_state.setdefault('table_columns', {})[table_or_view_selector] = [
+                column["name"] for column in columns]
 
             # Add table or view definition to YAML structure
-            table_entry = {
-                "name": table_or_view_selector,
-                "description": "",
-                "base_table": {
-                    "database": database_selector,
-                    "schema": schema_selector,
-                    "table": table_or_view_selector
-                },
-                "dimensions": [],
-                "time_dimensions": [],
-                "measures": [],
-                "filters": [
-                    {
-                        "name": "<name>",
-                        "synonyms": ["<array of strings>"],
-                        "description": "<string>",
-                        "expr": "<SQL expression>"
-                    }
-                ]
-            }
-
-            # Check for time dimensions, dimension columns, and measure columns
-            for column, data_type in zip(columns, data_types):
-                data_type_simple = data_type.split('(')[0].upper()
-                if data_type_simple in ["DATE", "DATETIME", "TIME", "TIMESTAMP", "TIMESTAMP_LTZ", "TIMESTAMP_NTZ", "TIMESTAMP_TZ"]:
-                    time_dimension_entry = {
-                        "name": column,
-                        "expr": column,
-                        "description": "<string>",
-                        "unique": True,
-                        "data_type": data_type_simple,
-                        "synonyms": ["<array of strings>"]
-                    }
-                    table_entry["time_dimensions"].append(time_dimension_entry)
-                if data_type_simple in ["VARCHAR", "CHAR", "CHARACTER", "STRING", "TEXT", "BINARY", "VARBINARY"]:
-                    dimension_entry = {
-                        "name": column,
-                        "expr": column,
-                        "description": "<string>",
-                        "data_type": data_type_simple,
-                        "unique": False,
-                        "synonyms": ["<array of strings>"]
-                    }
-                    table_entry["dimensions"].append(dimension_entry)
-                if data_type_simple in ["NUMBER", "DECIMAL", "NUMERIC", "INT", "INTEGER", "BIGINT", "SMALLINT", "TINYINT", "BYTEINT", "FLOAT", "FLOAT4", "FLOAT8", "DOUBLE", "DOUBLE PRECISION", "REAL"]:
-                    measure_entry = {
-                        "name": column,
-                        "expr": column,
-                        "description": "<string>",
-                        "data_type": data_type_simple,
-                        "default_aggregation": "<aggregate function>",
-                        "synonyms": ["<array of strings>"]
-                    }
-                    table_entry["measures"].append(measure_entry)
-
-            st.session_state['yaml_structure']['tables'].append(table_entry)
-            yaml_str = yaml.dump(
-                st.session_state['yaml_structure'], sort_keys=False, indent=2)
-            st.session_state['yaml_str'] = yaml_str  # Save to session state
+            table_entry = build_table_entry(
+                database_selector, schema_selector, table_or_view_selector, columns)
+            serializer = get_model_serializer()
+            serializer.set_table(table_entry)
+            st.session_state['yaml_structure'] = serializer.model()
+            st.session_state['yaml_str'] = serializer.yaml()  # Save to session state
+
+    # Bulk mode: any number of tables, all columns from one INFORMATION_SCHEMA query
+    with st.expander("Add several tables or views"):
+        selected_tables = st.session_state.get('bulk_tables', [])
+        selected_tables = st.multiselect(
+            "Select Tables or Views",
+            list(dict.fromkeys(selected_tables + visible_tables)), key="bulk_tables")
+        table_pattern = st.text_input(
+            "Or match names (comma-separated wildcards, e.g. SALES_*, DIM_*)", key="bulk_pattern")
+        if st.button("Add Selected Tables to YAML"):
+            names = list(dict.fromkeys(
+                selected_tables + match_tables(name_index.names, table_pattern)))
+            st.session_state.setdefault('tables', [])
+            names = [name for name in names if name not in st.session_state['tables']]
+            if names:
+                schema_model = build_schema_model(
+                    fetch_schema_columns(database_selector, schema_selector, session))
+                table_entries = build_table_entries(
+                    session, database_selector, schema_selector, names, schema_model)
+                st.session_state.setdefault('table_columns', {}).update({
+                    name: [column["name"] for column in schema_model[name]["columns"]]
+                    for name in names if name in schema_model})
+                st.session_state['tables'].extend(entry["name"] for entry in table_entries)
+                serializer = get_model_serializer()
+                for table_entry in table_entries:
+                    serializer.set_table(table_entry)
+                st.session_state['yaml_structure'] = serializer.model()
+                st.session_state['yaml_str'] = serializer.yaml()
+                st.success(f"Added {len(table_entries)} tables or views.")
+            else:
+                st.info("No new tables or views selected.")
 
     # Display the updated YAML structure
     st.code(st.session_state.get('yaml_str', yaml.dump(
         yaml_template, sort_keys=False, indent=2)), language='yaml')
 
+    # Offline check of the model before it is used with Cortex Analyst, with
+    # exprs checked against the columns fetched for each table
+    if 'yaml_str' in st.session_state:
+        issues = validate_model(st.session_state['yaml_structure'], columns_by_table(
+            {"columns": st.session_state.get('table_columns', {})}))
+        if issues:
+            st.warning(f"{len(issues)} issues to fix before using this model with Cortex Analyst.")
+            with st.expander("Validation issues"):
+                st.code(format_issues(issues))
+        else:
+            st.success("The model passes offline validation.")
+
     # Create a download button for the YAML file
     yaml_bytes = io.BytesIO(st.session_state.get(
         'yaml_str', '').encode('utf-8'))
@@ -0,0 +1,522 @@
+"""
+Semantic model generation for Cortex Analyst.
+
+Instead of one ``DESCRIBE TABLE`` per table, ``build_table_entries`` builds
+the entries of any number of tables in one pass over the rows of a single
+``INFORMATION_SCHEMA`` query for the schema (``fetch_schema_columns``),
+grouped per table on the client.
+
+``generate_semantic_model`` builds the model uploaded for Cortex Analyst.
+``profile_columns`` reads approximate distinct counts, null counts and top
+values for every column of a table with one query over a ``SAMPLE`` of at
+most ``sample_rows`` rows. Those statistics fill ``sample_values`` and
+``unique``, and turn numeric codes and identifiers into dimensions instead
+of summed measures.
+
+``update_semantic_model`` regenerates incrementally. The fingerprint of
+every table (``LAST_ALTERED``, row count and column list) is kept in a
+sidecar file next to the model on the stage, and only tables whose
+fingerprint changed are profiled and rebuilt. Unchanged tables keep their
+entry from the existing model as is, and rebuilt tables keep the
+descriptions and synonyms edited by hand.
+
+``ModelSerializer`` keeps the rendered YAML and JSON of every table and
+re-renders only the tables that change, so adding a table to a large model
+costs one table's serialization rather than a dump of the whole model. It
+uses libyaml (``CSafeDumper``) when available and renders both formats in
+the same pass. Its output is identical to a full
+``yaml.dump(model, sort_keys=False, indent=2)`` with the same dumper and to
+``json.dumps(model, indent=2)``.
+"""
+import fnmatch
+import io
+import json
+
+import yaml
+
+from schema_metadata import (JOIN_KEY_PATTERN, build_schema_model, fetch_schema_columns,
+                             quote_identifier, table_fingerprint)
+
+# libyaml emitter and parser when PyYAML was built with it
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+SECTIONS = ("dimensions", "time_dimensions", "measures")
+
+TIME_TYPES = {"DATE", "DATETIME", "TIME", "TIMESTAMP", "TIMESTAMP_LTZ",
+              "TIMESTAMP_NTZ", "TIMESTAMP_TZ"}
+TEXT_TYPES = {"VARCHAR", "CHAR", "CHARACTER", "STRING", "TEXT", "BINARY", "VARBINARY"}
+NUMERIC_TYPES = {"NUMBER", "DECIMAL", "NUMERIC", "INT", "INTEGER", "BIGINT", "SMALLINT",
+                 "TINYINT", "BYTEINT", "FLOAT", "FLOAT4", "FLOAT8", "DOUBLE",
+                 "DOUBLE PRECISION", "REAL"}
+INTEGER_TYPES = {"INT", "INTEGER", "BIGINT", "SMALLINT", "TINYINT", "BYTEINT"}
+# Types APPROX_TOP_K is computed for; other columns only get counts
+TOP_VALUE_TYPES = TEXT_TYPES | NUMERIC_TYPES | {"BOOLEAN"}
+
+# Numeric columns with at most this many distinct values are dimensions
+DIMENSION_MAX_DISTINCT = 20
+# Approximate distinct counts within this ratio of the non-null count are unique
+UNIQUE_RATIO = 0.99
+
+
+def simple_type(data_type):
+    """``NUMBER(38,0)`` -> ``NUMBER``."""
+    return data_type.split('(')[0].upper()
+
+
+def is_integer_type(data_type):
+    """``NUMBER(38,0)``, ``INTEGER``, ... but not ``NUMBER(12,2)`` or ``FLOAT``."""
+    data_type_simple = simple_type(data_type)
+    if data_type_simple in ("NUMBER", "DECIMAL", "NUMERIC"):
+        arguments = data_type.partition("(")[2].rstrip(")").split(",")
+        # NUMBER without a scale is NUMBER(38,0)
+        return len(arguments) < 2 or int(arguments[1].strip() or 0) == 0
+    return data_type_simple in INTEGER_TYPES
+
+
+def classify_column(data_type, name=None, profile=None):
+    """
+    Section of a table entry a column of ``data_type`` belongs to:
+    ``"time_dimensions"``, ``"dimensions"``, ``"measures"`` or ``None``.
+    With a ``profile_columns`` profile, integer identifiers and unique
+    integer columns, and low-cardinality codes, are dimensions rather than
+    measures. Uniqueness is judged on a sample, where continuous amounts are
+    nearly always distinct, so it is only trusted for integer columns.
+    """
+    data_type_simple = simple_type(data_type)
+    if data_type_simple in TIME_TYPES:
+        return "time_dimensions"
+    if data_type_simple in TEXT_TYPES:
+        return "dimensions"
+    if data_type_simple in NUMERIC_TYPES:
+        if profile is not None and (
+                (is_integer_type(data_type)
+                 and (profile["unique"] or (name and JOIN_KEY_PATTERN.search(name))))
+                or (profile["distinct"] <= DIMENSION_MAX_DISTINCT
+                    and profile["distinct"] * 2 < profile["rows"] - profile["nulls"])):
+            return "dimensions"
+        return "measures"
+    return None
+
+
+def match_tables(names, pattern):
+    """Names matching a comma-separated list of case-insensitive wildcards (``SALES_*``)."""
+    patterns = [p.strip().upper() for p in pattern.split(",") if p.strip()]
+    return [name for name in names
+            if any(fnmatch.fnmatchcase(name.upper(), p) for p in patterns)]
+
+
+def build_table_entry(database_name, schema_name, table_name, columns):
+    """Table entry of the YAML generator for ``columns`` (``{"name", "data_type"}`` dicts)."""
+    table_entry = {
+        "name": table_name,
+        "description": "",
+        "base_table": {
+            "database": database_name,
+            "schema": schema_name,
+            "table": table_name
+        },
+        "dimensions": [],
+        "time_dimensions": [],
+        "measures": [],
+        "filters": [
+            {
+                "name": "<name>",
+                "synonyms": ["<array of strings>"],
+                "description": "<string>",
+                "expr": "<SQL expression>"
+            }
+        ]
+    }
+
+    for column in columns:
+        section = classify_column(column["data_type"])
+        data_type_simple = simple_type(column["data_type"])
+        if section == "time_dimensions":
+            table_entry["time_dimensions"].append({
+                "name": column["name"],
+                "expr": column["name"],
+                "description": "<string>",
+                "unique": True,
+                "data_type": data_type_simple,
+                "synonyms": ["<array of strings>"]
+            })
+        elif section == "dimensions":
+            table_entry["dimensions"].append({
+                "name": column["name"],
+                "expr": column["name"],
+                "description": "<string>",
+                "data_type": data_type_simple,
+                "unique": False,
+                "synonyms": ["<array of strings>"]
+            })
+        elif section == "measures":
+            table_entry["measures"].append({
+                "name": column["name"],
+                "expr": column["name"],
+                "description": "<string>",
+                "data_type": data_type_simple,
+                "default_aggregation": "<aggregate function>",
+                "synonyms": ["<array of strings>"]
+            })
+    return table_entry
+
+
+def _parse_top_values(value):
+    """APPROX_TOP_K returns ``[[value, count], ...]`` as JSON text."""
+    if value is None:
+        return []
+    pairs = json.loads(value) if isinstance(value, str) else value
+    return [pair[0] if isinstance(pair[0], str) else json.dumps(pair[0])
+            for pair in pairs if pair[0] is not None]
+
+
+def profile_columns(session, database_name, schema_name, table_name, columns,
+                    sample_rows=10000, top_k=5):
+    """
+    Profiles every column of a table with one query over at most
+    ``sample_rows`` sampled rows (the whole table when ``None``).
+
+    Returns ``{column_name: {"rows", "nulls", "distinct", "unique",
+    "top_values"}}``; counts are approximate and relative to the sample.
+    """
+    if len(columns) == 0:
+        return {}
+
+    table = f"{database_name}.{schema_name}.{quote_identifier(table_name)}"
+    source = table if sample_rows is None else f"{table} SAMPLE ({int(sample_rows)} ROWS)"
+    exprs = []
+    for i, column in enumerate(columns):
+        quoted = quote_identifier(column["name"])
+        exprs.append(f"APPROX_COUNT_DISTINCT({quoted}) AS NDV_{i}")
+        exprs.append(f"COUNT({quoted}) AS NN_{i}")
+        if simple_type(column["data_type"]) in TOP_VALUE_TYPES:
+            exprs.append(f"APPROX_TOP_K({quoted}, {int(top_k)}) AS TOP_{i}")
+    row = session.sql(
+        f"SELECT COUNT(*) AS N, {', '.join(exprs)} FROM {source}").collect()[0]
+
+    rows = row['N']
+    profiles = {}
+    for i, column in enumerate(columns):
+        non_null = row[f"NN_{i}"]
+        distinct = row[f"NDV_{i}"]
+        top = row[f"TOP_{i}"] if simple_type(column["data_type"]) in TOP_VALUE_TYPES else None
+        profiles[column["name"]] = {
+            "rows": rows,
+            "nulls": rows - non_null,
+            "distinct": distinct,
+            "unique": rows > 0 and non_null == rows and distinct >= UNIQUE_RATIO * rows,
+            "top_values": _parse_top_values(top)[:top_k],
+        }
+    return profiles
+
+
+def build_analyst_table_entry(database_name, schema_name, table_name, columns, profiles=None):
+    """
+    Table entry of the model generated for Cortex Analyst. ``profiles``
+    (from ``profile_columns``) adds ``sample_values`` and ``unique`` and
+    refines the classification of numeric columns.
+    """
+    table_entry = {
+        "name": table_name,
+        "description": f"Description of {table_name}",
+        "base_table": {
+            "database": database_name,
+            "schema": schema_name,
+            "table": table_name
+        },
+        "dimensions": [],
+        "time_dimensions": [],
+        "measures": []
+    }
+
+    for column in columns:
+        name = column["name"]
+        profile = (profiles or {}).get(name)
+        section = classify_column(column["data_type"], name, profile) or "dimensions"
+        entry = {
+            "name": name,
+            "expr": name,
+            "description": "",
+        }
+        if section == "time_dimensions":
+            entry["unique"] = profile["unique"] if profile else True
+            entry["data_type"] = simple_type(column["data_type"])
+        elif section == "measures":
+            entry["data_type"] = simple_type(column["data_type"])
+            entry["default_aggregation"] = "sum"
+        else:
+            entry["data_type"] = simple_type(column["data_type"])
+            if profile:
+                entry["unique"] = profile["unique"]
+                if profile["top_values"]:
+                    entry["sample_values"] = profile["top_values"]
+        table_entry[section].append(entry)
+    return table_entry
+
+
+def generate_semantic_model(session, database_name, schema_name, model_name="Revenue",
+                            profile_rows=10000, top_k=5):
+    """
+    Semantic model of every table and view in a schema: one INFORMATION_SCHEMA
+    query plus, unless ``profile_rows`` is 0, one profiling query per table.
+    """
+    model, _, _, _ = update_semantic_model(
+        session, database_name, schema_name, model_name=model_name,
+        profile_rows=profile_rows, top_k=top_k)
+    return model
+
+
+def fingerprint_file(model_file):
+    """Name of the sidecar holding the table fingerprints of ``model_file``."""
+    return model_file.rsplit(".", 1)[0] + ".fingerprints.json"
+
+
+def _read_stage_file(session, stage, file_name):
+    try:
+        return session.file.get_stream(f"@{stage}/{file_name}").read().decode('utf-8')
+    except Exception:
+        return None
+
+
+def load_model_state(session, stage, model_file):
+    """
+    The model and table fingerprints last published to ``@stage/model_file``:
+    ``(model, {"settings", "tables", "columns", "row_counts"})``. The state is
+    ``None`` when the sidecar is missing, as on the first incremental run
+    against an existing model, so every table is rebuilt but edits made to
+    the model by hand are kept. Returns ``(None, None)`` without a model.
+    """
+    model_text = _read_stage_file(session, stage, model_file)
+    if model_text is None:
+        return None, None
+    try:
+        model = yaml.load(model_text, Loader=YAML_LOADER)
+    except yaml.YAMLError:
+        return None, None
+    if not isinstance(model, dict):
+        return None, None
+    state_text = _read_stage_file(session, stage, fingerprint_file(model_file))
+    try:
+        state = json.loads(state_text) if state_text is not None else None
+    except ValueError:
+        state = None
+    return model, state
+
+
+def save_model_state(session, stage, model_file, state):
+    data = json.dumps(state, indent=2).encode('utf-8')
+    session.file.put_stream(
+        io.BytesIO(data), f"@{stage}/{fingerprint_file(model_file)}",
+        auto_compress=False, overwrite=True)
+
+
+def _carry_over_edits(old_entry, new_entry):
+    """Copies hand-written descriptions and synonyms from ``old_entry`` onto ``new_entry``."""
+    if old_entry.get("description") and old_entry["description"] != f"Description of {old_entry['name']}":
+        new_entry["description"] = old_entry["description"]
+    edited = {}
+    for section in SECTIONS:
+        for column in old_entry.get(section) or []:
+            edited[column.get("name")] = column
+    for section in SECTIONS:
+        for column in new_entry[section]:
+            old_column = edited.get(column["name"])
+            if old_column is None:
+                continue
+            if old_column.get("description"):
+                column["description"] = old_column["description"]
+            if old_column.get("synonyms"):
+                column["synonyms"] = old_column["synonyms"]
+
+
+def update_semantic_model(session, database_name, schema_name, model=None, state=None,
+                          model_name="Revenue", profile_rows=10000, top_k=5):
+    """
+    Brings ``model`` (with its fingerprint ``state``) up to date with the
+    schema, profiling and rebuilding only the tables whose fingerprint
+    changed. Returns ``(model, state, changed, removed)``; ``changed`` lists
+    the rebuilt tables and ``removed`` the tables no longer in the schema.
+    """
+    schema_model = build_schema_model(fetch_schema_columns(database_name, schema_name, session))
+    settings = {"profile_rows": profile_rows, "top_k": top_k}
+    old_entries = {entry["name"]: entry for entry in (model or {}).get("tables") or []}
+    old_fingerprints = {}
+    if state is not None and state.get("settings") == settings:
+        old_fingerprints = state.get("tables", {})
+
+    tables = []
+    fingerprints = {}
+    changed = []
+    for table_name, table in schema_model.items():
+        fingerprint = table_fingerprint(table)
+        fingerprints[table_name] = fingerprint
+        old_entry = old_entries.get(table_name)
+        if old_entry is not None and old_fingerprints.get(table_name) == fingerprint:
+            tables.append(old_entry)
+            continue
+        profiles = None
+        if profile_rows:
+            try:
+                profiles = profile_columns(session, database_name, schema_name, table_name,
+                                           table["columns"], sample_rows=profile_rows, top_k=top_k)
+            except Exception:
+                # Unreadable views fall back to classification by type
+                profiles = None
+        table_entry = build_analyst_table_entry(
+            database_name, schema_name, table_name, table["columns"], profiles)
+        if old_entry is not None:
+            _carry_over_edits(old_entry, table_entry)
+        tables.append(table_entry)
+        changed.append(table_name)
+
+    removed = [table_name for table_name in old_entries if table_name not in schema_model]
+    updated = dict(model or {"name": model_name})
+    updated["tables"] = tables
+    # Column lists let the model be validated offline against the schema
+    columns = {table_name: [column["name"] for column in table["columns"]]
+               for table_name, table in schema_model.items()}
+    row_counts = {table_name: table["row_count"] for table_name, table in schema_model.items()}
+    state = {"settings": settings, "tables": fingerprints, "columns": columns,
+             "row_counts": row_counts}
+    return updated, state, changed, removed
+
+
+def build_table_entries(session, database_name, schema_name, table_names, schema_model=None):
+    """
+    Table entries for ``table_names`` in the order given, from one
+    INFORMATION_SCHEMA query for the whole schema, or from ``schema_model``
+    (``build_schema_model``) when the caller already has it. Names not found
+    in the schema are skipped.
+    """
+    model = schema_model
+    if model is None:
+        model = build_schema_model(fetch_schema_columns(database_name, schema_name, session))
+    return [build_table_entry(database_name, schema_name, table_name, model[table_name]["columns"])
+            for table_name in table_names if table_name in model]
+
+
+class _FragmentDumper(YAML_DUMPER):
+    # Fragments are rendered separately, so anchors could not be shared anyway
+    def ignore_aliases(self, data):
+        return True
+
+
+def _dump_yaml(data):
+    return yaml.dump(data, Dumper=_FragmentDumper, sort_keys=False, indent=2)
+
+
+def _indent(text, prefix):
+    return text.replace("\n", "\n" + prefix)
+
+
+class ModelSerializer:
+    """
+    Serializes a semantic model as YAML and JSON with one cached fragment
+    per table. ``set_table`` and ``remove_table`` re-render only that table.
+    """
+
+    def __init__(self, header=None):
+        # Top-level keys other than "tables", in model order
+        self.header = dict(header or {})
+        self.tables = {}
+        # Index of "tables" among the top-level keys; None when the model has none yet
+        self._tables_position = len(self.header)
+        self._yaml = None
+        self._json = None
+
+    @classmethod
+    def from_model(cls, model):
+        serializer = cls({key: value for key, value in model.items() if key != "tables"})
+        serializer._tables_position = list(model).index("tables") if "tables" in model else None
+        for table_entry in model.get("tables", []):
+            serializer.set_table(table_entry)
+        return serializer
+
+    def set_table(self, table_entry):
+        """Adds ``table_entry``, or replaces the table of the same name in place."""
+        self.tables[table_entry["name"]] = (
+            table_entry,
+            _dump_yaml([table_entry]),
+            "    " + _indent(json.dumps(table_entry, indent=2), "    "),
+        )
+        self._yaml = self._json = None
+
+    def remove_table(self, table_name):
+        if self.tables.pop(table_name, None) is not None:
+            self._yaml = self._json = None
+
+    def update(self, model, changed=(), removed=()):
+        """
+        Brings the serializer in line with ``model`` after an incremental
+        update: re-renders the ``changed`` tables (and any it does not hold
+        yet), drops the ``removed`` ones and follows the model's table order.
+        Unchanged tables keep their rendered fragments.
+        """
+        header = {key: value for key, value in model.items() if key != "tables"}
+        if header != self.header:
+            self.header = header
+            self._yaml = self._json = None
+        position = list(model).index("tables") if "tables" in model else None
+        if position != self._tables_position:
+            self._tables_position = position
+            self._yaml = self._json = None
+        for table_name in removed:
+            self.remove_table(table_name)
+        changed = set(changed)
+        entries = model.get("tables", [])
+        for table_entry in entries:
+            if table_entry["name"] in changed or table_entry["name"] not in self.tables:
+                self.set_table(table_entry)
+        order = [table_entry["name"] for table_entry in entries]
+        if list(self.tables) != order:
+            # Reordering reuses the rendered fragments
+            self.tables = {table_name: self.tables[table_name] for table_name in order}
+            self._yaml = self._json = None
+
+    def set_header(self, **values):
+        self.header.update(values)
+        self._yaml = self._json = None
+
+    def _keys(self):
+        keys = list(self.header)
+        if self._tables_position is not None:
+            keys.insert(min(self._tables_position, len(keys)), "tables")
+        elif self.tables:
+            keys.append("tables")
+        return keys
+
+    def model(self):
+        """The model as a plain dict (table entries are shared, not copied)."""
+        return {key: [entry for entry, _, _ in self.tables.values()] if key == "tables"
+                else self.header[key] for key in self._keys()}
+
+    def yaml(self):
+        if self._yaml is None:
+            parts = []
+            for key in self._keys():
+                if key != "tables":
+                    parts.append(_dump_yaml({key: self.header[key]}))
+                elif self.tables:
+                    parts.append("tables:\n")
+                    parts.extend(fragment for _, fragment, _ in self.tables.values())
+                else:
+                    parts.append("tables: []\n")
+            self._yaml = "".join(parts)
+        return self._yaml
+
+    def json(self):
+        if self._json is None:
+            members = []
+            for key in self._keys():
+                if key != "tables":
+                    members.append(f"  {json.dumps(key)}: "
+                                   + _indent(json.dumps(self.header[key], indent=2), "  "))
+                elif self.tables:
+                    members.append('  "tables": [\n'
+                                   + ",\n".join(fragment for _, _, fragment in self.tables.values())
+                                   + "\n  ]")
+                else:
+                    members.append('  "tables": []')
+            self._json = "{\n" + ",\n".join(members) + "\n}"
+        return self._json
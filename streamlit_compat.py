@@ -0,0 +1,18 @@
+"""
+Streamlit version compatibility for the app pages.
+
+Kept free of a ``streamlit`` import so the fallbacks can be exercised
+without Streamlit installed.
+"""
+
+
+def resolve_fragment(streamlit):
+    """
+    The decorator for partial reruns: ``st.fragment``, else
+    ``st.experimental_fragment`` (before Streamlit 1.37), else one that
+    returns the function unchanged, so on older versions the decorated
+    functions simply run as part of the full script.
+    """
+    return (getattr(streamlit, "fragment", None)
+            or getattr(streamlit, "experimental_fragment", None)
+            or (lambda func: func))
@@ -0,0 +1,44 @@
+import hashlib
+
+from artifact_publisher import publish_artifacts, stage_md5s
+from local_session import LocalSession
+
+
+def test_uploads_then_skips_unchanged_files():
+    session = LocalSession()
+    artifacts = {"model.yaml": "name: M\n", "model.json": b"{}"}
+    results = publish_artifacts(session, "STAGE/dir", artifacts)
+    assert {name: result["status"] for name, result in results.items()} == {
+        "model.yaml": "UPLOADED", "model.json": "UPLOADED"}
+    assert session.file.files["STAGE/dir/model.yaml"] == b"name: M\n"
+
+    results = publish_artifacts(session, "STAGE/dir", dict(artifacts, **{"model.json": b"[]"}))
+    assert results["model.yaml"]["status"] == "SKIPPED"
+    assert results["model.json"]["status"] == "UPLOADED"
+    assert session.file.files["STAGE/dir/model.json"] == b"[]"
+
+
+def test_listing_matches_exact_names_and_prefers_the_stage_root():
+    session = LocalSession()
+    publish_artifacts(session, "STAGE/sub", {"a.yaml": "sub"})
+    publish_artifacts(session, "STAGE", {"a.yaml": "root", "a+yaml": "plus"})
+    assert stage_md5s(session, "STAGE", ["a.yaml"]) == {"a.yaml": hashlib.md5(b"root").hexdigest()}
+
+
+def test_failures_are_reported_per_file():
+    session = LocalSession()
+
+    def put_stream(stream, location, **kwargs):
+        raise Exception("permission denied")
+
+    session.file.put_stream = put_stream
+    results = publish_artifacts(session, "STAGE", {"model.yaml": "x"})
+    assert results["model.yaml"]["status"] == "FAILED"
+    assert results["model.yaml"]["error"] == "permission denied"
+
+
+def test_listing_errors_fall_back_to_uploading():
+    session = LocalSession()
+    session.register(r"^LIST", lambda session, match, params: 1 / 0)
+    assert publish_artifacts(session, "STAGE", {"a": "x"})["a"]["status"] == "UPLOADED"
+    assert publish_artifacts(session, "STAGE", {"a": "x"})["a"]["status"] == "UPLOADED"
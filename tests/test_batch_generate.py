@@ -0,0 +1,79 @@
+import json
+import re
+
+import yaml
+
+from batch_generate import (SessionPool, format_summary, generate_schema, local_session_factory,
+                            main, run_batch)
+
+
+def statuses(results):
+    return {result["schema"]: result["status"] for result in results}
+
+
+def test_every_schema_is_published_to_its_own_path():
+    factory = local_session_factory(schemas=3, tables=4, columns=6)
+    results = run_batch(factory, ["DB"], "STAGE", workers=2)
+    assert statuses(results) == {f"SCHEMA_{i:02d}": "ok" for i in range(3)}
+    assert all(result["tables"] == 4 and result["changed"] == 4 for result in results)
+    assert results[0]["rows"] == 1000 + 2000 + 3000 + 4000
+
+    files = factory().file.files
+    model = yaml.safe_load(files["STAGE/DB/SCHEMA_01/semantic_model.yaml"])
+    assert model["name"] == "SCHEMA_01"
+    assert [table["name"] for table in model["tables"]][0] == "SCHEMA_01_T000"
+    assert json.loads(files["STAGE/DB/SCHEMA_01/semantic_model.json"]) == model
+    assert "STAGE/DB/SCHEMA_01/semantic_model.fingerprints.json" in files
+
+
+def test_second_run_is_incremental_and_unchanged():
+    factory = local_session_factory(schemas=2, tables=3, columns=4)
+    run_batch(factory, ["DB"], "STAGE", workers=2)
+    results = run_batch(factory, ["DB"], "STAGE", workers=2)
+    assert set(statuses(results).values()) == {"unchanged"}
+    assert all(result["changed"] == 0 for result in results)
+
+    results = run_batch(factory, ["DB"], "STAGE", workers=2, incremental=False)
+    assert all(result["changed"] == 3 for result in results)
+    assert set(statuses(results).values()) == {"unchanged"}
+
+
+def test_schema_filter_and_dry_run():
+    factory = local_session_factory(schemas=3, tables=2, columns=3)
+    results = run_batch(factory, ["DB"], "STAGE", schema_patterns="*_01,*_02", dry_run=True)
+    assert statuses(results) == {"SCHEMA_01": "dry-run", "SCHEMA_02": "dry-run"}
+    assert factory().file.files == {}
+
+
+def test_failures_are_reported_in_the_summary():
+    factory = local_session_factory(schemas=1, tables=1, columns=2)
+    session = factory()
+    session.handlers.insert(0, (re.compile(r"INFORMATION_SCHEMA\.COLUMNS"),
+                                lambda session, match, params: 1 / 0))
+    result = generate_schema(session, "DB", "SCHEMA_00", "STAGE")
+    assert result["status"] == "failed" and "division" in result["message"]
+    summary = format_summary([result], 1.0)
+    assert "DB.SCHEMA_00: division by zero" in summary
+    assert summary.endswith("1 schemas, 0 tables, 0 regenerated, 0 rows in 1.00s")
+
+
+def test_session_pool_creates_at_most_size_sessions():
+    created = []
+    pool = SessionPool(lambda: created.append(object()) or created[-1], 2)
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+    assert pool.acquire() is first
+    pool.release(first)
+    pool.release(second)
+    assert len(created) == 2
+    pool.close()
+
+
+def test_main_writes_the_summary(tmp_path, capsys):
+    summary_file = tmp_path / "summary.json"
+    code = main(["--database", "DB", "--stage", "STAGE", "--local", "--workers", "2",
+                 "--summary", str(summary_file)])
+    assert code == 0
+    results = json.loads(summary_file.read_text())
+    assert statuses(results) == {f"SCHEMA_{i:02d}": "ok" for i in range(3)}
+    assert "3 schemas, 60 tables, 60 regenerated" in capsys.readouterr().out
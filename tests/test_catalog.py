@@ -0,0 +1,88 @@
+import time
+
+from catalog import CatalogCache, NameIndex
+from local_session import LocalSession
+
+
+def catalog_session(objects):
+    session = LocalSession()
+    session.register(r"^SHOW DATABASES", lambda session, match, params: [{"name": "DB"}])
+    session.register(r"^SHOW SCHEMAS IN DATABASE (\w+)",
+                     lambda session, match, params: [{"name": f"{match.group(1)}_SC"}])
+    session.register(r"INFORMATION_SCHEMA\.TABLES", lambda session, match, params: [
+        {"TABLE_NAME": name, "TABLE_TYPE": kind} for name, kind in objects])
+    return session
+
+
+def test_lists_are_cached_per_level():
+    session = catalog_session([("ORDERS", "BASE TABLE"), ("V_SALES", "VIEW")])
+    cache = CatalogCache()
+    for _ in range(3):
+        assert cache.databases(session) == ["DB"]
+        assert cache.schemas(session, "DB") == ["DB_SC"]
+        assert cache.objects(session, "DB", "SC") == [("ORDERS", "TABLE"), ("V_SALES", "VIEW")]
+    assert len(session.queries) == 3
+    # Tables and views come from one query, with the schema bound
+    assert session.queries[2][1] == ["SC"]
+
+
+def test_expired_entries_are_served_while_refreshing():
+    objects = [("ORDERS", "BASE TABLE")]
+    session = catalog_session(objects)
+    cache = CatalogCache(ttls={"objects": 0})
+    assert cache.objects(session, "DB", "SC") == [("ORDERS", "TABLE")]
+    objects.append(("RETURNS", "BASE TABLE"))
+    assert cache.objects(session, "DB", "SC") == [("ORDERS", "TABLE")]
+    deadline = time.monotonic() + 5
+    while len(cache.objects(session, "DB", "SC")) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert cache.objects(session, "DB", "SC")[-1] == ("RETURNS", "TABLE")
+
+
+def test_invalidate_by_prefix():
+    session = catalog_session([])
+    cache = CatalogCache()
+    cache.databases(session)
+    cache.objects(session, "DB", "A")
+    cache.objects(session, "DB", "B")
+    cache.invalidate("objects", "DB")
+    cache.databases(session)
+    cache.objects(session, "DB", "A")
+    assert len(session.queries) == 4
+
+
+def test_name_index_is_rebuilt_only_when_the_list_changes():
+    session = catalog_session([("ORDERS", "BASE TABLE")])
+    cache = CatalogCache()
+    index = cache.name_index(session, "DB", "SC")
+    assert cache.name_index(session, "DB", "SC") is index
+    cache.invalidate()
+    assert cache.name_index(session, "DB", "SC") is not index
+
+
+NAMES = ["SALES", "SALES_2023", "SALES_DAILY", "DAILY_SALES", "RETURNS", "FACT_ORDER_SALES",
+         "CUSTOMER", "CUSTOMERS_RAW"]
+
+
+def test_search_ranks_exact_prefix_word_and_substring_matches():
+    index = NameIndex(NAMES)
+    assert index.search("sales") == [
+        "SALES", "SALES_2023", "SALES_DAILY", "DAILY_SALES", "FACT_ORDER_SALES"]
+    assert index.search("sales", limit=2) == ["SALES", "SALES_2023"]
+    # Plain substring matches rank by length
+    assert index.search("ALE") == [
+        "SALES", "SALES_2023", "DAILY_SALES", "SALES_DAILY", "FACT_ORDER_SALES"]
+    assert index.search("cu") == ["CUSTOMER", "CUSTOMERS_RAW"]
+
+
+def test_search_falls_back_to_shared_trigrams():
+    index = NameIndex(NAMES)
+    assert index.search("CUSTMER")[0] == "CUSTOMER"
+    assert index.search("zzzz") == []
+
+
+def test_empty_query_lists_every_name():
+    index = NameIndex(["b", "A", "b"])
+    assert len(index) == 2
+    assert index.search("") == ["A", "b"]
+    assert index.search("  ", limit=1) == ["A"]
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from chart_data import detect_axis, lttb, prepare_chart_data
+from local_session import LocalSession
+from query_exec import BatchedResult
+
+
+def fetched(df, query_id=None):
+    result = BatchedResult([df], query_id=query_id)
+    result.fetch_next()
+    return result
+
+
+def test_detect_axis():
+    assert detect_axis(pd.DataFrame({"REGION": ["A"], "REV": [1.0]})) == ("REGION", "category", ["REV"])
+    assert detect_axis(pd.DataFrame({"N": [1], "REV": [1.0]}))[1] == "numeric"
+    dates = pd.DataFrame({"DAY": pd.to_datetime(["2024-01-01"]), "REV": [1.0]})
+    assert detect_axis(dates)[1] == "time"
+
+
+@pytest.mark.parametrize("aggregate, expected", [
+    ("AVG", {"EAST": 15.0, "WEST": 5.0}),
+    ("SUM", {"EAST": 30.0, "WEST": 10.0}),
+    ("MAX", {"EAST": 20.0, "WEST": 7.0}),
+])
+def test_category_axis_is_aggregated_on_the_client(aggregate, expected):
+    df = pd.DataFrame({"REGION": ["EAST", "WEST", "EAST", "WEST"], "REV": [10.0, 3.0, 20.0, 7.0]})
+    chart = prepare_chart_data(LocalSession(), fetched(df), aggregate=aggregate)
+    assert chart["REV"].to_dict() == expected
+
+
+def test_category_axis_keeps_the_largest_groups_in_result_order():
+    revenue = [4.0, 9.0, 1.0, 7.0, 0.0, 8.0, 2.0, 3.0, 5.0, 6.0]
+    df = pd.DataFrame({"REGION": [f"R{i}" for i in range(10)], "REV": revenue})
+    chart = prepare_chart_data(LocalSession(), fetched(df), max_points=3)
+    assert list(chart.index) == ["R1", "R3", "R5"]
+
+
+def test_numeric_axis_is_downsampled():
+    df = pd.DataFrame({"X": np.arange(5000), "Y": np.sin(np.arange(5000) / 100.0)})
+    chart = prepare_chart_data(LocalSession(), fetched(df), max_points=200)
+    assert len(chart.index) == 200
+    assert chart.index.is_monotonic_increasing
+
+
+def test_pushdown_runs_on_the_cached_result():
+    session = LocalSession()
+    session.register(r"RESULT_SCAN\('q1'\)", lambda session, match, params: [
+        {"REGION": "EAST", "REV": 30.0}, {"REGION": "WEST", "REV": 10.0}])
+    df = pd.DataFrame({"REGION": ["EAST"], "REV": [10.0]})
+    result = BatchedResult([df, df], query_id="q1")
+    result.fetch_next()
+    chart = prepare_chart_data(session, result, aggregate="SUM")
+    assert chart["REV"].to_dict() == {"EAST": 30.0, "WEST": 10.0}
+    assert 'SUM("REV")' in session.queries[-1][0]
+
+
+def test_other_is_aggregated_from_the_rows():
+    session = LocalSession()
+    session.register(r"RESULT_SCAN\('q1'\)", lambda session, match, params: [
+        {"REGION": "EAST", "REV": 30.0}, {"REGION": "Other", "REV": 10.0}])
+    df = pd.DataFrame({"REGION": ["EAST"], "REV": [10.0]})
+    result = BatchedResult([df, df], query_id="q1")
+    result.fetch_next()
+    prepare_chart_data(session, result, max_points=2, aggregate="AVG")
+    query = session.queries[-1][0]
+    # One AVG to rank the categories, one over the rows of each category or 'Other'
+    assert query.count('AVG("REV")') == 2 and "AVG(AVG" not in query
+    assert "FROM TABLE(RESULT_SCAN('q1')) r JOIN categories" in query
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    y = np.zeros(1000)
+    y[500] = 100.0
+    df = pd.DataFrame({"X": np.arange(1000), "Y": y})
+    sampled = lttb(df, "X", "Y", 50)
+    assert len(sampled.index) == 50
+    assert sampled["X"].iloc[0] == 0 and sampled["X"].iloc[-1] == 999
+    assert 500 in set(sampled["X"])
+
+
+def test_lttb_returns_small_frames_unchanged():
+    df = pd.DataFrame({"X": [1, 2, 3], "Y": [1.0, 2.0, 3.0]})
+    assert lttb(df, "X", "Y", 10) is df
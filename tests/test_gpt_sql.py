@@ -0,0 +1,144 @@
+import json
+
+from gpt_sql import (batch_gpt4_sql, batch_summarize, gpt4_sql_by_id, gpt4_sql_packed,
+                     metadata_hash, parse_packed_response, plan_packs, register_metadata)
+from local_session import LocalSession
+
+
+def metadata_session():
+    """LocalSession keeping GPT_SCHEMA_METADATA rows in ``session.tables``."""
+    session = LocalSession()
+    rows = session.tables.setdefault("GPT_SCHEMA_METADATA", [])
+
+    def merge(session, match, params):
+        digest, metadata = params
+        if not any(row["HASH"] == digest for row in rows):
+            rows.append({"HASH": digest, "METADATA": metadata})
+        return [{"number of rows inserted": 1}]
+
+    def lookup(session, match, params):
+        question, digest = params
+        return [{"SQL": f"SELECT '{question}' -- {row['METADATA']}"}
+                for row in rows if row["HASH"] == digest]
+
+    session.register(r"^\s*CREATE TABLE IF NOT EXISTS", lambda session, match, params: [])
+    session.register(r"^\s*DELETE FROM", lambda session, match, params: [])
+    session.register(r"^\s*MERGE INTO", merge)
+    session.register(r"WHERE m\.HASH = \?", lookup)
+    return session
+
+
+def statements(session, keyword):
+    return [query for query, _ in session.queries if query.lstrip().startswith(keyword)]
+
+
+def test_metadata_is_registered_by_hash():
+    session = metadata_session()
+    digest = register_metadata(session, "DDL A")
+    assert digest == metadata_hash("DDL A")
+    assert register_metadata(session, "DDL A") == digest
+    assert len(session.tables["GPT_SCHEMA_METADATA"]) == 1
+    assert gpt4_sql_by_id(session, "q", digest) == "SELECT 'q' -- DDL A"
+
+
+def test_table_is_created_and_expired_once_per_session():
+    session = metadata_session()
+    for i in range(5):
+        register_metadata(session, f"DDL {i}")
+    assert len(statements(session, "CREATE")) == 1
+    assert len(statements(session, "DELETE")) == 1
+    assert len(statements(session, "MERGE")) == 5
+
+    other = metadata_session()
+    register_metadata(other, "DDL 0")
+    assert len(statements(other, "CREATE")) == 1
+
+
+def batch_session(respond):
+    """LocalSession answering the set-based UDF call over the temporary table."""
+    session = LocalSession()
+
+    def udf(session, match, params):
+        rows = session.tables[match.group(2).upper()]
+        # Out of order, as the warehouse may return them
+        return [{"ID": row["ID"], "RESPONSE": respond(row[match.group(1)], params)}
+                for row in reversed(rows)]
+
+    session.register(r"SELECT ID, \w+\((\w+)(?:, \?)?\) AS RESPONSE FROM (\w+)", udf)
+    return session
+
+
+def test_batch_sql_is_one_udf_call_in_question_order():
+    session = batch_session(lambda question, params: f"```sql\nSELECT '{question}'\n```")
+    statements = batch_gpt4_sql(session, ["a", "b", "c"], "DDL")
+    assert statements == ["SELECT 'a'", "SELECT 'b'", "SELECT 'c'"]
+    udf_calls = [query for query, _ in session.queries if "RESPONSE" in query]
+    assert len(udf_calls) == 1
+    assert session.queries[0][1] == ["DDL"]
+    # The temporary table is dropped afterwards
+    assert session.tables == {}
+
+
+def test_batch_summarize_and_empty_batches():
+    session = batch_session(lambda text, params: text.upper())
+    assert batch_summarize(session, ["x", "y"]) == ["X", "Y"]
+    assert batch_gpt4_sql(LocalSession(), [], "DDL") == []
+
+
+def test_batch_summaries_are_handed_over_in_order():
+    session = batch_session(lambda text, params: None if text == "b" else text.upper())
+    handed = []
+    summaries = batch_summarize(session, ["a", "b", "c"],
+                                on_summary=lambda index, summary: handed.append((index, summary)))
+    assert handed == [(0, "A"), (1, None), (2, "C")]
+    assert summaries == ["A", None, "C"]
+
+    # Items without a row are still handed over, after the rows that came back
+    session = LocalSession()
+    session.register(r"AS RESPONSE", lambda session, match, params: [{"ID": 1, "RESPONSE": "B"}])
+    handed.clear()
+    batch_summarize(session, ["a", "b", "c"],
+                    on_summary=lambda index, summary: handed.append((index, summary)))
+    assert handed == [(0, None), (1, "B"), (2, None)]
+
+
+def test_plan_packs_respects_the_budget():
+    assert plan_packs(["q"] * 5, "", token_budget=100000, max_pack_size=2) == [[0, 1], [2, 3], [4]]
+    # Each question costs about 200 output tokens
+    assert plan_packs(["q"] * 3, "x" * 400, token_budget=550) == [[0, 1], [2]]
+
+
+def test_parse_packed_response():
+    response = '```json\n["SELECT 1", "not sql", {"sql": "SELECT 3"}]\n```'
+    assert parse_packed_response(response, 4) == ["SELECT 1", None, "SELECT 3", None]
+    assert parse_packed_response("no json here", 2) == [None, None]
+
+
+def test_packed_generation_falls_back_per_question():
+    session = LocalSession()
+
+    def udf(session, match, params):
+        prompt = params[0]
+        if prompt.startswith("Answer each"):
+            return [{"R": json.dumps(["SELECT 1", "oops"])}]
+        return [{"R": f"SELECT '{prompt}'"}]
+
+    session.register(r"SELECT CHATGPT_4\(\?, \?\)", udf)
+    statements, fallbacks = gpt4_sql_packed(session, ["q1", "q2"], "DDL")
+    assert statements == ["SELECT 1", "SELECT 'q2'"]
+    assert fallbacks == 1
+    assert all(params[1] == "DDL" for _, params in session.queries)
+
+
+def test_packed_fallback_failures_are_kept_per_question():
+    session = LocalSession()
+
+    def udf(session, match, params):
+        if params[0] == "q2":
+            raise RuntimeError("UDF timed out")
+        return [{"R": json.dumps(["SELECT 1", "oops", "SELECT 3"])}]
+
+    session.register(r"SELECT CHATGPT_4\(\?, \?\)", udf)
+    statements, fallbacks = gpt4_sql_packed(session, ["q1", "q2", "q3"], "DDL")
+    assert statements[::2] == ["SELECT 1", "SELECT 3"] and fallbacks == 1
+    assert isinstance(statements[1], RuntimeError)
@@ -0,0 +1,55 @@
+import io
+
+import pytest
+
+from local_session import LocalRow, LocalSession
+
+
+def test_rows_support_position_key_and_attribute_access():
+    row = LocalRow({"NAME": "ORDERS", "ROWS": 3})
+    assert row[0] == "ORDERS" and row["ROWS"] == 3 and row.NAME == "ORDERS"
+    assert row.as_dict() == {"NAME": "ORDERS", "ROWS": 3}
+    with pytest.raises(AttributeError):
+        row.MISSING
+
+
+def test_statements_are_routed_to_handlers_with_params():
+    session = LocalSession()
+    session.register(r"FROM ORDERS WHERE ID = \?",
+                     lambda session, match, params: [{"ID": params[0]}])
+    assert session.sql("SELECT * FROM orders WHERE id = ?", params=[7]).collect()[0]["ID"] == 7
+    assert session.queries == [("SELECT * FROM orders WHERE id = ?", [7])]
+    with pytest.raises(Exception, match="no handler"):
+        session.sql("SELECT 1").collect()
+
+
+def test_temporary_tables_are_written_and_dropped():
+    session = LocalSession()
+    session.create_dataframe([(0, "a"), (1, "b")], schema=["ID", "Q"]).write.save_as_table(
+        "tmp_q", mode="overwrite", table_type="temporary")
+    assert session.tables["TMP_Q"] == [{"ID": 0, "Q": "a"}, {"ID": 1, "Q": "b"}]
+    session.sql("DROP TABLE IF EXISTS TMP_Q").collect()
+    assert "TMP_Q" not in session.tables
+
+
+def test_async_jobs_return_rows_and_batches():
+    session = LocalSession()
+    session.register(r"FROM T", lambda session, match, params: [{"N": i} for i in range(5)])
+    job = session.sql("SELECT N FROM T").collect_nowait()
+    assert session.create_async_job(job.query_id) is job
+    assert [row["N"] for row in job.result()] == list(range(5))
+    batches = list(session.sql("SELECT N FROM T").to_pandas_batches(batch_size=2))
+    assert [len(batch.index) for batch in batches] == [2, 2, 1]
+
+
+def test_stage_files_can_be_put_read_and_listed():
+    session = LocalSession()
+    session.file.put_stream(io.BytesIO(b"a: 1\n"), "@STAGE/dir/model.yaml")
+    session.file.put_stream(io.BytesIO(b"{}"), "@STAGE/model.json")
+    assert session.file.get_stream("@STAGE/dir/model.yaml").read() == b"a: 1\n"
+    names = [row["name"] for row in session.sql("LIST @STAGE").collect()]
+    assert names == ["STAGE/dir/model.yaml", "STAGE/model.json"]
+    listed = session.sql("LIST @STAGE PATTERN = '.*[.]json'").collect()
+    assert [row["name"] for row in listed] == ["STAGE/model.json"]
+    with pytest.raises(Exception):
+        session.file.get_stream("@STAGE/missing.yaml")
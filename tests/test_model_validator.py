@@ -0,0 +1,99 @@
+import copy
+
+import pytest
+
+from model_validator import columns_by_table, expr_columns, format_issues, validate_model
+
+MODEL = {
+    "name": "Revenue",
+    "tables": [{
+        "name": "ORDERS",
+        "description": "Orders",
+        "base_table": {"database": "DB", "schema": "SC", "table": "ORDERS"},
+        "dimensions": [{"name": "REGION", "expr": "REGION", "data_type": "TEXT",
+                        "sample_values": ["EAST", "WEST"]}],
+        "time_dimensions": [{"name": "ORDER_DATE", "expr": "ORDER_DATE", "data_type": "DATE",
+                             "unique": False}],
+        "measures": [{"name": "MARGIN", "expr": "SUM(o.REVENUE) - COGS::NUMBER(12,2)",
+                      "data_type": "NUMBER", "default_aggregation": "sum"}],
+        "filters": [{"name": "RECENT", "expr": "ORDER_DATE >= CURRENT_DATE - INTERVAL '30 days'"}],
+    }],
+}
+COLUMNS = {"ORDERS": {"REGION", "ORDER_DATE", "REVENUE", "COGS"}}
+
+
+def paths(issues, level="error"):
+    return [issue["path"] for issue in issues if issue["level"] == level]
+
+
+@pytest.mark.parametrize("expr, expected", [
+    ("REGION", ["REGION"]),
+    ("SUM(o.revenue) - COGS::NUMBER(12,2)", ["REVENUE", "COGS"]),
+    ("CASE WHEN STATUS = 'DONE' THEN 1 ELSE 0 END", ["STATUS"]),
+    ('"Mixed Case" || name', ["Mixed Case", "NAME"]),
+    ("ORDER_DATE >= CURRENT_DATE - INTERVAL '7 days' -- REGION", ["ORDER_DATE"]),
+    # Date and time parts are not columns
+    ("DATEADD(month, -3, CURRENT_DATE)", []),
+    ("DATEADD(day, -30, CURRENT_DATE())", []),
+    ("EXTRACT(YEAR FROM ORDER_DATE)", ["ORDER_DATE"]),
+    ("DATEDIFF(dd, SHIPPED_AT, ORDER_DATE)", ["SHIPPED_AT", "ORDER_DATE"]),
+    ("DATE_TRUNC(QUARTER, ORDER_DATE) = DATE_TRUNC('QUARTER', CURRENT_DATE)", ["ORDER_DATE"]),
+    ("DATE_PART(hour, CREATED_AT) + HOUR", ["CREATED_AT", "HOUR"]),
+])
+def test_expr_columns(expr, expected):
+    assert expr_columns(expr) == expected
+
+
+def test_a_valid_model_has_no_issues():
+    assert validate_model(MODEL, COLUMNS) == []
+
+
+def test_every_issue_is_reported_at_once():
+    model = copy.deepcopy(MODEL)
+    table = model["tables"][0]
+    table["description"] = "<string>"
+    table["dimensions"].append(dict(table["dimensions"][0], sample_values=["", "x"]))
+    table["time_dimensions"][0]["data_type"] = "TEXT"
+    table["measures"][0]["default_aggregation"] = "total"
+    table["measures"][0]["expr"] = "SUM(PROFIT)"
+    table["measures"].append({"name": "M", "expr": "REVENUE", "data_type": "DECIMALS",
+                              "unique": "yes"})
+    del table["base_table"]["schema"]
+
+    issues = validate_model(model, COLUMNS)
+    assert paths(issues) == [
+        "tables[0] (ORDERS).base_table.schema",
+        "tables[0] (ORDERS).description",
+        "tables[0] (ORDERS).dimensions[1].name",
+        "tables[0] (ORDERS).measures[0].default_aggregation",
+        "tables[0] (ORDERS).measures[0].expr",
+        "tables[0] (ORDERS).measures[1].data_type",
+        "tables[0] (ORDERS).measures[1].unique",
+    ]
+    assert paths(issues, "warning") == [
+        "tables[0] (ORDERS).dimensions[1].sample_values",
+        "tables[0] (ORDERS).time_dimensions[0].data_type",
+    ]
+    report = format_issues(issues, limit=3)
+    assert report.splitlines()[0].startswith("ERROR")
+    assert report.endswith("... and 6 more")
+
+
+def test_placeholders_are_reported_once():
+    model = copy.deepcopy(MODEL)
+    model["tables"][0]["measures"][0]["default_aggregation"] = "<aggregate function>"
+    issues = validate_model(model)
+    assert paths(issues) == ["tables[0] (ORDERS).measures[0].default_aggregation"]
+
+
+def test_structural_errors():
+    assert paths(validate_model([])) == [""]
+    assert paths(validate_model({"name": "M", "tables": []})) == ["model.tables"]
+    model = {"name": "M", "tables": [copy.deepcopy(MODEL["tables"][0])] * 2 + ["x"]}
+    assert paths(validate_model(model)) == ["tables[1] (ORDERS).name", "tables[2]"]
+
+
+def test_columns_by_table_reads_the_sidecar():
+    state = {"columns": {"ORDERS": ["Region", "COGS"]}}
+    assert columns_by_table(state) == {"ORDERS": {"REGION", "COGS"}}
+    assert columns_by_table(None) == {}
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+pytest.importorskip("fpdf")
+
+from pdf_report import LINE_TOKEN, ReportWriter, strip_inline, to_latin1  # noqa: E402
+
+
+@pytest.mark.parametrize("line, kind", [
+    ("### Summary", "heading_text"),
+    ("- item", "item_text"),
+    ("2) item", "item_text"),
+    ("| A | B |", "table_row"),
+    ("|---|---:|", "table_rule"),
+    ("", "blank"),
+])
+def test_line_kinds(line, kind):
+    assert LINE_TOKEN.match(line).lastgroup == kind
+
+
+def test_inline_markers_and_latin1():
+    assert strip_inline("**bold** and *italic*") == "bold and italic"
+    assert to_latin1("naïve → ok") == "naïve ? ok"
+
+
+def test_sections_are_written_to_a_file(tmp_path):
+    path = str(tmp_path / "report.pdf")
+    writer = ReportWriter(path=path)
+    answer = "### Summary\n- **Top**: *NA*\n\n| A | B |\n|---|---|\n| 1 | 2 |"
+    for number in range(3):
+        writer.add_section(f"Question {number}", answer)
+    assert writer.close() == path
+    assert writer.sections == 3
+    with open(path, "rb") as report:
+        assert report.read(5) == b"%PDF-"
+    assert os.path.getsize(path) > 0
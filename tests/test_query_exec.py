@@ -0,0 +1,142 @@
+import threading
+
+import pandas as pd
+import pytest
+
+from local_session import LocalSession
+from query_exec import (AsyncQueryRunner, BatchedResult, QueryTimeoutError, SingleFlight,
+                        canonicalize_sql)
+
+
+def test_async_runner_returns_results_in_order():
+    session = LocalSession()
+    session.register(r"SELECT (\d+)", lambda session, match, params: [{"N": int(match.group(1))}])
+    runner = AsyncQueryRunner()
+    jobs = [runner.submit(session, sql) for sql in ("SELECT 1", "SELECT 2")]
+    progress = []
+    results = runner.wait(jobs, poll_interval=0.01,
+                          on_progress=lambda done, total, elapsed: progress.append((done, total)))
+    assert [rows[0]["N"] for rows in results] == [1, 2]
+    assert progress[-1] == (2, 2)
+
+
+def test_async_runner_cancels_on_timeout_and_returns_errors():
+    session = LocalSession()
+    release = threading.Event()
+    session.register(r"SLOW", lambda session, match, params: release.wait(5) and [])
+    session.register(r"FAIL", lambda session, match, params: 1 / 0)
+    runner = AsyncQueryRunner()
+    jobs = [runner.submit(session, sql) for sql in ("SELECT SLOW", "SELECT FAIL")]
+    slow, failing = runner.wait(jobs, timeout=0.05, poll_interval=0.01)
+    release.set()
+    assert isinstance(slow, QueryTimeoutError)
+    assert isinstance(failing, ZeroDivisionError)
+    assert runner.jobs == {}
+
+
+def test_cancel_by_owner():
+    session = LocalSession()
+    release = threading.Event()
+    session.register(r"SLOW", lambda session, match, params: release.wait(5) and [])
+    runner = AsyncQueryRunner()
+    mine = runner.submit(session, "SELECT SLOW", owner="gpt4")
+    other = runner.submit(session, "SELECT SLOW", owner="analyst")
+    runner.cancel("gpt4")
+    assert mine.cancelled and not other.cancelled
+    assert list(runner.jobs) == ["analyst"]
+    release.set()
+
+
+def test_batched_result_fetches_on_demand_up_to_the_cap():
+    batches = (pd.DataFrame({"N": range(start, start + 4)}) for start in range(0, 20, 4))
+    result = BatchedResult(batches, max_rows=10, query_id="q")
+    assert result.rows == 0 and result.frame().empty
+    assert len(result.fetch_next().index) == 4
+    assert result.has_more
+    while result.fetch_next() is not None:
+        pass
+    assert result.rows == 10 and not result.has_more
+    assert list(result.frame()["N"]) == list(range(10))
+
+
+def test_run_batched_returns_first_batches():
+    session = LocalSession()
+    session.register(r"FROM T", lambda session, match, params: [{"N": i} for i in range(2500)])
+    session.register(r"FAIL", lambda session, match, params: 1 / 0)
+    result, failed = AsyncQueryRunner().run_batched(
+        session, ["SELECT N FROM T", "SELECT FAIL"], max_rows=2000)
+    assert isinstance(failed, ZeroDivisionError)
+    assert result.rows == 1000 and result.has_more and result.query_id
+
+
+@pytest.mark.parametrize("first, second", [
+    ("select a,b from t where x = 1.50", "SELECT A , B\nFROM T -- note\nWHERE X=1.5;"),
+    ("SELECT 1e3 FROM T", "select 1E+03 from t"),
+    ("SELECT 007", "SELECT 7"),
+])
+def test_equivalent_statements_share_a_key(first, second):
+    assert canonicalize_sql(first) == canonicalize_sql(second)
+
+
+@pytest.mark.parametrize("first, second", [
+    ("SELECT * FROM T WHERE S = 'a'", "SELECT * FROM T WHERE S = 'A'"),
+    ('SELECT "a" FROM T', 'SELECT "A" FROM T'),
+    ("SELECT 'x  y'", "SELECT 'x y'"),
+    ("SELECT 1.5", "SELECT 15"),
+])
+def test_different_statements_do_not(first, second):
+    assert canonicalize_sql(first) != canonicalize_sql(second)
+
+
+def test_single_flight_coalesces_concurrent_requests():
+    flights = SingleFlight(ttl=60)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def execute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "query-id"
+
+    leader = threading.Thread(target=flights.do, args=("SELECT 1", execute))
+    leader.start()
+    started.wait(5)
+    results = []
+    follower = threading.Thread(
+        target=lambda: results.append(flights.do("select  1;", execute, timeout=5)))
+    follower.start()
+    release.set()
+    leader.join()
+    follower.join()
+    assert results == ["query-id"] and calls == [1]
+    # Reused from the completed cache
+    assert flights.do("SELECT 1", execute) == "query-id"
+    assert (flights.requests, flights.executions, flights.saved) == (3, 1, 2)
+
+
+def test_single_flight_does_not_cache_errors():
+    flights = SingleFlight()
+    with pytest.raises(ZeroDivisionError):
+        flights.do("SELECT 1", lambda: 1 / 0)
+    assert flights.do("SELECT 1", lambda: "ok") == "ok"
+    assert flights.executions == 2
+
+
+def test_single_flight_expires_entries():
+    flights = SingleFlight(ttl=0)
+    flights.do("SELECT 1", lambda: "a")
+    assert flights.do("SELECT 1", lambda: "b") == "b"
+
+
+def test_run_batched_rereads_coalesced_statements():
+    session = LocalSession()
+    session.register(r"FROM T", lambda session, match, params: [{"N": i} for i in range(3)])
+    flights = SingleFlight()
+    first, second = AsyncQueryRunner().run_batched(
+        session, ["SELECT N FROM T", "select n from t"], single_flight=flights)
+    assert len(session.queries) == 1
+    assert first.query_id == second.query_id
+    assert list(second.frame()["N"]) == [0, 1, 2]
+    third, = AsyncQueryRunner().run_batched(session, ["SELECT N FROM T"], single_flight=flights)
+    assert third.query_id == first.query_id and len(session.queries) == 1
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from local_session import LocalSession
+from query_guard import (GuardrailError, apply_row_limit, check_read_only, guard_query, mask_sql,
+                         split_statements)
+
+
+def test_mask_sql_keeps_offsets():
+    sql = "SELECT 'a;b' -- drop\nFROM \"T;\" /* x */"
+    masked = mask_sql(sql)
+    assert len(masked) == len(sql)
+    assert ";" not in masked and "drop" not in masked
+    assert masked.startswith("SELECT 'xxx'")
+
+
+def test_split_statements_ignores_literals_and_comments():
+    assert split_statements("SELECT ';' AS S; -- trailing;\n") == ["SELECT ';' AS S"]
+    assert len(split_statements("SELECT 1; SELECT 2")) == 2
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT * FROM T",
+    "with x as (select 1) select * from x",
+    "(SELECT 1)",
+    "SELECT 'DROP TABLE T' AS TEXT",
+    "SELECT \"DELETE\" FROM T /* UPDATE later */",
+])
+def test_read_only_statements_pass(sql):
+    assert check_read_only(sql + ";") == sql
+
+
+@pytest.mark.parametrize("sql, message", [
+    ("SELECT 1; SELECT 2", "exactly one statement"),
+    ("", "exactly one statement"),
+    ("SHOW TABLES", "Only SELECT"),
+    ("DELETE FROM T", "Only SELECT"),
+    ("WITH x AS (DELETE FROM T) SELECT 1", "DELETE"),
+    ("SELECT * FROM T; DROP TABLE T", "exactly one statement"),
+])
+def test_other_statements_are_refused(sql, message):
+    with pytest.raises(GuardrailError, match=message):
+        check_read_only(sql)
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT * FROM T", "SELECT * FROM T\nLIMIT 100"),
+    ("SELECT * FROM T LIMIT 5", "SELECT * FROM T LIMIT 5"),
+    ("SELECT * FROM T LIMIT 5000 OFFSET 10", "SELECT * FROM T LIMIT 100 OFFSET 10"),
+    ("SELECT TOP 500 * FROM T", "SELECT TOP 100 * FROM T"),
+    ("SELECT * FROM (SELECT * FROM T LIMIT 5)", "SELECT * FROM (SELECT * FROM T LIMIT 5)\nLIMIT 100"),
+    ("SELECT * FROM T FETCH FIRST 10 ROWS ONLY",
+     "SELECT * FROM (\nSELECT * FROM T FETCH FIRST 10 ROWS ONLY\n) LIMIT 100"),
+    ("SELECT 'LIMIT 5' AS S;", "SELECT 'LIMIT 5' AS S\nLIMIT 100"),
+])
+def test_apply_row_limit(sql, expected):
+    assert apply_row_limit(sql, 100) == expected
+
+
+def explain_session(bytes_assigned, partitions_assigned=1):
+    session = LocalSession()
+    plan = {"GlobalStats": {"partitionsTotal": 10, "partitionsAssigned": partitions_assigned,
+                            "bytesAssigned": bytes_assigned}}
+    session.register(r"^EXPLAIN USING JSON", lambda session, match, params: [
+        {"content": json.dumps(plan)}])
+    return session
+
+
+def test_guard_query_without_a_budget_skips_explain():
+    session = LocalSession()
+    safe_sql, report = guard_query(session, "SELECT * FROM T", max_rows=10)
+    assert safe_sql == "SELECT * FROM T\nLIMIT 10"
+    assert report == {"estimate": None, "action": "ok"}
+    assert session.queries == []
+
+
+def test_guard_query_refuses_or_downgrades_over_budget():
+    with pytest.raises(GuardrailError, match="over the configured budget"):
+        guard_query(explain_session(10 ** 9), "SELECT * FROM T", max_bytes=10 ** 6)
+
+    safe_sql, report = guard_query(explain_session(10 ** 9), "SELECT * FROM T",
+                                   max_bytes=10 ** 6, policy="downgrade", downgrade_rows=50)
+    assert safe_sql == "SELECT * FROM T\nLIMIT 50"
+    assert report["action"] == "downgraded"
+    assert report["estimate"]["bytes_assigned"] == 10 ** 9
+
+    safe_sql, report = guard_query(explain_session(10), "SELECT * FROM T",
+                                   max_bytes=10 ** 6, max_partitions=5)
+    assert report["action"] == "ok" and report["estimate"]["partitions_assigned"] == 1
@@ -0,0 +1,40 @@
+import datetime
+
+import pandas as pd
+
+from result_digest import digest_result, representative_rows
+
+
+def frame(rows=100):
+    return pd.DataFrame({
+        "DAY": [datetime.date(2024, 1, 1) + datetime.timedelta(days=i) for i in range(rows)],
+        "REGION": ["EAST" if i % 3 else "WEST" for i in range(rows)],
+        "REVENUE": [100.0 + i for i in range(rows)],
+    })
+
+
+def test_digest_describes_columns_instead_of_rows():
+    digest = digest_result(frame(), partial=True)
+    lines = digest.splitlines()
+    assert lines[0] == "Result: 100 rows x 3 columns (first rows only; the full result is larger)"
+    assert "- DAY (time): 2024-01-01 00:00:00 to 2024-04-09 00:00:00" in lines
+    assert "- REVENUE (numeric): min 100, max 199, mean 149.5, first→last 100→199 (+99.0%)" in lines
+    assert "- REGION (2 distinct): EAST (66), WEST (34)" in lines
+    assert len(digest) < len(frame().to_string())
+
+
+def test_digest_respects_the_token_budget():
+    digest = digest_result(frame(), token_budget=40)
+    assert len(digest) <= 40 * 4 + len("\n[digest truncated]")
+    assert digest.endswith("[digest truncated]")
+
+
+def test_representative_rows_keep_first_and_last():
+    rows = representative_rows(frame(), 5)
+    assert list(rows.index) == [0, 24, 49, 74, 99]
+    assert len(representative_rows(frame(3), 5).index) == 3
+
+
+def test_empty_results():
+    assert digest_result(pd.DataFrame()) == "The query returned no columns."
+    assert digest_result(pd.DataFrame({"A": []})).startswith("Result: 0 rows x 1 columns")
@@ -0,0 +1,114 @@
+import re
+
+import pytest
+
+from local_session import LocalSession
+from result_pages import ROW_COLUMN, PagedResult
+
+ROWS = [{"REGION": region, "REV": rev} for region, rev in
+        [("WEST", 3), ("EAST", 1), ("EAST", 2), ("NORTH", 5), ("WEST", 1)]]
+
+
+def result_session(rows=ROWS):
+    """
+    Answers RESULT_SCAN queries over ``rows``, honouring the row numbering,
+    WHERE, ORDER BY, LIMIT and OFFSET. Like Snowflake with VARIANT values,
+    ordering by a column holding dicts fails.
+    """
+    numbered = [dict(row, **{ROW_COLUMN: number}) for number, row in enumerate(rows, 1)]
+
+    def describe(session, match, params):
+        return [{"name": name} for name in rows[0]]
+
+    def number(session, match, params):
+        return numbered
+
+    def scan(session, match, params):
+        query = match.string
+        result = list(numbered)
+        if "ILIKE" in query:
+            column = re.search(r'TO_VARCHAR\("(\w+)"\) ILIKE', query).group(1)
+            text = params[0].strip("%").lower()
+            result = [row for row in result if text in str(row[column]).lower()]
+        if "COUNT(*)" in query:
+            return [{"N": len(result)}]
+        between = re.search(rf"{ROW_COLUMN} > (\d+) AND {ROW_COLUMN} <= (\d+)", query)
+        if between:
+            low, high = map(int, between.groups())
+            result = [row for row in result if low < row[ROW_COLUMN] <= high]
+        order = re.search(r"ORDER BY (.*?)(?: LIMIT|$)", query).group(1)
+        for key in reversed(order.split(", ")):
+            column, _, direction = key.partition(" ")
+            result.sort(key=lambda row: row[column.strip('"')], reverse=direction == "DESC")
+        limit = re.search(r"LIMIT (\d+) OFFSET (\d+)", query)
+        if limit:
+            size, offset = map(int, limit.groups())
+            result = result[offset:offset + size]
+        selected = [name.strip('"') for name in
+                    re.match(r"SELECT (.*?) FROM", query).group(1).split(", ")]
+        return [{name: row[name] for name in selected} for row in result]
+
+    session = LocalSession()
+    session.register(r"DESCRIBE RESULT", describe)
+    session.register(r"ROW_NUMBER\(\) OVER", number)
+    session.register(r"RESULT_SCAN", scan)
+    return session
+
+
+def all_pages(pager, **kwargs):
+    rows = []
+    for page in range(pager.page_count(kwargs.get("filters"))):
+        rows.extend(pager.fetch_page(page, **kwargs).to_dict("records"))
+    return rows
+
+
+def page_queries(session):
+    return [query for query, _ in session.queries
+            if "RESULT_SCAN" in query and "COUNT(*)" not in query]
+
+
+def test_the_result_is_numbered_once_and_read_by_row_range():
+    session = result_session()
+    pager = PagedResult(session, "01b2-c3", page_size=2)
+    assert pager.page_count() == 3
+    assert all_pages(pager) == ROWS
+    numbering, *pages = page_queries(session)
+    assert "RESULT_SCAN('01b2-c3')" in numbering
+    assert all(f"RESULT_SCAN('{pager.numbered_query_id()}')" in query for query in pages)
+    assert all("LIMIT" not in query and ROW_COLUMN not in query.split(" FROM ")[0]
+               for query in pages)
+
+
+def test_sort_column_comes_first_with_the_row_number_as_tie_breaker():
+    session = result_session()
+    pager = PagedResult(session, "01b2-c3", page_size=2)
+    rows = all_pages(pager, order_by="REV", descending=True)
+    assert [row["REV"] for row in rows] == [5, 3, 2, 1, 1]
+    assert rows[-2:] == [{"REGION": "EAST", "REV": 1}, {"REGION": "WEST", "REV": 1}]
+    assert all(f'ORDER BY "REV" DESC, {ROW_COLUMN} LIMIT' in query
+               for query in page_queries(session)[1:])
+
+
+def test_variant_columns_are_never_sort_keys():
+    rows = [{"ID": i % 2, "PAYLOAD": {"n": i}} for i in range(5)]
+    session = result_session(rows)
+    pager = PagedResult(session, "01b2-c3", page_size=2)
+    assert all_pages(pager) == rows
+    assert all_pages(pager, order_by="ID") == [rows[i] for i in (0, 2, 4, 1, 3)]
+    assert all_pages(pager, filters={"PAYLOAD": "n"}) == rows
+    assert not any("PAYLOAD" in query.split("ORDER BY")[-1] for query in page_queries(session))
+
+
+def test_filters_are_bound_and_counted():
+    session = result_session()
+    pager = PagedResult(session, "01b2-c3", page_size=2)
+    assert pager.count({"REGION": "east"}) == 2
+    assert pager.count({"REGION": "east"}) == 2
+    assert sum("COUNT(*)" in query for query, _ in session.queries) == 1
+    assert all_pages(pager, filters={"REGION": "east"}) == [
+        {"REGION": "EAST", "REV": 1}, {"REGION": "EAST", "REV": 2}]
+
+
+def test_query_id_is_validated():
+    with pytest.raises(ValueError):
+        PagedResult(LocalSession(), "x'); DROP TABLE T; --")
@@ -0,0 +1,192 @@
+import re
+
+import pytest
+
+from local_session import LocalSession
+from schema_metadata import (JOIN_KEY_PATTERN, MetadataCache, SchemaIndex, build_schema_model,
+                             cached_samples, fetch_schema_columns, format_data_type, profile_table,
+                             render_table_ddl)
+
+SCHEMA = {
+    "ORDERS": [("ORDER_ID", "NUMBER"), ("CUSTOMER_ID", "NUMBER"), ("AMOUNT_PAID", "NUMBER"),
+               ("ORDER_DATE", "DATE")],
+    "CUSTOMERS": [("CUSTOMER_ID", "NUMBER"), ("NAME", "TEXT"), ("SEGMENT", "TEXT")],
+    "SHIPMENTS": [("SHIPMENT_ID", "NUMBER"), ("CARRIER", "TEXT"), ("TOTAL_VOID", "NUMBER")],
+}
+
+
+def column_rows(schema, last_altered="2024-01-01"):
+    return [{
+        "TABLE_NAME": table_name, "TABLE_TYPE": "BASE TABLE", "ROW_COUNT": 100,
+        "LAST_ALTERED": last_altered, "TABLE_COMMENT": None, "COLUMN_NAME": column_name,
+        "DATA_TYPE": data_type, "CHARACTER_MAXIMUM_LENGTH": None, "NUMERIC_PRECISION": None,
+        "NUMERIC_SCALE": None, "IS_NULLABLE": "YES", "COLUMN_COMMENT": None,
+    } for table_name, columns in schema.items() for column_name, data_type in columns]
+
+
+def schema_session(schema=SCHEMA):
+    session = LocalSession()
+    session.register(r"INFORMATION_SCHEMA\.COLUMNS",
+                     lambda session, match, params: column_rows(schema))
+    return session
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("ID", True), ("CUSTOMER_ID", True), ("REGION_KEY", True), ("COUNTRY_CODE", True),
+    ("AMOUNT_PAID", False), ("TOTAL_VOID", False), ("VALID", False),
+])
+def test_join_key_pattern(name, expected):
+    assert bool(JOIN_KEY_PATTERN.search(name)) is expected
+
+
+def type_row(data_type, length=None, precision=None, scale=None):
+    return {"DATA_TYPE": data_type, "CHARACTER_MAXIMUM_LENGTH": length,
+            "NUMERIC_PRECISION": precision, "NUMERIC_SCALE": scale}
+
+
+@pytest.mark.parametrize("row, expected", [
+    (type_row("TEXT", length=16777216), "VARCHAR(16777216)"),
+    (type_row("TEXT"), "TEXT"),
+    (type_row("NUMBER", precision=38, scale=0), "NUMBER(38,0)"),
+    (type_row("NUMBER", precision=12, scale=2), "NUMBER(12,2)"),
+    (type_row("NUMBER", precision=10), "NUMBER(10,0)"),
+    (type_row("NUMBER"), "NUMBER"),
+    (type_row("TIMESTAMP_NTZ"), "TIMESTAMP_NTZ"),
+])
+def test_format_data_type(row, expected):
+    assert format_data_type(row) == expected
+
+
+def test_render_table_ddl():
+    rows = column_rows({"TABLE_STATS": [("STATS_TABLE", "TEXT"), ("AMOUNT", "NUMBER")]})
+    rows[0].update(CHARACTER_MAXIMUM_LENGTH=20, IS_NULLABLE="NO", COLUMN_COMMENT="Source table")
+    rows[1].update(NUMERIC_PRECISION=12, NUMERIC_SCALE=2)
+    model = build_schema_model(rows)
+    assert list(model) == ["TABLE_STATS"]
+    assert render_table_ddl("TABLE_STATS", model["TABLE_STATS"]) == (
+        "create or replace TABLE TABLE_STATS (\n"
+        "\tSTATS_TABLE VARCHAR(20) NOT NULL COMMENT 'Source table',\n"
+        "\tAMOUNT NUMBER(12,2)\n"
+        ");")
+
+    view = dict(model["TABLE_STATS"], table_type="VIEW", comment="Owner's stats")
+    assert render_table_ddl("V_TABLE", view).splitlines()[::3] == [
+        "create or replace VIEW V_TABLE (", ") COMMENT='Owner''s stats';"]
+
+
+def test_link_selects_relevant_tables_and_join_keys():
+    model = build_schema_model(column_rows(SCHEMA))
+    index = SchemaIndex.from_model("DB", "SC", model)
+    linked = index.link("total amount paid per customer segment")
+    assert set(linked["tables"][:2]) == {"ORDERS", "CUSTOMERS"}
+    assert "CUSTOMER_ID" in linked["context"]
+    assert not linked["truncated"]
+
+
+def test_link_uses_sample_values():
+    model = build_schema_model(column_rows(SCHEMA))
+    samples = {("SHIPMENTS", "CARRIER"): ["FedEx", "Maersk"]}
+    index = SchemaIndex.from_model("DB", "SC", model, samples=samples)
+    linked = index.link("how many maersk deliveries")
+    assert linked["tables"][0] == "SHIPMENTS"
+    assert "(e.g. FedEx, Maersk)" in linked["context"]
+    # Only join keys are added besides the matched columns
+    assert "TOTAL_VOID" not in linked["context"]
+
+
+def test_link_caps_the_context():
+    model = build_schema_model(column_rows(SCHEMA))
+    linked = SchemaIndex.from_model("DB", "SC", model).link("customer", max_chars=60)
+    assert linked["truncated"]
+    assert linked["chars"] <= 60
+
+
+def test_cached_samples_feed_the_index():
+    session = schema_session()
+    session.register(r"ARRAY_AGG", lambda session, match, params: [
+        {**{f"NDV_{i}": 2 for i in range(4)},
+         **{f"VALUES_{i}": '["a", "b"]' for i in range(4)}}])
+    entry = MetadataCache().refresh(session, "DB", "SC")
+    samples = cached_samples(entry)
+    assert samples[("CUSTOMERS", "SEGMENT")] == ["a", "b"]
+    assert len(samples) == sum(len(columns) for columns in SCHEMA.values())
+    model = build_schema_model(fetch_schema_columns("DB", "SC", session))
+    index = SchemaIndex.from_model("DB", "SC", model, samples=samples)
+    assert index.tables["CUSTOMERS"]["columns"][2]["samples"] == ["a", "b"]
+
+
+def profiling_session(schema=SCHEMA):
+    session = schema_session(schema)
+
+    def profile(session, match, params):
+        count = len(re.findall(r"AS NDV_", match.string))
+        return [{**{f"NDV_{i}": 10 + i for i in range(count)},
+                 **{f"VALUES_{i}": f'["v{i}"]' for i in range(count)}}]
+
+    session.register(r"ARRAY_AGG", profile)
+    return session
+
+
+def profiled(session):
+    return [query.split("SAMPLE")[0].rsplit("FROM", 1)[-1].strip()
+            for query, _ in session.queries if "ARRAY_AGG" in query]
+
+
+def test_profile_table_is_one_query():
+    session = profiling_session()
+    columns = profile_table("DB", "SC", "ORDERS", ["ORDER_ID", "AMOUNT_PAID"], session,
+                            sample_rows=500, stats_sample_rows=2000)
+    assert columns == [
+        {"column_name": "ORDER_ID", "unique_count": 10, "random_values": ["v0"]},
+        {"column_name": "AMOUNT_PAID", "unique_count": 11, "random_values": ["v1"]},
+    ]
+    query, = [query for query, _ in session.queries]
+    assert "APPROX_COUNT_DISTINCT" in query and "SAMPLE (2000 ROWS)" in query
+    assert "SAMPLE (500 ROWS)" in query and "RANDOM()" not in query
+    assert profile_table("DB", "SC", "ORDERS", [], session) == []
+
+
+def test_metadata_cache_reprofiles_only_changed_tables():
+    schema = {name: list(columns) for name, columns in SCHEMA.items()}
+    session = profiling_session(schema)
+    cache = MetadataCache()
+    entry = cache.refresh(session, "DB", "SC", stage="STAGE")
+    assert list(entry["tables"]) == ["ORDERS", "CUSTOMERS", "SHIPMENTS"]
+    assert len(profiled(session)) == 3
+    assert "STAGE/metadata_cache_DB_SC.json" in session.file.files
+
+    session.queries.clear()
+    schema["CUSTOMERS"].append(("EMAIL", "TEXT"))
+    del schema["SHIPMENTS"]
+    text = cache.metadata_string(session, "DB", "SC", stage="STAGE")
+    assert profiled(session) == ['DB.SC."CUSTOMERS"']
+    assert "EMAIL" in text and "SHIPMENTS" not in text
+    # The entry returned earlier is left as it was
+    assert list(entry["tables"]) == ["ORDERS", "CUSTOMERS", "SHIPMENTS"]
+    assert "EMAIL" not in entry["tables"]["CUSTOMERS"]["ddl"]
+
+    # A new process starts from the copy persisted on the stage
+    session.queries.clear()
+    cache = MetadataCache()
+    assert cache.metadata_string(session, "DB", "SC", stage="STAGE") == text
+    assert profiled(session) == []
+
+
+def test_metadata_cache_reprofiles_everything_when_settings_change():
+    session = profiling_session()
+    cache = MetadataCache()
+    cache.refresh(session, "DB", "SC")
+    cache.refresh(session, "DB", "SC", exact=True)
+    assert len(profiled(session)) == 6
+
+
+def test_warm_logs_failures(caplog):
+    session = LocalSession()
+    session.register(r"INFORMATION_SCHEMA\.COLUMNS", lambda session, match, params: 1 / 0)
+    cache = MetadataCache()
+    cache.warm(session, "DB", "SC").join(5)
+    assert "Warming the metadata cache of DB.SC failed" in caplog.text
+    # Nothing was cached, so the next call tries again
+    retry = cache.warm(session, "DB", "SC")
+    assert retry is not None
+    retry.join(5)
@@ -0,0 +1,226 @@
+import io
+import json
+
+import pytest
+import yaml
+
+from local_session import LocalSession
+from schema_metadata import build_schema_model, fetch_schema_columns
+from semantic_model import (YAML_DUMPER, ModelSerializer, build_table_entries, classify_column,
+                            fingerprint_file, is_integer_type, load_model_state, match_tables,
+                            save_model_state, update_semantic_model)
+
+COLUMNS = [("ORDER_ID", "NUMBER", 38, 0), ("REGION", "TEXT", None, None),
+           ("REVENUE", "NUMBER", 12, 2), ("ORDER_DATE", "DATE", None, None)]
+
+
+def schema_session(tables=("ORDERS", "RETURNS"), last_altered=None):
+    """LocalSession answering the INFORMATION_SCHEMA and profiling queries of ``tables``."""
+    last_altered = last_altered or {}
+
+    def columns(session, match, params):
+        return [{
+            "TABLE_NAME": table_name, "TABLE_TYPE": "BASE TABLE", "ROW_COUNT": 1000,
+            "LAST_ALTERED": last_altered.get(table_name, "2024-01-01"), "TABLE_COMMENT": None,
+            "COLUMN_NAME": name, "DATA_TYPE": data_type, "CHARACTER_MAXIMUM_LENGTH": None,
+            "NUMERIC_PRECISION": precision, "NUMERIC_SCALE": scale, "IS_NULLABLE": "YES",
+            "COLUMN_COMMENT": None,
+        } for table_name in tables for name, data_type, precision, scale in COLUMNS]
+
+    def profile_query(session, match, params):
+        # Every column is all-distinct in the sample
+        row = {"N": 1000}
+        for i in range(len(COLUMNS)):
+            row[f"NDV_{i}"] = 1000
+            row[f"NN_{i}"] = 1000
+            row[f"TOP_{i}"] = json.dumps([[f"v{i}", 1]])
+        return [row]
+
+    session = LocalSession()
+    session.register(r"INFORMATION_SCHEMA\.COLUMNS", columns)
+    session.register(r"APPROX_TOP_K", profile_query)
+    return session
+
+
+def io_bytes(text):
+    return io.BytesIO(text.encode("utf-8"))
+
+
+def profiled_tables(session):
+    return [query.split("SAMPLE")[0].rsplit(".", 1)[-1].strip().strip('"')
+            for query, _ in session.queries if "APPROX_TOP_K" in query]
+
+
+def profile(rows=10000, distinct=9995, nulls=0):
+    return {"rows": rows, "nulls": nulls, "distinct": distinct,
+            "unique": nulls == 0 and distinct >= 0.99 * rows, "top_values": []}
+
+
+@pytest.mark.parametrize("data_type, expected", [
+    ("NUMBER(38,0)", True), ("NUMBER", True), ("INTEGER", True), ("BIGINT", True),
+    ("NUMBER(12,2)", False), ("FLOAT", False), ("DOUBLE", False),
+])
+def test_is_integer_type(data_type, expected):
+    assert is_integer_type(data_type) is expected
+
+
+@pytest.mark.parametrize("data_type, name, column_profile, expected", [
+    # Continuous amounts are all distinct in a sample but stay measures
+    ("NUMBER(12,2)", "REVENUE", profile(), "measures"),
+    ("FLOAT", "COGS", profile(), "measures"),
+    # Unique integers are identifiers
+    ("NUMBER(38,0)", "ORDER_NUMBER", profile(), "dimensions"),
+    # Join keys by name, integer only
+    ("NUMBER(38,0)", "CUSTOMER_ID", profile(distinct=500), "dimensions"),
+    ("NUMBER(38,0)", "ID", profile(distinct=500), "dimensions"),
+    ("NUMBER(12,2)", "REGION_KEY", profile(distinct=500), "measures"),
+    # Names merely ending in ID are not keys
+    ("NUMBER(12,2)", "AMOUNT_PAID", profile(distinct=500), "measures"),
+    ("NUMBER(38,0)", "TOTAL_VOID", profile(distinct=500), "measures"),
+    # Low-cardinality codes
+    ("NUMBER(38,0)", "STATUS", profile(distinct=4), "dimensions"),
+    ("NUMBER(38,0)", "QUANTITY", profile(distinct=300), "measures"),
+    # Without a profile numeric columns are measures
+    ("NUMBER(38,0)", "CUSTOMER_ID", None, "measures"),
+    ("DATE", "DAY", None, "time_dimensions"),
+    ("TIMESTAMP_NTZ", "TS", profile(), "time_dimensions"),
+    ("TEXT", "REGION", None, "dimensions"),
+    ("VARIANT", "PAYLOAD", None, None),
+])
+def test_classify_column(data_type, name, column_profile, expected):
+    assert classify_column(data_type, name, column_profile) == expected
+
+
+def test_update_builds_every_table():
+    session = schema_session()
+    model, state, changed, removed = update_semantic_model(session, "DB", "SC", model_name="M")
+    assert [table["name"] for table in model["tables"]] == ["ORDERS", "RETURNS"]
+    assert changed == ["ORDERS", "RETURNS"] and removed == []
+    orders = model["tables"][0]
+    assert [m["name"] for m in orders["measures"]] == ["REVENUE"]
+    assert {d["name"] for d in orders["dimensions"]} == {"ORDER_ID", "REGION"}
+    assert state["columns"]["ORDERS"] == [name for name, _, _, _ in COLUMNS]
+
+
+def test_update_rebuilds_only_changed_tables_and_keeps_edits():
+    model, state, _, _ = update_semantic_model(schema_session(), "DB", "SC")
+    model["tables"][0]["description"] = "Customer orders"
+    model["tables"][0]["dimensions"][0]["synonyms"] = ["order number"]
+
+    session = schema_session(tables=("ORDERS", "SHIPMENTS"), last_altered={"ORDERS": "2024-02-01"})
+    model, state, changed, removed = update_semantic_model(session, "DB", "SC", model, state)
+    assert changed == ["ORDERS", "SHIPMENTS"] and removed == ["RETURNS"]
+    assert profiled_tables(session) == ["ORDERS", "SHIPMENTS"]
+    assert model["tables"][0]["description"] == "Customer orders"
+    assert model["tables"][0]["dimensions"][0]["synonyms"] == ["order number"]
+
+    session = schema_session(tables=("ORDERS", "SHIPMENTS"), last_altered={"ORDERS": "2024-02-01"})
+    _, _, changed, removed = update_semantic_model(session, "DB", "SC", model, state)
+    assert changed == [] and removed == [] and profiled_tables(session) == []
+
+
+def test_state_round_trip():
+    session = schema_session()
+    model, state, _, _ = update_semantic_model(session, "DB", "SC")
+    session.file.put_stream(io_bytes(yaml.dump(model)), "@STAGE/model.yaml")
+    save_model_state(session, "STAGE", "model.yaml", state)
+    assert "STAGE/model.fingerprints.json" in session.file.files
+    assert load_model_state(session, "STAGE", "model.yaml") == (model, state)
+    assert load_model_state(session, "STAGE", "missing.yaml") == (None, None)
+
+
+def test_edits_survive_a_missing_sidecar():
+    session = schema_session()
+    model, _, _, _ = update_semantic_model(session, "DB", "SC")
+    model["tables"][1]["dimensions"][1]["description"] = "Sales region"
+    session.file.put_stream(io_bytes(yaml.dump(model, sort_keys=False)), "@STAGE/model.yaml")
+    assert fingerprint_file("model.yaml") not in session.file.files
+
+    loaded, state = load_model_state(session, "STAGE", "model.yaml")
+    assert loaded == model and state is None
+    model, _, changed, _ = update_semantic_model(session, "DB", "SC", loaded, state)
+    assert changed == ["ORDERS", "RETURNS"]
+    assert model["tables"][1]["dimensions"][1]["description"] == "Sales region"
+
+
+def built_model():
+    return {"name": "M",
+            "tables": build_table_entries(schema_session(), "DB", "SC", ["ORDERS", "RETURNS"])}
+
+
+def full_dump(model):
+    return (yaml.dump(model, Dumper=YAML_DUMPER, sort_keys=False, indent=2),
+            json.dumps(model, indent=2))
+
+
+def test_serializer_matches_a_full_dump():
+    model = built_model()
+    model["tables"][0]["description"] = "Quotes ' and \"unicode\" \u00e9 and a long line " * 5
+    serializer = ModelSerializer.from_model(model)
+    assert (serializer.yaml(), serializer.json()) == full_dump(model)
+    assert yaml.safe_load(serializer.yaml()) == model
+    assert serializer.model() == model
+
+
+def test_serializer_set_and_remove_tables():
+    model = built_model()
+    serializer = ModelSerializer.from_model(model)
+    orders = dict(model["tables"][0], description="Orders")
+    serializer.set_table(orders)
+    serializer.remove_table("RETURNS")
+    expected = {"name": "M", "tables": [orders]}
+    assert (serializer.yaml(), serializer.json()) == full_dump(expected)
+
+    empty = ModelSerializer({"name": "M"})
+    assert (empty.yaml(), empty.json()) == full_dump({"name": "M", "tables": []})
+
+
+def test_serializer_update_renders_only_changed_tables(monkeypatch):
+    model, state, _, _ = update_semantic_model(schema_session(), "DB", "SC", model_name="M")
+    serializer = ModelSerializer.from_model(model)
+    session = schema_session(tables=("AUDIT", "ORDERS", "RETURNS"),
+                             last_altered={"RETURNS": "2024-03-01"})
+    updated, _, changed, removed = update_semantic_model(session, "DB", "SC", model, state)
+    assert changed == ["AUDIT", "RETURNS"]
+
+    rendered = []
+    set_table = ModelSerializer.set_table
+    monkeypatch.setattr(ModelSerializer, "set_table",
+                        lambda self, entry: rendered.append(entry["name"]) or set_table(self, entry))
+    serializer.update(updated, changed, removed)
+    assert sorted(rendered) == ["AUDIT", "RETURNS"]
+    assert list(serializer.tables) == ["AUDIT", "ORDERS", "RETURNS"]
+    assert (serializer.yaml(), serializer.json()) == full_dump(updated)
+
+    rendered.clear()
+    fewer = dict(updated, tables=updated["tables"][1:])
+    serializer.update(fewer, removed=["AUDIT"])
+    assert rendered == []
+    assert (serializer.yaml(), serializer.json()) == full_dump(fewer)
+
+
+def test_match_tables():
+    names = ["SALES_2023", "sales_daily", "RETURNS", "FACT_SALES"]
+    assert match_tables(names, "sales_*") == ["SALES_2023", "sales_daily"]
+    assert match_tables(names, " RETURNS , *_SALES ,") == ["RETURNS", "FACT_SALES"]
+    assert match_tables(names, "") == []
+
+
+def test_bulk_entries_come_from_one_query():
+    session = schema_session(tables=[f"T{i:03d}" for i in range(300)])
+    entries = build_table_entries(session, "DB", "SC", ["T299", "MISSING", "T000"])
+    assert [entry["name"] for entry in entries] == ["T299", "T000"]
+    assert len(session.queries) == 1
+    entry = entries[0]
+    assert entry["base_table"] == {"database": "DB", "schema": "SC", "table": "T299"}
+    assert [d["name"] for d in entry["dimensions"]] == ["REGION"]
+    assert [m["name"] for m in entry["measures"]] == ["ORDER_ID", "REVENUE"]
+    assert [t["name"] for t in entry["time_dimensions"]] == ["ORDER_DATE"]
+
+
+def test_bulk_entries_can_reuse_a_schema_model():
+    session = schema_session()
+    schema_model = build_schema_model(fetch_schema_columns("DB", "SC", session))
+    session.queries.clear()
+    entries = build_table_entries(session, "DB", "SC", ["RETURNS"], schema_model)
+    assert [entry["name"] for entry in entries] == ["RETURNS"] and session.queries == []
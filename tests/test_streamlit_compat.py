@@ -0,0 +1,23 @@
+from types import SimpleNamespace
+
+from streamlit_compat import resolve_fragment
+
+
+def decorator(func):
+    return func
+
+
+def test_fragment_is_preferred():
+    streamlit = SimpleNamespace(fragment=decorator, experimental_fragment=print)
+    assert resolve_fragment(streamlit) is decorator
+
+
+def test_experimental_fragment_before_streamlit_1_37():
+    assert resolve_fragment(SimpleNamespace(experimental_fragment=decorator)) is decorator
+    streamlit = SimpleNamespace(fragment=None, experimental_fragment=decorator)
+    assert resolve_fragment(streamlit) is decorator
+
+
+def test_plain_functions_without_fragments():
+    fragment = resolve_fragment(SimpleNamespace())
+    assert fragment(len) is len
@@ -2,20 +2,149 @@ import streamlit as st
 from snowflake.snowpark.context import get_active_session
 import _snowflake
 import json
-import yaml
-import io
-import re
+import os
 import pandas as pd
-from io import StringIO, BytesIO
-from fpdf import FPDF
+from io import StringIO
+from artifact_publisher import publish_artifacts
+from chart_data import prepare_chart_data
+from gpt_sql import (batch_gpt4_sql, batch_summarize, gpt4_sql_packed, gpt4_sql_by_id,
+                     gpt4_sql_single, metadata_hash, register_metadata)
+from model_validator import columns_by_table, format_issues, validate_model
+from pdf_report import ReportWriter
+from query_exec import AsyncQueryRunner, BatchedResult, SingleFlight
+from query_guard import GuardrailError, guard_query
+from result_digest import digest_result
+from result_pages import PagedResult
+from schema_metadata import (MetadataCache, SchemaIndex, build_schema_model, cached_samples,
+                             fetch_schema_columns)
+from semantic_model import (ModelSerializer, load_model_state, save_model_state,
+                            update_semantic_model)
+from streamlit_compat import resolve_fragment
 
 st.set_page_config(layout="wide")
 
+# Partial reruns: st.fragment (st.experimental_fragment before Streamlit 1.37);
+# on older versions the functions simply run as part of the full script
+fragment = resolve_fragment(st)
+
+
+def get_query_runner() -> AsyncQueryRunner:
+    """Returns the async query runner of the current user session."""
+    if "query_runner" not in st.session_state:
+        st.session_state.query_runner = AsyncQueryRunner()
+    return st.session_state.query_runner
+
+
+@st.cache_resource
+def get_single_flight() -> SingleFlight:
+    """Coalesces identical SQL across every user session of the app."""
+    return SingleFlight(ttl=60)
+
+
+def run_statements(session, statements: list, owner: str) -> list:
+    """
+    Runs statements concurrently with a progress bar and the configured
+    timeout. Each result is a ``BatchedResult`` holding its first batch.
+    """
+    progress = st.progress(0.0, text="Running SQL...")
+
+    def on_progress(done, total, elapsed):
+        progress.progress(
+            done / total, text=f"Running SQL... {done}/{total} done ({elapsed:.0f}s)")
+
+    try:
+        return get_query_runner().run_batched(
+            session, statements,
+            timeout=st.session_state.get('query_timeout', 120),
+            on_progress=on_progress,
+            max_rows=st.session_state.get('result_max_rows', 100000),
+            owner=owner, single_flight=get_single_flight())
+    finally:
+        progress.empty()
+
+
+def render_batched_result(result: BatchedResult, key: str = None) -> None:
+    """Shows the rows fetched so far, with a button to fetch the next batch."""
+    table = st.container()
+    if key is not None and result.has_more:
+        if st.button("Load more rows", key=f"load_more_{key}"):
+            result.fetch_next()
+    with table:
+        st.dataframe(result.frame())
+        st.caption(f"{result.rows:,} rows loaded"
+                   + (" (more available)" if result.has_more else ""))
+
+
+def render_paged_result(session, query_id: str, key: str) -> None:
+    """Pages through a large result with RESULT_SCAN, one page in memory at a time."""
+    pagers = st.session_state.setdefault('result_pagers', {})
+    if query_id not in pagers:
+        pagers[query_id] = PagedResult(
+            session, query_id, page_size=st.session_state.get('result_page_size', 100))
+    pager = pagers[query_id]
+
+    columns = pager.columns()
+    sort_col, order_col, filter_col, text_col = st.columns(4)
+    order_by = sort_col.selectbox(
+        "Sort by", [None] + columns, key=f"sort_{key}")
+    descending = order_col.checkbox("Descending", key=f"desc_{key}")
+    filter_column = filter_col.selectbox(
+        "Filter column", [None] + columns, key=f"filter_col_{key}")
+    filter_text = text_col.text_input("Contains", key=f"filter_text_{key}")
+    filters = {filter_column: filter_text} if filter_column and filter_text else None
+
+    page_count = pager.page_count(filters)
+    page = st.number_input(
+        f"Page (of {page_count:,})", min_value=1, max_value=page_count,
+        value=1, key=f"page_{key}")
+    st.dataframe(pager.fetch_page(
+        page - 1, order_by=order_by, descending=descending, filters=filters))
+    st.caption(f"{pager.count(filters):,} rows")
+
+
+def render_result(session, result: BatchedResult, key: str) -> None:
+    """Small results are shown in full; larger ones are paged server-side."""
+    if result.has_more and result.query_id:
+        render_paged_result(session, result.query_id, key)
+    else:
+        render_batched_result(result, key)
+
+
+def result_digest_text(result) -> str:
+    """Compact digest of a query result to send for summarization."""
+    if isinstance(result, BatchedResult):
+        return digest_result(
+            result.frame(),
+            token_budget=st.session_state.get('digest_token_budget', 1500),
+            partial=result.has_more)
+    return str(result)
+
+
+def result_to_string(result) -> str:
+    """Text form of a query result, or of the error returned instead."""
+    if isinstance(result, BatchedResult):
+        return result.frame().to_string(index=False)
+    return str(result)
+
 
 def display_content(content: list, message_index: int = None) -> None:
     """Displays a content item for a message."""
     message_index = message_index or len(st.session_state.messages)
-    for item in content:
+
+    # Results are kept per message so reruns and "Load more" reuse them;
+    # statements not run yet start together so they run concurrently
+    if "sql_results" not in st.session_state:
+        st.session_state.sql_results = {}
+    results = st.session_state.sql_results
+    statements = [item["statement"] for item in content
+                  if item["type"] == "sql" and (message_index, item["statement"]) not in results]
+    session = get_active_session()
+    if statements:
+        for statement, result in zip(statements, run_statements(
+                session, statements, owner="analyst")):
+            results[(message_index, statement)] = result
+
+    for item_index, item in enumerate(content):
         if item["type"] == "text":
             st.markdown(item["text"])
         elif item["type"] == "suggestions":
@@ -27,27 +156,40 @@ def display_content(content: list, message_index: int = None) -> None:
             with st.expander("SQL Query", expanded=False):
                 st.code(item["statement"], language="sql")
             with st.expander("Results", expanded=True):
-                with st.spinner("Running SQL..."):
-                    session = get_active_session()
-                    df = session.sql(item["statement"]).to_pandas()
-                    if len(df.index) > 1:
-                        data_tab, line_tab, bar_tab = st.tabs(
-                            ["Data", "Line Chart", "Bar Chart"]
-                        )
-                        data_tab.dataframe(df)
-                        if len(df.columns) > 1:
-                            df = df.set_index(df.columns[0])
-                        with line_tab:
-                            st.line_chart(df)
-                        with bar_tab:
-                            st.bar_chart(df)
-                    else:
-                        st.dataframe(df)
+                result = results[(message_index, item["statement"])]
+                if isinstance(result, Exception):
+                    st.error(str(result))
+                elif result.rows > 1:
+                    data_tab, line_tab, bar_tab = st.tabs(
+                        ["Data", "Line Chart", "Bar Chart"]
+                    )
+                    with data_tab:
+                        render_result(
+                            session, result, key=f"{message_index}_{item_index}")
+                    # Bucketed to the chart resolution, computed once per result
+                    charts = st.session_state.setdefault('chart_data', {})
+                    chart_key = (message_index, item["statement"])
+                    if chart_key not in charts:
+                        charts[chart_key] = prepare_chart_data(
+                            session, result,
+                            max_points=st.session_state.get('chart_max_points', 1000))
+                    df = charts[chart_key]
+                    with line_tab:
+                        st.line_chart(df)
+                    with bar_tab:
+                        st.bar_chart(df)
+                else:
+                    st.dataframe(result.frame())
 
 
 def new_page_function():
     st.title("Compare Models: CA vs GPT-4o")
+    compare_models()
 
+
+@fragment
+def compare_models():
+    """Question box and both answer panes; a new question reruns only this fragment."""
     # Step 1: Create two columns for Cortex Analyst and GPT-4 Query Interface
     col1, col2 = st.columns(2)
 
@@ -87,156 +229,177 @@ def report_page_function():
     st.write("Questions from your dataset:")
     st.dataframe(first_column)
 
-    # List to store results for PDF generation
-    results = []
+    # Batch mode sends all questions to the UDF in one set-based call,
+    # packed mode shares one copy of the schema metadata across questions
+    generation_mode = st.radio(
+        "SQL generation mode",
+        ["Batch (one UDF call for all questions)",
+         "Packed (several questions per prompt)",
+         "One call per question"])
+    token_budget = st.number_input(
+        "Prompt token budget (packed mode)", min_value=1000, value=32000, step=1000)
 
     # Button to start processing questions
     if st.button("Submit and Process Questions"):
-        for question in first_column:
-            st.write(f"Processing question: {question}")
-            query_result, query_result_str = gpt4_query_for_3rd_page(question)
-            # Capture the query result as string
-            summarized_result = summarize_gpt(query_result_str)
-            results.append((question, summarized_result))
-
-        # Generate PDF report
-        pdf = FPDF()
-        pdf.add_page()
-
-        # Set up fonts and styles
-        pdf.set_font("Arial", "B", 16)  # Bold font for title
-        pdf.cell(200, 10, "GPT-4 Query Report", ln=True, align='C')
-
-        pdf.set_font("Arial", "B", 12)  # Bold font for section headers
-
-        for question, summarized_result in results:
-            pdf.ln(5)  # Reduced gap between entries
-
-            # Question section
-            pdf.cell(0, 10, "Question:", ln=True)
-            pdf.set_font("Arial", "B", 12)  # Regular font for question text
-            pdf.multi_cell(0, 10, question)
-
-            # Answer section
-            pdf.set_font("Arial", "B", 12)
-            pdf.cell(0, 10, "Answer:", ln=True)
-            pdf.set_font("Arial", "B", 12)
-
-            # Render the summarized result, including markdown headings
-            render_markdown_in_pdf(pdf, summarized_result)
-
-        # Save PDF to a string
-        pdf_output = pdf.output(dest='S').encode('latin1')
-
-        # Convert the string to a BytesIO object
-        pdf_buffer = BytesIO(pdf_output)
-
-        # Button to download PDF
-        st.download_button(
-            label="Download PDF Report",
-            data=pdf_buffer,
-            file_name="GPT4_Query_Report.pdf",
-            mime="application/pdf"
-        )
+        # Each section is rendered into the report as soon as it is ready
+        report = ReportWriter("GPT-4 Query Report")
+
+        if generation_mode.startswith("Batch"):
+            process_questions_batch(session, list(first_column), report)
+        elif generation_mode.startswith("Packed"):
+            process_questions_batch(
+                session, list(first_column), report, packed=True, token_budget=token_budget)
+        else:
+            for question in first_column:
+                st.write(f"Processing question: {question}")
+                query_result, query_result_str = gpt4_query_for_3rd_page(
+                    question)
+                # Summarize a compact digest rather than every row
+                summarized_result = summarize_gpt(
+                    result_digest_text(query_result))
+                report.add_section(question, summarized_result)
+
+        # Write the PDF to a temporary file and serve it from there
+        report_path = report.close()
+        with open(report_path, 'rb') as report_file:
+            st.download_button(
+                label="Download PDF Report",
+                data=report_file,
+                file_name="GPT4_Query_Report.pdf",
+                mime="application/pdf"
+            )
+        os.remove(report_path)
 
 
-def render_markdown_in_pdf(pdf, text):
+def process_questions_batch(session, questions, report, packed=False, token_budget=32000):
     """
-    Render basic Markdown in the PDF.
-    Supports:
-      - ### Heading (large)
-      - #### Heading (smaller)
-      - **bold**
-      - *italic*
-      - Line breaks
+    Generates, runs and summarizes all questions with batched UDF calls.
+    Each question's section is added to ``report`` as its summary is mapped back.
+    A failed UDF call is reported in the section of each question it affects,
+    and the other questions are still answered.
     """
-    bold_pattern = r'\*\*(.*?)\*\*'
-    italic_pattern = r'\*(.*?)\*'
-    heading_3_pattern = r'### (.*?)\n'
-    heading_4_pattern = r'#### (.*?)\n'
-
-    tokens = re.split(
-        f"({bold_pattern}|{italic_pattern}|{heading_3_pattern}|{heading_4_pattern}|\n)", text)
+    if "json_data_str" not in st.session_state:
+        temp = generate_metadata_string(session)
+        st.session_state.json_data_str = temp
+    json_data_str = st.session_state.json_data_str
 
-    for token in tokens:
-        if token is None:
+    with st.spinner("Generating SQL for all questions..."):
+        if packed:
+            statements, fallbacks = gpt4_sql_packed(
+                session, questions, json_data_str, token_budget=token_budget)
+            if fallbacks:
+                st.info(
+                    f"{fallbacks} question(s) fell back to single-question calls.")
+        else:
+            try:
+                statements = batch_gpt4_sql(session, questions, json_data_str)
+            except Exception as e:
+                st.warning(f"Batch SQL generation failed, generating per question: {e}")
+                statements = [None] * len(questions)
+            for index, statement in enumerate(statements):
+                if statement is None:
+                    try:
+                        statements[index] = gpt4_sql_single(
+                            session, questions[index], json_data_str)
+                    except Exception as e:
+                        statements[index] = e
+
+    query_result_strs = []
+    for question, statement in zip(questions, statements):
+        st.write(f"Processing question: {question}")
+        if isinstance(statement, Exception):
+            # Summarized into the question's section like a failed query
+            st.error(f"SQL generation failed: {statement}")
+            query_result_strs.append(f"SQL generation failed: {statement}")
             continue
+        with st.expander("See GPT-4 Generated SQL Query", expanded=False):
+            st.info(statement)
+        query_result = run_query(session, statement)
+        query_result_strs.append(result_digest_text(query_result))
 
-        # Handle heading 3 (###)
-        if re.match(heading_3_pattern, token):
-            pdf.set_font("Arial", "B", 14)  # Larger font for ### headings
-            pdf.multi_cell(0, 10, re.sub(r'### ', '', token))
+    added = []
 
-        # Handle heading 4 (####)
-        elif re.match(heading_4_pattern, token):
-            # Slightly smaller for #### headings
-            pdf.set_font("Arial", "B", 12)
-            pdf.multi_cell(0, 10, re.sub(r'#### ', '', token))
+    def add_section(index, summary):
+        report.add_section(questions[index], summary)
+        added.append(index)
 
-        # Bold formatting
-        elif re.match(bold_pattern, token):
-            pdf.set_font("Arial", "B", 12)
-            pdf.multi_cell(0, 10, re.sub(r'\*\*', '', token))
+    with st.spinner("Summarizing all results..."):
+        try:
+            batch_summarize(session, query_result_strs, on_summary=add_section)
+        except Exception as e:
+            st.warning(f"Batch summarization failed: {e}")
+            for index in range(len(added), len(questions)):
+                report.add_section(questions[index], f"Summarization failed: {e}")
 
-        # Italic formatting
-        elif re.match(italic_pattern, token):
-            pdf.set_font("Arial", "I", 12)
-            pdf.multi_cell(0, 10, re.sub(r'\*', '', token))
 
-        # New line
-        elif token == '\n':
-            pdf.ln(5)
+def run_query(session, query):
+    """Runs generated SQL after the guardrail checks; errors come back as strings."""
+    max_gb = st.session_state.get('guard_max_gb', 0)
+    try:
+        safe_query, report = guard_query(
+            session, query,
+            max_rows=st.session_state.get('guard_max_rows', 10000),
+            max_bytes=max_gb * 1024 ** 3 if max_gb else None,
+            policy=st.session_state.get('guard_policy', "refuse"))
+    except GuardrailError as e:
+        return f"Query refused: {e}"
+    except Exception as e:
+        return str(e)
 
-        # Regular text
-        else:
-            pdf.set_font("Arial", "", 12)
-            pdf.multi_cell(0, 10, token)
+    if report['action'] == "downgraded":
+        st.warning(f"{report['message']}; returning a reduced number of rows.")
+
+    result = run_statements(session, [safe_query], owner="gpt4")[0]
+    if isinstance(result, Exception):
+        return str(result)
+    return result
 
 
 def gpt4_query_for_3rd_page(user_input):
     st.subheader("GPT-4 Query Interface")
     session = get_active_session()
 
-    if "json_data_str" not in st.session_state:
-        temp = generate_metadata_string(session)
-        st.session_state.json_data_str = temp.replace("'", "")
-    json_data_str = st.session_state.json_data_str
+    if not st.session_state.get('schema_linking', False):
+        if "json_data_str" not in st.session_state:
+            temp = generate_metadata_string(session)
+            st.session_state.json_data_str = temp
 
-    with st.expander("Schema metadata", expanded=False):
-        st.info(json_data_str)
-
-    def run_query(query):
-        try:
-            result = session.sql(query).collect()
-            return result
-        except Exception as e:
-            return str(e)
+        with st.expander("Schema metadata", expanded=False):
+            st.info(st.session_state.json_data_str)
 
     if "messages_gpt" not in st.session_state:
         st.session_state.messages_gpt = []
 
     if user_input:
+        # Reruns of the same question show the answer already fetched
+        last_answer = st.session_state.get('compare_gpt_answer')
+        if last_answer is not None and last_answer[0] == user_input:
+            _, response, query_result = last_answer
+            with st.expander("See GPT-4 Generated SQL Query", expanded=False):
+                st.info(response)
+            st.write("**GPT-4 Response:**")
+            if isinstance(query_result, BatchedResult):
+                render_batched_result(query_result)
+            else:
+                st.write(query_result)
+            return query_result, result_to_string(query_result)
+
+        # A new question supersedes anything still running for the last one
+        get_query_runner().cancel("gpt4")
         st.session_state.messages_gpt.append(
             {"role": "user", "content": user_input})
-        result = session.sql(
-            f"SELECT CHATGPT_4('{user_input}', '{json_data_str}')").collect()
-        response = result[0][0]
-        response = remove_sql_markers(response)
-        response = response.replace('`', '')
+        response = generate_sql(session, user_input, udf_name="CHATGPT_4")
 
         with st.expander("See GPT-4 Generated SQL Query", expanded=False):
             st.info(response)
 
-        query_result = run_query(response)
-        if isinstance(query_result, pd.DataFrame):
-            query_result_str = query_result.to_string(
-                index=False)  # Convert DataFrame to string
-        else:
-            query_result_str = str(query_result)
+        query_result = run_query(session, response)
+        query_result_str = result_to_string(query_result)
+        st.session_state.compare_gpt_answer = (user_input, response, query_result)
         st.write("**GPT-4 Response:**")
-        try:
-            st.dataframe(query_result)
-        except:
+        if isinstance(query_result, BatchedResult):
+            render_batched_result(query_result)
+        else:
             st.write(query_result)
 
         st.session_state.messages_gpt.append(
@@ -247,72 +410,195 @@ def gpt4_query_for_3rd_page(user_input):
 
 
 def cortex_analyst_for_3rd_page(user_input):
+    st.subheader("Cortex Analyst")
+
+    if "messages" not in st.session_state:
+        st.session_state.messages = []
+
+    # Only a new question is sent; otherwise the last exchange is shown again
+    if (st.session_state.get('compare_analyst_input') != user_input
+            or st.session_state.compare_analyst_index >= len(st.session_state.messages)):
+        process_message(prompt=user_input, details_expander=False)
+        st.session_state.compare_analyst_input = user_input
+        st.session_state.compare_analyst_index = len(st.session_state.messages) - 1
+    else:
+        answer_index = st.session_state.compare_analyst_index
+        show_message(answer_index - 1)
+        show_message(answer_index)
+
+
+def generate_yaml_json_files():
+    # Get active Snowflake session
+    session = get_active_session()
+
+    # Start from the published model so only changed tables are rebuilt
+    model, state = None, None
+    if st.session_state.get('model_incremental', True):
+        model, state = load_model_state(
+            session, st.session_state['stage'], st.session_state['yaml_file'])
+
+    # One INFORMATION_SCHEMA query plus one sampled profiling query per changed table
+    yaml_structure, state, changed, removed = update_semantic_model(
+        session, st.session_state['database'], st.session_state['schema'],
+        model, state, model_name="Revenue",
+        profile_rows=st.session_state.get('model_profile_rows', 10000))
+    if model is not None and not changed and not removed:
+        st.sidebar.info("Semantic model is up to date: no table changed.")
+        return
+    st.sidebar.caption(
+        f"Regenerated {len(changed)} of {len(yaml_structure['tables'])} tables"
+        + (f", removed {len(removed)}" if removed else ""))
+
+    # Check the model offline so a broken model is never uploaded
+    issues = validate_model(yaml_structure, columns_by_table(state))
+    errors = [issue for issue in issues if issue["level"] == "error"]
+    if issues:
+        with st.sidebar.expander(
+                f"Model check: {len(errors)} errors, {len(issues) - len(errors)} warnings"):
+            st.code(format_issues(issues, limit=200))
+    if errors:
+        st.error("The semantic model has errors and was not uploaded.")
+        return
+
+    # Re-render only the changed tables of the serializer kept from the last
+    # run, as long as it still holds the model this run started from
+    serializer_key = (st.session_state['database'], st.session_state['schema'],
+                      st.session_state['yaml_file'])
+    serializer = st.session_state.get('model_serializer')
+    if (model is not None and serializer is not None
+            and st.session_state.get('model_serializer_key') == serializer_key
+            and serializer.model() == model):
+        serializer.update(yaml_structure, changed, removed)
+    else:
+        serializer = ModelSerializer.from_model(yaml_structure)
+    st.session_state.model_serializer = serializer
+    st.session_state.model_serializer_key = serializer_key
+    FILE = st.session_state['yaml_file']
+    JSON_FILE = st.session_state['json_file']
+
+    # Upload both from memory at once, skipping files the stage already holds
+    results = publish_artifacts(session, st.session_state['stage'], {
+        FILE: serializer.yaml(),
+        JSON_FILE: serializer.json(),
+    })
+
+    for file_name, kind in ((FILE, "YAML"), (JSON_FILE, "JSON")):
+        result = results[file_name]
+        if result["status"] == 'UPLOADED':
+            st.sidebar.success(
+                f"{kind} file successfully generated and uploaded to stage.")
+        elif result["status"] == 'SKIPPED':
+            st.sidebar.info(f"{kind} file unchanged on stage; upload skipped.")
+        elif result["error"]:
+            st.error(f"Failed to upload {kind} file to stage: {result['error']}")
+        else:
+            st.error(f"Failed to upload {kind} file to stage.")
+
+    if results[FILE]["status"] in ('UPLOADED', 'SKIPPED'):
+        save_model_state(session, st.session_state['stage'], FILE, state)
+
+
+def send_message(prompt: str) -> dict:
+    """Calls the REST API and returns the response."""
     DATABASE = st.session_state['database']
     SCHEMA = st.session_state['schema']
     STAGE = st.session_state['stage']
     FILE = st.session_state['yaml_file']
-
-    def send_message(prompt: str) -> dict:
-        """Calls the REST API and returns the response."""
-        request_body = {
-            "messages": [
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt
-                        }
-                    ]
-                }
-            ],
-            "semantic_model_file": f"@{DATABASE}.{SCHEMA}.{STAGE}/{FILE}",
-        }
-        resp = _snowflake.send_snow_api_request(
-            "POST",
-            f"/api/v2/cortex/analyst/message",
-            {},
-            {},
-            request_body,
-            {},
-            30000,
-        )
-        if resp["status"] < 400:
-            return json.loads(resp["content"])
-        else:
-            raise Exception(
-                f"Failed request with status {resp['status']}: {resp}"
-            )
-
-    def process_message(prompt: str) -> None:
-        """Processes a message and adds the response to the chat."""
-        st.session_state.messages.append(
-            {"role": "user", "content": [{"type": "text", "text": prompt}]}
+    request_body = {
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": prompt
+                    }
+                ]
+            }
+        ],
+        "semantic_model_file": f"@{DATABASE}.{SCHEMA}.{STAGE}/{FILE}",
+    }
+    resp = _snowflake.send_snow_api_request(
+        "POST",
+        f"/api/v2/cortex/analyst/message",
+        {},
+        {},
+        request_body,
+        {},
+        30000,
+    )
+    if resp["status"] < 400:
+        return json.loads(resp["content"])
+    else:
+        raise Exception(
+            f"Failed request with status {resp['status']}: {resp}"
         )
 
-        with st.chat_message("user"):
-            st.markdown(prompt)
 
-        with st.chat_message("assistant"):
-            with st.spinner("Generating response..."):
-                response = send_message(prompt=prompt)
-                content = response["message"]["content"]
+def process_message(prompt: str, details_expander: bool = True) -> None:
+    """Processes a message and adds the response to the chat."""
+    get_query_runner().cancel("analyst")
+    st.session_state.messages.append(
+        {"role": "user", "content": [{"type": "text", "text": prompt}]}
+    )
+    with st.chat_message("user"):
+        st.markdown(prompt)
+    with st.chat_message("assistant"):
+        with st.spinner("Generating response..."):
+            response = send_message(prompt=prompt)
+            content = response["message"]["content"]
+            if details_expander:
+                with st.expander("Detailed Output Content", expanded=False):
+                    st.markdown(content)
+            else:
                 st.write(content)
-                display_content(content=content)
+            display_content(content=content)
+    st.session_state.messages.append(
+        {"role": "assistant", "content": content})
 
-        st.session_state.messages.append(
-            {"role": "assistant", "content": content})
 
-    st.subheader("Cortex Analyst")
+def show_message(message_index: int) -> None:
+    msg = st.session_state.messages[message_index]
+    with st.chat_message(msg["role"]):
+        display_content(msg["content"], message_index=message_index)
+
+
+@fragment
+def analyst_message(message_index: int) -> None:
+    """One transcript message; its result pane (pages, "Load more") reruns alone."""
+    show_message(message_index)
+
+
+@fragment
+def analyst_chat() -> None:
+    """
+    Messages added since the last full run, and the input box. A question
+    reruns only this fragment, so the transcript drawn by the full run is
+    not redrawn. Each earlier exchange of this fragment is drawn once per
+    question, in its own ``analyst_message`` fragment, so paging or
+    "Load more" in its result pane reruns only that message.
+    """
+    for message_index in range(st.session_state.analyst_rendered,
+                               len(st.session_state.messages)):
+        analyst_message(message_index)
+
+    if prompt := st.chat_input("Ask me anything about the data"):
+        # Drawn while it is answered; later reruns draw it as fragments above
+        process_message(prompt=prompt)
+
+
+def cortex_analyst_page():
+    st.title("Cortex Analyst")
+    st.sidebar.title("Settings")
 
     if "messages" not in st.session_state:
         st.session_state.messages = []
 
-    for i, msg in enumerate(st.session_state.messages):
-        with st.chat_message(msg["role"]):
-            display_content(msg["content"], message_index=i)
+    for message_index in range(len(st.session_state.messages)):
+        analyst_message(message_index)
+    st.session_state.analyst_rendered = len(st.session_state.messages)
 
-    process_message(prompt=user_input)
+    analyst_chat()
 
 
 def main():
@@ -321,6 +607,11 @@ def main():
     page_selection = st.sidebar.radio(
         "Go to", ["Cortex Analyst", "GPT-4 Query Interface", "Compare Models", "Reports"])
 
+    # Navigating to another page cancels queries still running for the last one
+    if st.session_state.get('active_page') != page_selection:
+        get_query_runner().cancel()
+        st.session_state['active_page'] = page_selection
+
     if 'database' not in st.session_state:
         st.session_state['database'] = "CORTEX_ANALYST_DEMO"
     if 'schema' not in st.session_state:
@@ -357,6 +648,18 @@ def main():
     st.session_state['yaml_file'] = f"demo_{st.session_state['database']}_{st.session_state['schema']}.yaml"
     st.session_state['json_file'] = f"demo_{st.session_state['database']}_{st.session_state['schema']}.json"
 
+    # Start building the shared schema metadata cache in the background
+    get_metadata_cache().warm(
+        session, st.session_state['database'], st.session_state['schema'],
+        stage=st.session_state['stage'],
+        sample_rows=st.session_state.get('profile_sample_rows', 1000),
+        exact=st.session_state.get('profile_exact', False))
+
+    single_flight = get_single_flight()
+    st.sidebar.caption(
+        f"Warehouse executions saved by query coalescing: "
+        f"{single_flight.saved:,} of {single_flight.requests:,} requests")
+
     # Display current configurations
     with st.sidebar.expander("Current Configuration", expanded=False):
         st.markdown(f"**Database:** {st.session_state['database']}")
@@ -365,209 +668,52 @@ def main():
         st.markdown(f"**YAML File:** {st.session_state['yaml_file']}")
         st.markdown(f"**JSON File:** {st.session_state['json_file']}")
 
-    def generate_yaml_json_files():
-        # YAML structure initialization
-        yaml_structure = {
-            "name": "Revenue",
-            "tables": []
-        }
-
-        # Get active Snowflake session
-        session = get_active_session()
-
-        # Fetch tables and views for the predefined schema
-        tables_df = session.sql(
-            f"SHOW TABLES IN {st.session_state['database']}.{st.session_state['schema']}").collect()
-        views_df = session.sql(
-            f"SHOW VIEWS IN {st.session_state['database']}.{st.session_state['schema']}").collect()
-
-        # Combine tables and views
-        tables_and_views = [row['name']
-                            for row in tables_df] + [row['name'] for row in views_df]
-
-        # Parse each table or view and add to the YAML structure
-        for table_or_view in tables_and_views:
-            # Get the definition of the table or view
-            table_definition_df = session.sql(
-                f"DESCRIBE TABLE {st.session_state['database']}.{st.session_state['schema']}.{table_or_view}").collect()
-
-            columns = [row['name'] for row in table_definition_df]
-            data_types = [row['type'] for row in table_definition_df]
-
-            # Define the table entry in YAML structure
-            table_entry = {
-                "name": table_or_view,
-                "description": f"Description of {table_or_view}",
-                "base_table": {
-                    "database": st.session_state['database'],
-                    "schema": st.session_state['schema'],
-                    "table": table_or_view
-                },
-                "dimensions": [],
-                "time_dimensions": [],
-                "measures": []
-            }
-
-            # Add columns as time dimensions and measures
-            for column, data_type in zip(columns, data_types):
-                data_type_simple = data_type.split('(')[0].upper()
-
-                # Time dimensions
-                if data_type_simple in ["DATE", "DATETIME", "TIME", "TIMESTAMP", "TIMESTAMP_LTZ", "TIMESTAMP_NTZ", "TIMESTAMP_TZ"]:
-                    time_dimension_entry = {
-                        "name": column,
-                        "expr": column,
-                        "description": f"",
-                        "unique": True,
-                        "data_type": data_type_simple
-                    }
-                    table_entry["time_dimensions"].append(time_dimension_entry)
-
-                # Measures
-                elif data_type_simple in ["NUMBER", "DECIMAL", "NUMERIC", "INT", "INTEGER", "BIGINT", "SMALLINT", "TINYINT", "BYTEINT", "FLOAT", "FLOAT4", "FLOAT8", "DOUBLE", "DOUBLE PRECISION", "REAL"]:
-                    measure_entry = {
-                        "name": column,
-                        "expr": column,
-                        "description": f"",
-                        "data_type": data_type_simple,
-                        "default_aggregation": "sum"  # Example default aggregation
-                    }
-                    table_entry["measures"].append(measure_entry)
-
-                else:
-                    dim_entry = {
-                        "name": column,
-                        "expr": column,
-                        "description": f"",
-                        "data_type": data_type_simple,
-                        "sample_values": ["", ""]
-                    }
-                    table_entry["dimensions"].append(dim_entry)
-
-            # Append table entry to YAML structure
-            yaml_structure['tables'].append(table_entry)
-
-        # Convert YAML structure to string
-        yaml_str = yaml.dump(yaml_structure, sort_keys=False, indent=2)
-
-        # Save the YAML content to a file
-        yaml_bytes = io.BytesIO(yaml_str.encode('utf-8'))
-
-        # Write the YAML content to a file with the specified name
-        FILE = st.session_state['yaml_file']
-        with open(FILE, 'wb') as f:
-            f.write(yaml_bytes.getvalue())
-
-        # Upload the YAML file to the Snowflake stage
-        try:
-            # Upload to Snowflake stage with the specified file name
-            put_result = session.file.put(
-                FILE, st.session_state['stage'], auto_compress=False, overwrite=True)
-
-            if put_result[0].status == 'UPLOADED':
-                st.sidebar.success(
-                    "YAML file successfully generated and uploaded to stage.")
-            else:
-                st.error("Failed to upload YAML file to stage.")
-
-        except Exception as e:
-            st.error(f"Failed to upload YAML file to stage: {e}")
-
-        # JSON file generation and upload
-        json_data = json.dumps(yaml_structure, indent=2)
-        json_bytes = io.BytesIO(json_data.encode('utf-8'))
-
-        # Write the JSON content to a file with the specified name
-        JSON_FILE = st.session_state['json_file']
-        with open(JSON_FILE, 'wb') as f:
-            f.write(json_bytes.getvalue())
-
-        # Upload the JSON file to the Snowflake stage
-        try:
-            put_result_json = session.file.put(
-                JSON_FILE, f"@{st.session_state['stage']}/{JSON_FILE}", auto_compress=False, overwrite=True)
-
-            # Check if the upload was successful
-            if put_result_json[0].status == 'UPLOADED':
-                st.sidebar.success(
-                    "JSON file successfully generated and uploaded to stage.")
-            else:
-                st.error("Failed to upload JSON file to stage.")
-
-        except Exception as e:
-            st.error(f"Error uploading JSON file to stage: {str(e)}")
+    # Schema linking sends only the tables relevant to each question
+    st.sidebar.checkbox("Schema linking", value=False, key='schema_linking')
+    st.sidebar.number_input(
+        "Max schema context (characters)", min_value=500, value=6000,
+        step=500, key='schema_context_chars')
+
+    # Column profiling options for the schema metadata
+    st.sidebar.checkbox("Exact distinct counts", value=False, key='profile_exact')
+    st.sidebar.number_input(
+        "Profiling sample rows", min_value=10, value=1000, step=100,
+        key='profile_sample_rows')
+
+    st.sidebar.number_input(
+        "Semantic model profiling rows per table (0 = types only)", min_value=0,
+        value=10000, step=1000, key='model_profile_rows')
+    st.sidebar.checkbox(
+        "Only regenerate changed tables", value=True, key='model_incremental')
+
+    # Guardrails applied to generated SQL before it runs
+    st.sidebar.number_input(
+        "Max rows per generated query", min_value=1, value=10000, step=1000,
+        key='guard_max_rows')
+    st.sidebar.number_input(
+        "Max GB scanned per generated query (0 = no check)", min_value=0,
+        value=0, step=1, key='guard_max_gb')
+    st.sidebar.selectbox(
+        "Over-budget queries", ["refuse", "downgrade"], key='guard_policy')
+    st.sidebar.number_input(
+        "Query timeout (seconds)", min_value=5, value=120, step=5,
+        key='query_timeout')
+    st.sidebar.number_input(
+        "Max rows fetched per result", min_value=100, value=100000, step=10000,
+        key='result_max_rows')
+    st.sidebar.number_input(
+        "Rows per result page", min_value=10, value=100, step=10,
+        key='result_page_size')
+    st.sidebar.number_input(
+        "Max points per chart", min_value=50, value=1000, step=50,
+        key='chart_max_points')
+    st.sidebar.number_input(
+        "Result digest token budget", min_value=200, value=1500, step=100,
+        key='digest_token_budget')
 
     if st.sidebar.button("Run Function"):
         generate_yaml_json_files()
 
-    def cortex_analyst_page():
-        DATABASE = st.session_state['database']
-        SCHEMA = st.session_state['schema']
-        STAGE = st.session_state['stage']
-        FILE = st.session_state['yaml_file']
-
-        def send_message(prompt: str) -> dict:
-            """Calls the REST API and returns the response."""
-            request_body = {
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }
-                ],
-                "semantic_model_file": f"@{DATABASE}.{SCHEMA}.{STAGE}/{FILE}",
-            }
-            resp = _snowflake.send_snow_api_request(
-                "POST",
-                f"/api/v2/cortex/analyst/message",
-                {},
-                {},
-                request_body,
-                {},
-                30000,
-            )
-            if resp["status"] < 400:
-                return json.loads(resp["content"])
-            else:
-                raise Exception(
-                    f"Failed request with status {resp['status']}: {resp}"
-                )
-
-        def process_message(prompt: str) -> None:
-            """Processes a message and adds the response to the chat."""
-            st.session_state.messages.append(
-                {"role": "user", "content": [{"type": "text", "text": prompt}]}
-            )
-            with st.chat_message("user"):
-                st.markdown(prompt)
-            with st.chat_message("assistant"):
-                with st.spinner("Generating response..."):
-                    response = send_message(prompt=prompt)
-                    content = response["message"]["content"]
-                    with st.expander("Detailed Output Content", expanded=False):
-                        st.markdown(content)
-                    display_content(content=content)
-            st.session_state.messages.append(
-                {"role": "assistant", "content": content})
-
-        st.title("Cortex Analyst")
-        st.sidebar.title("Settings")
-
-        if "messages" not in st.session_state:
-            st.session_state.messages = []
-
-        for i, msg in enumerate(st.session_state.messages):
-            with st.chat_message(msg["role"]):
-                display_content(msg["content"], message_index=i)
-
-        if prompt := st.chat_input("Ask me anything about the data"):
-            process_message(prompt=prompt)
-
     if page_selection == "Cortex Analyst":
         cortex_analyst_page()
     elif page_selection == "GPT-4 Query Interface":
@@ -578,134 +724,79 @@ def main():
         report_page_function()
 
 
-# def fetch_table_ddl(session):
-#     ddl_statements = []
-#     schema_name =st.session_state['schema']
-#     database_name = st.session_state['database']
-#     # Query to get the list of tables
-#     table_query = f"""
-#     SELECT TABLE_NAME
-#     FROM {database_name}.INFORMATION_SCHEMA.TABLES
-#     WHERE TABLE_SCHEMA = '{schema_name}';
-#     """
-
-#     # Execute the query to get table names
-#     tables_df = session.sql(table_query).collect()
-
-#     # Fetch the DDL for each table
-#     for table_row in tables_df:
-#         table_name = table_row['TABLE_NAME']
-#         ddl_query = f"SELECT GET_DDL('TABLE', '{database_name}.{schema_name}.{table_name}');"
-
-#         # Execute the query to get the DDL statement
-#         ddl_result = session.sql(ddl_query).collect()
-
-#         # Extract the DDL string from the Row object
-#         ddl_statements.append(ddl_result[0][0])
-
-#     return ddl_statements
-
-def fetch_table_ddl(database_name, schema_name, session):
-    # session = get_active_session()
-    ddl_statements = []
-
-    # Query to get the list of tables
-    table_query = f"""
-    SELECT TABLE_NAME
-    FROM {database_name}.INFORMATION_SCHEMA.TABLES
-    WHERE TABLE_SCHEMA = '{schema_name}';
-    """
-
-    # Execute the query to get table names
-    tables_df = session.sql(table_query).collect()
-
-    # Fetch the DDL for each table
-    for table_row in tables_df:
-        table_name = table_row['TABLE_NAME']
-        ddl_query = f"SELECT GET_DDL('TABLE', '{database_name}.{schema_name}.{table_name}');"
-
-        # Execute the query to get the DDL statement
-        ddl_result = session.sql(ddl_query).collect()
-
-        # Extract the DDL string from the Row object
-        ddl_statements.append(ddl_result[0][0])
-
-    return ddl_statements
-
-
-def fetch_column_details(database_name, schema_name, table_name, session):
-    # Query to get column details
-    # session = get_active_session()
-    describe_query = f"DESCRIBE TABLE {database_name}.{schema_name}.{table_name};"
-    columns_df = session.sql(describe_query).collect()
-
-    column_details = []
-    for column in columns_df:
-        column_name = column['name']
-
-        # Query to count unique values
-        unique_count_query = f"SELECT COUNT(DISTINCT {column_name}) AS UNIQUE_COUNT FROM {database_name}.{schema_name}.{table_name};"
-        unique_count_result = session.sql(unique_count_query).collect()
-        unique_count = unique_count_result[0]['UNIQUE_COUNT']
-
-        # Query to get 5 random unique values
-        random_values_query = f"""
-        SELECT DISTINCT {column_name}
-        FROM {database_name}.{schema_name}.{table_name}
-        ORDER BY RANDOM()
-        LIMIT 5;
-        """
-        random_values_result = session.sql(random_values_query).collect()
-        random_values = [row[column_name] for row in random_values_result]
-
-        # Store details
-        column_details.append({
-            'column_name': column_name,
-            'unique_count': unique_count,
-            'random_values': random_values
-        })
-
-    return column_details
+@st.cache_resource
+def get_metadata_cache():
+    """Schema metadata cache shared by every user session of the app."""
+    return MetadataCache()
 
 
 def generate_metadata_string(session):
     schema_name = st.session_state['schema']
     database_name = st.session_state['database']
-    # Fetch the DDL statements
-    ddls = fetch_table_ddl(database_name, schema_name, session)
-
-    # Initialize a list to hold the metadata details
-    metadata_lines = []
-
-    # Combine the DDL statements with additional column metadata
-    metadata_lines.append("DDL Statements and Column Details:\n")
-    for ddl in ddls:
-        table_name = ddl.split('TABLE')[1].split(
-            '(')[0].strip()  # Extract table name from DDL statement
-        metadata_lines.append(f"\nTable: {table_name}\n")
-        metadata_lines.append(f"{ddl}\n")
-
-        # Fetch column details for the current table
-        column_details = fetch_column_details(
-            database_name, schema_name, table_name, session)
-
-        # Add column metadata
-        for column in column_details:
-            metadata_lines.append(f"Column: {column['column_name']}")
-            metadata_lines.append(
-                f"  - Unique Count: {column['unique_count']}")
-            metadata_lines.append(
-                f"  - Random Unique Values: {column['random_values']}\n")
-
-    # Join all lines into a single metadata string
-    metadata_string = "\n".join(metadata_lines)
-    return metadata_string
-
-
-def remove_sql_markers(text):
-    pattern = r"```sql(.*?)```"
-    cleaned_text = re.sub(pattern, r"\1", text, flags=re.DOTALL)
-    return cleaned_text.strip()
+    # Served from the shared cache; only tables whose fingerprint changed
+    # since the last run are profiled again
+    return get_metadata_cache().metadata_string(
+        session, database_name, schema_name, stage=st.session_state['stage'],
+        sample_rows=st.session_state.get('profile_sample_rows', 1000),
+        exact=st.session_state.get('profile_exact', False))
+
+
+def get_schema_index(session):
+    """Returns the schema-linking index for the selected database and schema."""
+    key = (st.session_state['database'], st.session_state['schema'])
+    if st.session_state.get('schema_index_key') != key:
+        model = build_schema_model(fetch_schema_columns(key[0], key[1], session))
+        # Sample values come from the profiled columns of the shared cache
+        entry = get_metadata_cache().refresh(
+            session, key[0], key[1], stage=st.session_state['stage'],
+            sample_rows=st.session_state.get('profile_sample_rows', 1000),
+            exact=st.session_state.get('profile_exact', False))
+        st.session_state.schema_index = SchemaIndex.from_model(
+            key[0], key[1], model, samples=cached_samples(entry))
+        st.session_state.schema_index_key = key
+    return st.session_state.schema_index
+
+
+def metadata_for_question(session, question):
+    """Returns the schema metadata context to send along with ``question``."""
+    if not st.session_state.get('schema_linking', False):
+        if "json_data_str" not in st.session_state:
+            temp = generate_metadata_string(session)
+            st.session_state.json_data_str = temp
+        return st.session_state.json_data_str
+
+    linked = get_schema_index(session).link(
+        question, max_chars=st.session_state.get('schema_context_chars', 6000))
+    with st.expander("Linked schema context", expanded=False):
+        st.caption(
+            f"{linked['chars']} characters (~{linked['tokens']} tokens), "
+            f"tables: {', '.join(linked['tables'])}"
+            + (" (truncated)" if linked['truncated'] else ""))
+        st.code(linked['context'])
+    return linked['context']
+
+
+def get_metadata_id(session, metadata):
+    """Registers ``metadata`` once per session and returns its id."""
+    registered = st.session_state.setdefault('registered_metadata', set())
+    digest = metadata_hash(metadata)
+    if digest not in registered:
+        register_metadata(session, metadata)
+        registered.add(digest)
+    return digest
+
+
+def generate_sql(session, question, udf_name="CHATGPT_4"):
+    """
+    Generates SQL for ``question``. The full schema metadata is registered
+    once and referenced by its hash; a linked context is small and differs
+    per question, so it is bound directly instead of being registered.
+    """
+    metadata = metadata_for_question(session, question)
+    if st.session_state.get('schema_linking', False):
+        return gpt4_sql_single(session, question, metadata, udf_name=udf_name)
+    return gpt4_sql_by_id(
+        session, question, get_metadata_id(session, metadata), udf_name=udf_name)
 
 # Function for GPT-4 Query Interface Page
 
@@ -715,24 +806,17 @@ def gpt4_query_interface_page():
     st.title("GPT-4 Query Interface")
     session = get_active_session()
 
-    if "json_data_str" not in st.session_state:
-        temp = generate_metadata_string(session)
-        st.session_state.json_data_str = temp.replace("'", "")
-    json_data_str = st.session_state.json_data_str
-
-    # print(metadata_string)
-    # json_data_str_l = generate_metadata_string(session)
-    # json_data_str = '\n'.join(metadata_string)
-    with st.expander("Schema metadata", expanded=False):
-        st.info(json_data_str)
-    # st.write(json_data_str)
+    if not st.session_state.get('schema_linking', False):
+        if "json_data_str" not in st.session_state:
+            temp = generate_metadata_string(session)
+            st.session_state.json_data_str = temp
 
-    def run_query(query):
-        try:
-            result = session.sql(query).collect()
-            return result
-        except Exception as e:
-            return str(e)
+        # print(metadata_string)
+        # json_data_str_l = generate_metadata_string(session)
+        # json_data_str = '\n'.join(metadata_string)
+        with st.expander("Schema metadata", expanded=False):
+            st.info(st.session_state.json_data_str)
+        # st.write(json_data_str)
 
     if "messages_gpt" not in st.session_state:
         st.session_state.messages_gpt = []
@@ -741,24 +825,44 @@ def gpt4_query_interface_page():
     #     with st.chat_message(msg["role"]):
     #         display_content(msg["content"], message_index=i)
 
+    gpt4_chat()
+
+
+@fragment
+def gpt4_chat():
+    """Input box and answer pane; questions and "Load more" rerun only this fragment."""
+    session = get_active_session()
     user_input = st.chat_input("Ask anything:")
 
+    # Without a new question, keep showing the last answer so "Load more"
+    # can fetch further batches of it
+    if not user_input and "gpt_last_answer" in st.session_state:
+        last_input, last_response, last_result = st.session_state.gpt_last_answer
+        with st.chat_message("user"):
+            st.markdown(last_input)
+        with st.chat_message("assistant"):
+            with st.expander("See GPT-4 Generated SQL Query", expanded=False):
+                st.info(last_response)
+            if isinstance(last_result, BatchedResult):
+                render_result(session, last_result, key="gpt_last")
+            else:
+                st.markdown(f"**Error:** {last_result}")
+
     if user_input:
         # Display the user's message in the chat message container
         with st.chat_message("user"):
             st.markdown(user_input)
 
+        # A new question supersedes anything still running for the last one
+        get_query_runner().cancel("gpt4")
+
         # Append the user message to the session state
         st.session_state.messages_gpt.append(
             {"role": "user", "content": user_input})
 
         # Query the Snowflake UDF
         with st.spinner("Generating response..."):
-            result = session.sql(
-                f"SELECT CHATGPT_4_md('{user_input}', '{json_data_str}')").collect()
-            response = result[0][0]
-            response = remove_sql_markers(response)
-            response = response.replace('`', '')
+            response = generate_sql(session, user_input, udf_name="CHATGPT_4_md")
 
         # Display the assistant's message in the chat message container
         with st.chat_message("assistant"):
@@ -766,31 +870,29 @@ def gpt4_query_interface_page():
                 st.info(response)
 
             # Run the generated SQL query
-            query_result = run_query(response)
+            query_result = run_query(session, response)
 
             # Display the result
             if isinstance(query_result, str):
                 st.markdown(f"**Error:** {query_result}")
             else:
-                st.dataframe(query_result)
+                render_result(session, query_result, key="gpt_last")
+            st.session_state.gpt_last_answer = (user_input, response, query_result)
 
             # Append the assistant's response to the session state
             st.session_state.messages_gpt.append(
-                {"role": "assistant", "content": str(query_result)})
+                {"role": "assistant", "content": result_to_string(query_result)})
 
 
 def summarize_gpt(result):
     session = get_active_session()
 
-    # Escape special characters in the result string
-    safe_result = result.replace("'", "''")  # Escape single quotes
-
-    # Use the escaped string in the SQL query
-    sql_query = f"SELECT CHATGPT_4_summarize('{safe_result}')"
+    # Bind the result digest instead of embedding it as a string literal
+    sql_query = "SELECT CHATGPT_4_summarize(?)"
 
     try:
         # Run the query
-        result = session.sql(sql_query).collect()
+        result = session.sql(sql_query, params=[result]).collect()
         response = result[0][0]
         return response
     except Exception as e: